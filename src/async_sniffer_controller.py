@@ -0,0 +1,186 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+import asyncio
+
+from ti_sniffer_controller import TISnifferController, State
+from sniffer_frame import DATA_PACKET_INFO
+
+"""
+This class is the asyncio version of the TISnifferController.
+The serial port is opened in non-blocking mode and registered on the event loop,
+which calls a reader callback whenever the port has bytes to read. No thread is used.
+Command methods (connect, configure, start, stop and ping) are coroutines, and
+stream packets are consumed with:
+
+    async for frame in controller.astream():
+        ...
+
+Since it relies on loop.add_reader, it only works with selector event loops (Linux).
+The blocking methods of TISnifferController (stream and _recieve_packet) must not be used with this class.
+"""
+class AsyncTISnifferController(TISnifferController):
+    def __init__(self, port, debug = False, queue_size = 0):
+        super().__init__(port, debug)
+        self.loop = None
+        # Stream packets waiting to be consumed by astream, 0 means unbounded
+        self.frame_queue = asyncio.Queue(maxsize=queue_size)
+        # Number of stream packets discarded because frame_queue was full
+        self.dropped_frames = 0
+        # Future resolved by the reader callback with the next command response
+        self.response_future = None
+
+    """
+    Opens a non-blocking serial connection with the TI Sniffer device, registers it on the event loop and applies
+    the frequency and PHY of metadata.
+    Returns True if the connection was opened and configured, False otherwise.
+    """
+    async def connect(self) -> bool:
+        if not self._open_serial(0):
+            return False
+
+        self.loop = asyncio.get_running_loop()
+        self.loop.add_reader(self.ser.fileno(), self._on_readable)
+
+        await self.stop()
+
+        if not await self.configure(self.metadata['frequency'], self.metadata['phy']):
+            self._debug('[ERROR] Could not configure the frequency and PHY.')
+            return False
+
+        self._debug_connection_settings()
+
+        self._debug('[INFO] Getting board information through ping command.')
+        await self.ping()
+
+        return True
+
+    """
+    Unregisters the serial port from the event loop and closes it.
+    Returns True if the connection was successfully closed, False otherwise.
+    """
+    async def disconnect(self) -> bool:
+        if self.loop is not None:
+            self.loop.remove_reader(self.ser.fileno())
+            self.loop = None
+        return super().disconnect()
+
+    """
+    Configures the TI Sniffer device to sniff packets with the specified frequency and PHY.
+    Accepts the same formats as TISnifferController.configure.
+    Returns True if the configuration was successful, False otherwise.
+    """
+    async def configure(self, frequency, phy) -> bool:
+        if self.state != State.STATE_STOPPED:
+            self._debug('[ERROR] Sniffer is not in the STOPPED state. Cannot configure frequency and PHY.')
+            return False
+
+        frequency = self._frequency_to_list(frequency)
+
+        response = await self._asend_command(self._build_frequency_command(frequency))
+        if not self._on_frequency_response(response, frequency):
+            return False
+
+        response = await self._asend_command(self._build_phy_command(phy))
+        return self._on_phy_response(response, phy)
+
+    """
+    Starts the sniffing process on the TI Sniffer device.
+    Returns True if the start command was successfully sent, False otherwise.
+    """
+    async def start(self) -> bool:
+        self._debug('[INFO] Start command sent.')
+        response = await self._asend_command(self.start_command)
+        return self._on_start_response(response)
+
+    """
+    Stops the sniffing process on the TI Sniffer device.
+    Returns True if the stop command was successfully sent, False otherwise.
+    """
+    async def stop(self) -> bool:
+        self._debug('[INFO] Stop command sent.')
+        response = await self._asend_command(self.stop_command)
+        return self._on_stop_response(response)
+
+    """
+    Gets the board information through the ping command.
+    Returns True if the ping command was successfully sent, False otherwise.
+    """
+    async def ping(self) -> bool:
+        self._debug('[INFO] Ping command sent.')
+        response = await self._asend_command(self.ping_command)
+        return self._on_ping_response(response)
+
+    """
+    Asynchronous iterator over the stream packets (SnifferFrame) received by the sniffer.
+    If read_time is -1, packets are yielded indefinitely.
+    If read_time is a positive number, the iteration ends after read_time seconds,
+    without waiting for a packet to complete.
+    """
+    async def astream(self, read_time = -1):
+        if self.state != State.STATE_STARTED:
+            self._debug('[ERROR] Sniffer is not in the STARTED state. Cannot start streaming.')
+            return
+
+        queue = self.frame_queue
+        if read_time == -1:
+            while True:
+                yield await queue.get()
+
+        deadline = self.loop.time() + read_time
+        while True:
+            remaining = deadline - self.loop.time()
+            if remaining <= 0:
+                return
+            try:
+                frame = await asyncio.wait_for(queue.get(), remaining)
+            except asyncio.TimeoutError:
+                return
+            yield frame
+            # Frames that are already queued do not need a new timer
+            while not queue.empty() and self.loop.time() < deadline:
+                yield queue.get_nowait()
+
+    """
+    Writes a command to the TI Sniffer device and waits for its response.
+    Returns the response frame, or None if it did not arrive within command_timeout seconds (None waits forever).
+    """
+    async def _asend_command(self, command):
+        self.response_future = self.loop.create_future()
+        self.ser.write(command)
+        try:
+            return await asyncio.wait_for(self.response_future, self.command_timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self.response_future = None
+
+    """
+    Adds the stream packets discarded because frame_queue was full to the dropped frames of each stage.
+    """
+    def _dropped_frames_by_stage(self):
+        dropped = super()._dropped_frames_by_stage()
+        dropped['queue'] = self.dropped_frames
+        return dropped
+
+    """
+    Reader callback called by the event loop when the serial port has bytes to read.
+    Stream packets are queued for astream and other frames resolve the pending command.
+    """
+    def _on_readable(self):
+        for frame in self._read_frames():
+            if frame.packet_info == DATA_PACKET_INFO:
+                try:
+                    self.frame_queue.put_nowait(frame)
+                except asyncio.QueueFull:
+                    self.dropped_frames += 1
+            elif self.response_future is not None and not self.response_future.done():
+                self.response_future.set_result(frame)
@@ -0,0 +1,387 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from array import array
+
+from capture_manager import CaptureManager
+from pcap_builder import PcapBuilder
+from sniffer_simulator import SnifferSimulator
+from ti_sniffer_controller import TISnifferController, State
+
+# Payload size ranges of the 802.15.4 frames of each scenario
+PAYLOAD_SIZES = {
+    'small': (9, 20),
+    'large': (100, 125),
+}
+
+"""
+Raised by MemorySerial when the whole stream was read.
+"""
+class EndOfStream(Exception):
+    pass
+
+"""
+Replaces the serial port with an in-memory byte stream delivered in chunks of chunk_size bytes.
+Keeps the time the last chunk arrived to measure the latency of the frames it completes.
+"""
+class MemorySerial:
+    def __init__(self, data, chunk_size = 4096):
+        self.data = memoryview(data)
+        self.chunk_size = chunk_size
+        self.position = 0
+        self.arrival_time = 0
+        self.is_open = True
+
+    @property
+    def in_waiting(self):
+        return min(self.chunk_size, len(self.data) - self.position)
+
+    """
+    Returns the next chunk of at most size bytes. Raises EndOfStream when the whole stream was read.
+    """
+    def read(self, size = 1):
+        if self.position >= len(self.data):
+            raise EndOfStream()
+        chunk = self.data[self.position:self.position + size]
+        self.position += len(chunk)
+        self.arrival_time = time.perf_counter_ns()
+        return bytes(chunk)
+
+    """
+    Discards commands written to the port.
+    """
+    def write(self, data):
+        return len(data)
+
+    """
+    Closes the port.
+    """
+    def close(self):
+        self.is_open = False
+
+"""
+Wraps a serial port to keep the time the last chunk of bytes was read from it.
+"""
+class TimedSerial:
+    def __init__(self, ser):
+        self.ser = ser
+        self.arrival_time = 0
+
+    """
+    Reads from the serial port and keeps the time the bytes arrived.
+    """
+    def read(self, size = 1):
+        data = self.ser.read(size)
+        self.arrival_time = time.perf_counter_ns()
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.ser, name)
+
+"""
+Pcap sink of a scenario: a file, a buffered file or a FIFO drained by a reader thread.
+"""
+class BenchmarkSink:
+    def __init__(self, kind, directory):
+        self.kind = kind
+        self.reader = None
+        self.bytes_read = 0
+        self.pcap = PcapBuilder(buffered=(kind == 'buffered-file'))
+        if kind == 'fifo':
+            name = 'pyniffer-benchmark-{}'.format(os.getpid())
+            self.reader = threading.Thread(target=self._drain, args=('/tmp/{}'.format(name),), daemon=True)
+            self.reader.start()
+            self.pcap.open_pcap(name, is_pipe=True)
+        else:
+            self.pcap.open_pcap(os.path.join(directory, 'benchmark.pcap'))
+        self.pcap.write_global_header()
+
+    """
+    Closes the pcap output and waits for the FIFO reader.
+    """
+    def close(self):
+        self.pcap.close_pcap()
+        if self.reader is not None:
+            self.reader.join()
+
+    """
+    Reads the FIFO as Wireshark would, until the writer closes it.
+    """
+    def _drain(self, path):
+        while not os.path.exists(path):
+            time.sleep(0.001)
+        with open(path, 'rb') as fifo:
+            while True:
+                data = fifo.read(65536)
+                if not data:
+                    return
+                self.bytes_read += len(data)
+
+"""
+Collects the metrics of a scenario.
+"""
+class Measurement:
+    def __init__(self):
+        self.latencies = array('q')
+        self.frames = 0
+        self.bytes = 0
+        self.start()
+
+    """
+    Starts measuring the wall time, CPU time and allocated memory blocks.
+    """
+    def start(self):
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.blocks_start = sys.getallocatedblocks()
+
+    """
+    Stops measuring.
+    """
+    def stop(self):
+        self.wall_time = time.perf_counter() - self.wall_start
+        self.cpu_time = time.process_time() - self.cpu_start
+        self.retained_blocks = sys.getallocatedblocks() - self.blocks_start
+
+    """
+    Returns the metrics as a dictionary.
+    - frames_per_second and megabytes_per_second: Frames and serial bytes processed per second.
+    - latency_us: Percentiles of the time from the arrival of the bytes of a frame to the end of its pcap write.
+    - cpu_us_per_frame: Process CPU time (all threads) per frame.
+    - retained_blocks_per_frame: Memory blocks still allocated at the end per frame, which shows allocations that are kept (leaks or buffers).
+    """
+    def results(self) -> dict:
+        frames = max(self.frames, 1)
+        latencies = sorted(self.latencies)
+        percentiles = {}
+        for name, percentile in (('p50', 0.50), ('p90', 0.90), ('p99', 0.99), ('p999', 0.999)):
+            percentiles[name] = latencies[min(len(latencies) - 1, int(len(latencies) * percentile))] / 1000 if latencies else None
+        percentiles['max'] = latencies[-1] / 1000 if latencies else None
+        return {
+            'frames': self.frames,
+            'bytes': self.bytes,
+            'wall_time_s': self.wall_time,
+            'frames_per_second': self.frames / self.wall_time if self.wall_time else None,
+            'megabytes_per_second': self.bytes / self.wall_time / 1_000_000 if self.wall_time else None,
+            'latency_us': percentiles,
+            'cpu_us_per_frame': self.cpu_time / frames * 1_000_000,
+            'retained_blocks_per_frame': self.retained_blocks / frames,
+        }
+
+"""
+Returns the pcap write function of a writer: 'frame' uses write_frame and 'legacy' write_packet_header + write_packet.
+"""
+def get_writer(pcap, writer):
+    if writer == 'legacy':
+        def write(frame):
+            pcap.write_packet_header(frame)
+            pcap.write_packet(frame)
+        return write
+    return pcap.write_frame
+
+"""
+Streams a synthetic or recorded byte stream from memory through TISnifferController.stream into the sink.
+"""
+def run_memory(stream, sink, writer, chunk_size):
+    controller = TISnifferController('/dev/ttyACM0')
+    ser = MemorySerial(stream, chunk_size)
+    controller.ser = ser
+    controller.state = State.STATE_STARTED
+    write = get_writer(sink.pcap, writer)
+
+    measurement = Measurement()
+    latencies = measurement.latencies
+    def on_frame(frame):
+        write(frame)
+        latencies.append(time.perf_counter_ns() - ser.arrival_time)
+
+    measurement.start()
+    try:
+        controller.stream(on_frame)
+    except EndOfStream:
+        pass
+    sink.pcap.flush()
+    measurement.stop()
+    measurement.frames = len(latencies)
+    measurement.bytes = len(stream)
+    return measurement
+
+"""
+Streams from simulated devices on pseudo-terminals for duration seconds into the sink.
+One device uses TISnifferController.stream and several devices a CaptureManager.
+"""
+def run_pty(devices, payload, rate, duration, sink, writer):
+    low, high = PAYLOAD_SIZES[payload]
+    simulators = [SnifferSimulator(rate, low, high, seed=index) for index in range(devices)]
+    write = get_writer(sink.pcap, writer)
+    measurement = Measurement()
+    latencies = measurement.latencies
+
+    if devices == 1:
+        controller = TISnifferController(simulators[0].open())
+        controller.connect()
+        controller.start()
+        ser = TimedSerial(controller.ser)
+        controller.ser = ser
+        def on_frame(frame):
+            write(frame)
+            latencies.append(time.perf_counter_ns() - ser.arrival_time)
+        measurement.start()
+        controller.stream(on_frame, duration)
+        sink.pcap.flush()
+        measurement.stop()
+        controller.ser = ser.ser
+        controller.stop()
+        controller.disconnect()
+    else:
+        manager = CaptureManager()
+        for index, simulator in enumerate(simulators):
+            manager.add_device(simulator.open(), interface=index + 1)
+        timed = {}
+        async def capture():
+            await manager.connect()
+            for controller in manager.controllers:
+                timed[controller.metadata['interface']] = controller.ser = TimedSerial(controller.ser)
+            await manager.start()
+            measurement.start()
+            async for frame in manager.astream(duration):
+                write(frame)
+                latencies.append(time.perf_counter_ns() - timed[frame.metadata.interface].arrival_time)
+            sink.pcap.flush()
+            measurement.stop()
+            for controller in manager.controllers:
+                controller.ser = controller.ser.ser
+            await manager.stop()
+            await manager.disconnect()
+        asyncio.run(capture())
+
+    for simulator in simulators:
+        simulator.close()
+    measurement.frames = len(latencies)
+    measurement.bytes = sum(simulator.bytes_sent for simulator in simulators)
+    results = measurement.results()
+    results['frames_offered'] = sum(simulator.frames_sent for simulator in simulators)
+    return results
+
+"""
+Returns the peak memory in bytes traced by tracemalloc while the in-memory pipeline runs.
+CPython does not count the allocations freed along the way, so this shows the memory held at once (buffers and queues),
+while retained_blocks_per_frame shows the allocations that outlive the frames.
+tracemalloc slows the pipeline down, so this is done on a separate run.
+"""
+def trace_peak_memory(stream, writer, directory):
+    import tracemalloc
+
+    sink = BenchmarkSink('file', directory)
+    controller = TISnifferController('/dev/ttyACM0')
+    controller.ser = MemorySerial(stream)
+    controller.state = State.STATE_STARTED
+    write = get_writer(sink.pcap, writer)
+
+    tracemalloc.start()
+    try:
+        controller.stream(write)
+    except EndOfStream:
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    sink.close()
+    return peak
+
+"""
+Runs every combination of the scenarios and returns the results.
+"""
+def run_benchmarks(arguments):
+    results = []
+    directory = tempfile.mkdtemp(prefix='pyniffer-benchmark-')
+    recorded = open(arguments.input, 'rb').read() if arguments.input else None
+
+    for transport, payload, sink_kind, devices, writer in itertools.product(arguments.transports, arguments.payloads, arguments.sinks, arguments.devices, arguments.writers):
+        if transport == 'memory' and devices != 1:
+            continue
+        if transport == 'memory' and recorded is not None and payload != arguments.payloads[0]:
+            continue
+        scenario = {
+            'transport': transport,
+            'payload': 'recorded' if transport == 'memory' and recorded is not None else payload,
+            'sink': sink_kind,
+            'devices': devices,
+            'writer': writer,
+        }
+
+        sink = BenchmarkSink(sink_kind, directory)
+        if transport == 'memory':
+            if recorded is not None:
+                stream = recorded
+            else:
+                low, high = PAYLOAD_SIZES[payload]
+                stream = SnifferSimulator(min_size=low, max_size=high, seed=0).generate_frames(arguments.frames)
+            metrics = run_memory(stream, sink, writer, arguments.chunk_size).results()
+            if arguments.trace_memory:
+                sink.close()
+                sink = None
+                metrics['traced_peak_bytes'] = trace_peak_memory(stream, writer, directory)
+        else:
+            metrics = run_pty(devices, payload, arguments.rate, arguments.duration, sink, writer)
+        if sink is not None:
+            sink.close()
+
+        scenario.update(metrics)
+        results.append(scenario)
+        print('[INFO] {transport} {payload} {sink} devices={devices} writer={writer}: {frames_per_second:.0f} frames/s, p99 {p99} us'.format(p99=metrics['latency_us']['p99'], **scenario), file=sys.stderr)
+
+    return results
+
+
+if __name__ == '__main__':
+    def comma_list(value):
+        return value.split(',')
+
+    def int_list(value):
+        return [int(item) for item in value.split(',')]
+
+    argument_parser = argparse.ArgumentParser(description='Benchmarks the capture pipeline from serial bytes to pcap writes.')
+    argument_parser.add_argument('--transports', type=comma_list, default=['memory', 'pty'], help='memory and/or pty.')
+    argument_parser.add_argument('--payloads', type=comma_list, default=['small', 'large'], help='small and/or large 802.15.4 frames.')
+    argument_parser.add_argument('--sinks', type=comma_list, default=['file', 'buffered-file', 'fifo'], help='file, buffered-file and/or fifo.')
+    argument_parser.add_argument('--devices', type=int_list, default=[1, 2, 4], help='Number of simulated devices (pty only).')
+    argument_parser.add_argument('--writers', type=comma_list, default=['frame', 'legacy'], help='frame (write_frame) and/or legacy (write_packet_header + write_packet).')
+    argument_parser.add_argument('--frames', type=int, default=50000, help='Frames of the synthetic in-memory stream.')
+    argument_parser.add_argument('--chunk-size', type=int, default=4096, help='Bytes delivered per serial read in memory.')
+    argument_parser.add_argument('--input', default=None, help='Raw serial dump to use instead of the synthetic in-memory stream.')
+    argument_parser.add_argument('--rate', type=float, default=5000, help='Frames per second of each simulated device.')
+    argument_parser.add_argument('--duration', type=float, default=3, help='Seconds of each pty scenario.')
+    argument_parser.add_argument('--trace-memory', action='store_true', help='Measure the peak memory of the in-memory pipeline with tracemalloc.')
+    argument_parser.add_argument('--output', default=None, help='JSON file for the results, stdout if not given.')
+    arguments = argument_parser.parse_args()
+
+    report = {
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'arguments': vars(arguments),
+        'results': run_benchmarks(arguments),
+    }
+    if arguments.output:
+        with open(arguments.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,240 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+import argparse
+import time
+
+import numpy as np
+
+from frame_parser import MAX_PACKET_LENGTH, MIN_DATA_PACKET_LENGTH
+from pcap_builder import PcapBuilder, PACKET_HEADER_STRUCT, IPV4_LENGTH_OFFSET, UDP_LENGTH_OFFSET, RSSI_OFFSET, FCS_OFFSET, PAYLOAD_OFFSET
+from sniffer_frame import DeviceMetadata, DATA_PACKET_INFO
+
+# Frames decoded from a raw serial dump:
+# - offset: Offset of the SOF in the dump.
+# - packet_info: Packet Info byte.
+# - length: Packet Length, the length of the Command Data.
+# - timestamp: Timestamp in microseconds (stream packets only).
+# - rssi: RSSI in dBm (stream packets only).
+# - status: Status byte, the last Command Data byte for stream packets and the first one for command responses.
+# - fcs: FCS byte of the serial frame.
+# - interface: Interface number given to the decoder.
+FRAME_DTYPE = np.dtype([
+    ('offset', '<u8'),
+    ('packet_info', 'u1'),
+    ('length', '<u2'),
+    ('timestamp', '<u8'),
+    ('rssi', 'i1'),
+    ('status', 'u1'),
+    ('fcs', 'u1'),
+    ('interface', '<u2'),
+])
+
+# SOF (2B) | Packet Info (1B) | Packet Length (2B), before the Command Data
+FRAME_HEADER_LENGTH = 5
+# FCS (1B) | EOF (2B), after the Command Data
+FRAME_TRAILER_LENGTH = 3
+# Longest frame accepted, so frames crossing the end of a chunk are always complete in the chunk overlap
+MAX_FRAME_LENGTH = FRAME_HEADER_LENGTH + MAX_PACKET_LENGTH + FRAME_TRAILER_LENGTH
+# Offset of the 802.15.4 frame inside the Command Data of a stream packet: Timestamp (6B) | RSSI (1B)
+MAC_OFFSET = 7
+
+DEFAULT_CHUNK_SIZE = 1 << 24
+# Records built at once by write_pcap
+RECORDS_PER_BATCH = 65536
+
+"""
+Returns the bytes of a raw serial dump as a read-only NumPy array. Files are memory-mapped, so they are not read at once.
+"""
+def as_array(dump):
+    if isinstance(dump, str):
+        return np.memmap(dump, dtype=np.uint8, mode='r')
+    return np.frombuffer(dump, dtype=np.uint8)
+
+"""
+Decodes every frame of a raw serial dump (bytes, bytearray, mmap, NumPy array or the path of a file) at once.
+Returns a structured array of FRAME_DTYPE with the frames in stream order.
+
+Frames are validated like FrameParser does: the Packet Length must be plausible, the frame must end with the EOF bytes
+and the FCS must match. Instead of walking the bytes one frame at a time, every candidate SOF of a chunk is checked
+at the same time with array operations. A candidate inside a valid frame before it is a byte of that frame
+(for example a payload containing the SOF bytes) and is not a frame.
+The dump is decoded in chunks of chunk_size bytes, so the memory used does not depend on the dump size.
+"""
+def decode_frames(dump, interface = 0, chunk_size = DEFAULT_CHUNK_SIZE) -> np.ndarray:
+    data = as_array(dump)
+    chunks = []
+    start = 0
+    while start < len(data):
+        frames, start = _decode_chunk(data, start, chunk_size)
+        chunks.append(frames)
+    if not chunks:
+        return np.zeros(0, dtype=FRAME_DTYPE)
+    frames = np.concatenate(chunks)
+    frames['interface'] = interface
+    return frames
+
+"""
+Decodes the frames with SOF from start to start + chunk_size, reading up to MAX_FRAME_LENGTH bytes more to complete them.
+Returns the frames and the offset where the next chunk starts, after the last frame.
+"""
+def _decode_chunk(data, start, chunk_size):
+    stop = min(start + chunk_size, len(data))
+    window = data[start:min(stop + MAX_FRAME_LENGTH, len(data))]
+    size = len(window)
+
+    # Candidate SOF positions, relative to the window
+    sof = np.flatnonzero((window[:-1] == 0x40) & (window[1:] == 0x53))
+    sof = sof[(sof < stop - start) & (sof + FRAME_HEADER_LENGTH <= size)]
+    packet_info = window[sof + 2]
+    length = window[sof + 3].astype(np.int64) | (window[sof + 4].astype(np.int64) << 8)
+    fcs_position = sof + FRAME_HEADER_LENGTH + length
+
+    # Plausible length, complete frame and EOF bytes
+    valid = (length <= MAX_PACKET_LENGTH) & ((packet_info != DATA_PACKET_INFO) | (length >= MIN_DATA_PACKET_LENGTH))
+    valid &= fcs_position + FRAME_TRAILER_LENGTH <= size
+    sof, packet_info, length, fcs_position = sof[valid], packet_info[valid], length[valid], fcs_position[valid]
+    valid = (window[fcs_position + 1] == 0x40) & (window[fcs_position + 2] == 0x45)
+    sof, packet_info, length, fcs_position = sof[valid], packet_info[valid], length[valid], fcs_position[valid]
+
+    # FCS: the Command Data sums are differences of a running sum, which wraps at 256 like the FCS
+    running_sum = np.zeros(size + 1, dtype=np.uint8)
+    np.cumsum(window, dtype=np.uint8, out=running_sum[1:])
+    command_data_sum = running_sum[fcs_position] - running_sum[sof + FRAME_HEADER_LENGTH]
+    fcs = window[fcs_position]
+    valid = ((packet_info + (length & 0xFF) + (length >> 8) + command_data_sum) & 0xFF) == fcs
+    sof, packet_info, length, fcs_position, fcs = sof[valid], packet_info[valid], length[valid], fcs_position[valid], fcs[valid]
+
+    # Candidates that start inside a valid frame before them are part of that frame
+    end = fcs_position + FRAME_TRAILER_LENGTH
+    if len(sof) > 1:
+        previous_end = np.maximum.accumulate(end)[:-1]
+        inside = np.concatenate(([False], sof[1:] < previous_end))
+        sof, packet_info, length, fcs, end = sof[~inside], packet_info[~inside], length[~inside], fcs[~inside], end[~inside]
+
+    frames = np.zeros(len(sof), dtype=FRAME_DTYPE)
+    frames['offset'] = sof + start
+    frames['packet_info'] = packet_info
+    frames['length'] = length
+    frames['fcs'] = fcs
+
+    command_data = sof + FRAME_HEADER_LENGTH
+    is_data = packet_info == DATA_PACKET_INFO
+    data_start = command_data[is_data]
+    timestamp = np.zeros(len(data_start), dtype=np.uint64)
+    for byte in range(6):
+        timestamp |= window[data_start + byte].astype(np.uint64) << np.uint64(8 * byte)
+    frames['timestamp'][is_data] = timestamp
+    frames['rssi'][is_data] = window[data_start + 6].view(np.int8)
+    frames['status'][is_data] = window[end[is_data] - FRAME_TRAILER_LENGTH - 1]
+    has_status = ~is_data & (length > 0)
+    frames['status'][has_status] = window[command_data[has_status]]
+
+    # The next chunk starts after the last frame, which may go past the end of this chunk
+    next_start = stop if not len(end) else max(stop, int(end[-1]) + start)
+    return frames, next_start
+
+"""
+Writes the stream packets of decoded frames to a pcap file, with the same records PcapBuilder.write_frame writes.
+The records are built with array operations from the frames array and the dump, RECORDS_PER_BATCH records at a time.
+metadata is the DeviceMetadata of the device that recorded the dump (the dump has no device settings).
+initial_time is the capture time of the first packet in seconds since the epoch, the current time if not given, as PcapBuilder.
+Returns the number of records written.
+"""
+def write_pcap(dump, frames, output_path, metadata = None, initial_time = None) -> int:
+    data = as_array(dump)
+    frames = frames[frames['packet_info'] == DATA_PACKET_INFO]
+    builder = PcapBuilder()
+    metadata = metadata or DeviceMetadata(int(frames['interface'][0]) if len(frames) else 0, 0x12, [0x92, 0x09, 0x00, 0x00], [0x14, 0x00])
+    template = np.frombuffer(bytes(builder._build_record_template(metadata)[1]), dtype=np.uint8)
+
+    seconds = frames['timestamp'] // 1_000_000
+    if len(frames):
+        # Same time base as PcapBuilder: the first packet gets the time the capture was opened
+        first_time = builder.initial_time + int(time.time()) if initial_time is None else int(initial_time)
+        seconds = seconds - seconds[0] + first_time
+
+    with open(output_path, 'wb') as output_file:
+        output_file.write(builder._build_global_header())
+        for first in range(0, len(frames), RECORDS_PER_BATCH):
+            batch = frames[first:first + RECORDS_PER_BATCH]
+            output_file.write(_build_records(data, batch, template, seconds[first:first + RECORDS_PER_BATCH]).data)
+    return len(frames)
+
+"""
+Builds the records of a batch of stream packets as one array, filling a copy of the record template for each packet
+and gathering the 802.15.4 frames from the dump.
+"""
+def _build_records(data, frames, template, seconds):
+    count = len(frames)
+    mac_length = frames['length'].astype(np.int64) - (MAC_OFFSET + 1)
+    total_length = RSSI_OFFSET - PACKET_HEADER_STRUCT.size + 2 + mac_length
+    record_length = PACKET_HEADER_STRUCT.size + total_length
+    record_start = np.zeros(count, dtype=np.int64)
+    np.cumsum(record_length[:-1], out=record_start[1:])
+    records = np.empty(int(record_length.sum()), dtype=np.uint8)
+
+    # Fixed part of the records, up to the FCS
+    header = np.tile(template, (count, 1))
+    header[:, 0:4] = seconds.astype('<u4').view(np.uint8).reshape(count, 4)
+    header[:, 4:8] = (frames['timestamp'] % 1_000_000).astype('<u4').view(np.uint8).reshape(count, 4)
+    header[:, 8:12] = total_length.astype('<u4').view(np.uint8).reshape(count, 4)
+    header[:, 12:16] = header[:, 8:12]
+    header[:, IPV4_LENGTH_OFFSET:IPV4_LENGTH_OFFSET + 2] = total_length.astype('>u2').view(np.uint8).reshape(count, 2)
+    header[:, UDP_LENGTH_OFFSET:UDP_LENGTH_OFFSET + 2] = (total_length - 20).astype('>u2').view(np.uint8).reshape(count, 2)
+    header[:, RSSI_OFFSET] = frames['rssi'].view(np.uint8)
+    header[:, FCS_OFFSET] = frames['fcs']
+    header_positions = record_start[:, None] + np.arange(PAYLOAD_OFFSET)
+    records[header_positions] = header
+
+    # 802.15.4 frames: every output byte after a header takes the dump byte at the same distance from its frame start
+    mac_start = frames['offset'].astype(np.int64) + FRAME_HEADER_LENGTH + MAC_OFFSET
+    total_mac = int(mac_length.sum())
+    if total_mac:
+        mac_record_start = np.zeros(count, dtype=np.int64)
+        np.cumsum(mac_length[:-1], out=mac_record_start[1:])
+        within = np.arange(total_mac) - np.repeat(mac_record_start, mac_length)
+        records[np.repeat(record_start + PAYLOAD_OFFSET, mac_length) + within] = data[np.repeat(mac_start, mac_length) + within]
+    return records
+
+"""
+Converts a raw serial dump to a pcap file.
+Returns the number of records written.
+"""
+def convert_dump(input_path, output_path, metadata = None, initial_time = None, chunk_size = DEFAULT_CHUNK_SIZE) -> int:
+    interface = metadata.interface if metadata is not None else 0
+    frames = decode_frames(input_path, interface, chunk_size)
+    return write_pcap(input_path, frames, output_path, metadata, initial_time)
+
+
+"""
+Converts a raw serial dump to a pcap file.
+"""
+if __name__ == '__main__':
+    def number(value):
+        return int(value, 0)
+
+    argument_parser = argparse.ArgumentParser(description='Converts a raw serial dump of a TI Sniffer to a pcap file.')
+    argument_parser.add_argument('input', help='Raw serial dump.')
+    argument_parser.add_argument('output', help='Pcap file.')
+    argument_parser.add_argument('--interface', type=int, default=0, help='Interface number of the device.')
+    argument_parser.add_argument('--phy', type=number, default=0x12, help='PHY index of the device.')
+    argument_parser.add_argument('--frequency', type=float, default=2450.0, help='Frequency of the device in MHz.')
+    argument_parser.add_argument('--channel', type=int, default=0x14, help='Channel of the device.')
+    argument_parser.add_argument('--start-time', type=float, default=None, help='Time of the first packet in seconds since the epoch.')
+    arguments = argument_parser.parse_args()
+
+    whole_frequency = int(arguments.frequency)
+    fractionary_frequency = int((arguments.frequency - whole_frequency) * 65536)
+    device_metadata = DeviceMetadata(arguments.interface, arguments.phy, whole_frequency.to_bytes(2, byteorder='little') + fractionary_frequency.to_bytes(2, byteorder='little'), arguments.channel.to_bytes(2, byteorder='little'))
+    decode_start = time.perf_counter()
+    records = convert_dump(arguments.input, arguments.output, device_metadata, arguments.start_time)
+    print('[INFO] {} records written in {:.2f} s.'.format(records, time.perf_counter() - decode_start))
@@ -0,0 +1,204 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+import asyncio
+import heapq
+import itertools
+
+from async_sniffer_controller import AsyncTISnifferController
+
+"""
+This class captures from several TI Sniffer devices at once and merges their packets into a single stream.
+Each device has its own frequency and PHY and is read concurrently on the same event loop.
+
+Every device has its own clock, so the timestamp of each frame is rebased to microseconds since the start of the capture,
+using the offset between the device clock and the host clock when the first frame of that device arrives.
+Frames are kept on a heap and only released once they are older than the reordering window,
+so frames of different devices come out in timestamp order. The heap is bounded by max_pending frames.
+The interface field of the frame metadata keeps the device each frame came from.
+
+If a deduplicator (FrameDeduplicator) is given, the copies of a frame captured by several devices on the same channel are
+removed before they are queued, so only one copy is released. Copies arriving while the first one waits on the heap
+update its RSSI and interfaces fields before it is released.
+"""
+class CaptureManager:
+    def __init__(self, reorder_window = 0.05, max_pending = 10000, deduplicator = None, debug = False):
+        self.debug = debug
+        # Time in seconds a frame waits for frames of other devices before being released
+        self.reorder_window = reorder_window
+        # Maximum number of frames waiting on the heap
+        self.max_pending = max_pending
+        # Removes the copies of the frames captured by more than one device, None keeps every frame
+        self.deduplicator = deduplicator
+
+        self.controllers = []
+
+        # Event loop time when the capture started
+        self.start_time = None
+        # Offset added to the timestamp of each device, by interface
+        self.clock_offsets = {}
+
+    """
+    Adds a sniffer device with its own frequency and PHY.
+    The interface number defaults to the number of the port and should be set when two ports have the same number.
+    The frequency and PHY are applied by the connect command of the controller.
+    Returns the controller of the device.
+    """
+    def add_device(self, port, frequency = 2450.0, phy = 0x12, interface = None, queue_size = 0) -> AsyncTISnifferController:
+        controller = AsyncTISnifferController(port, self.debug, queue_size)
+        if interface is not None:
+            controller.metadata['interface'] = interface
+        controller.metadata['frequency'] = controller._frequency_to_list(frequency)
+        controller.metadata['phy'] = phy
+        controller._update_device_metadata()
+        self.controllers.append(controller)
+        return controller
+
+    """
+    Connects to every device concurrently. Each controller applies its frequency and PHY while connecting.
+    Returns True if every device was connected and configured, False otherwise.
+    """
+    async def connect(self) -> bool:
+        results = await asyncio.gather(*(controller.connect() for controller in self.controllers))
+        if not all(results):
+            self._debug('[ERROR] Could not connect to every device.')
+            return False
+        return True
+
+    """
+    Starts every device.
+    Returns True if every device started, False otherwise.
+    """
+    async def start(self) -> bool:
+        results = await asyncio.gather(*(controller.start() for controller in self.controllers))
+        return all(results)
+
+    """
+    Stops every device.
+    Returns True if every device stopped, False otherwise.
+    """
+    async def stop(self) -> bool:
+        results = await asyncio.gather(*(controller.stop() for controller in self.controllers))
+        return all(results)
+
+    """
+    Disconnects every device.
+    Returns True if every device was disconnected, False otherwise.
+    """
+    async def disconnect(self) -> bool:
+        results = await asyncio.gather(*(controller.disconnect() for controller in self.controllers))
+        return all(results)
+
+    """
+    Returns the stats snapshot of each device (see TISnifferController.stats), by port.
+    """
+    def stats(self) -> dict:
+        return {controller.port: controller.stats() for controller in self.controllers}
+
+    """
+    Asynchronous iterator over the stream packets of every device in timestamp order.
+    If read_time is -1, packets are yielded indefinitely.
+    If read_time is a positive number, the iteration ends after read_time seconds and the frames still on the heap are released.
+    """
+    async def astream(self, read_time = -1):
+        loop = asyncio.get_running_loop()
+        self.start_time = loop.time()
+        self.clock_offsets = {}
+        if self.deduplicator is not None:
+            self.deduplicator.reset()
+
+        heap = []
+        sequence = itertools.count()
+        wakeup = asyncio.Event()
+        window = int(self.reorder_window * 1_000_000)
+        tasks = [loop.create_task(self._read_device(controller, heap, sequence, wakeup)) for controller in self.controllers]
+
+        deadline = None if read_time == -1 else self.start_time + read_time
+        try:
+            while True:
+                timeout = self.reorder_window
+                if deadline is not None:
+                    timeout = min(timeout, deadline - loop.time())
+                    if timeout <= 0:
+                        break
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                wakeup.clear()
+
+                # Frames older than the window can no longer be preceded by a frame of another device
+                horizon = self._now(loop) - window
+                while heap and (heap[0][0] <= horizon or len(heap) > self.max_pending):
+                    yield heapq.heappop(heap)[2]
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        while heap:
+            yield heapq.heappop(heap)[2]
+
+    """
+    Connects, starts and streams every device for read_time seconds, calling packet_callback with each frame in timestamp order.
+    Stops and disconnects the devices at the end. Blocks until the capture ends.
+    """
+    def capture(self, packet_callback, read_time = -1) -> bool:
+        return asyncio.run(self._capture(packet_callback, read_time))
+
+    """
+    Coroutine run by capture: connects, starts and streams the devices, then stops and disconnects them.
+    """
+    async def _capture(self, packet_callback, read_time) -> bool:
+        if not await self.connect():
+            return False
+        if not await self.start():
+            self._debug('[ERROR] Could not start every device.')
+            return False
+        try:
+            async for frame in self.astream(read_time):
+                packet_callback(frame)
+        finally:
+            await self.stop()
+            await self.disconnect()
+        return True
+
+    """
+    Reads the frames of one device, rebases their timestamps and pushes them to the heap.
+    """
+    async def _read_device(self, controller, heap, sequence, wakeup):
+        loop = asyncio.get_running_loop()
+        interface = controller.metadata['interface']
+        deduplicator = self.deduplicator
+        async for frame in controller.astream():
+            offset = self.clock_offsets.get(interface)
+            if offset is None:
+                offset = self._now(loop) - frame.timestamp
+                self.clock_offsets[interface] = offset
+            frame.timestamp += offset
+            if deduplicator is not None and deduplicator.is_duplicate(frame):
+                continue
+            # The sequence keeps the arrival order of frames with the same timestamp
+            heapq.heappush(heap, (frame.timestamp, next(sequence), frame))
+            wakeup.set()
+
+    """
+    Returns the microseconds elapsed since the start of the capture.
+    """
+    def _now(self, loop):
+        return int((loop.time() - self.start_time) * 1_000_000)
+
+    """
+    If debbuging is enabled, this method will print the message to the console.
+    """
+    def _debug(self, message):
+        if self.debug:
+            print('{}'.format(message))
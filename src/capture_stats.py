@@ -0,0 +1,178 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+import os
+import threading
+from bisect import bisect_left
+
+# Upper bounds of the latency buckets in microseconds, the last bucket has no upper bound (+Inf)
+LATENCY_BUCKETS_US = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000, 1000000)
+
+"""
+Latency histogram with fixed buckets.
+Observing a duration is a binary search and two increments, so it can be done for every packet.
+The counts are not locked: when several threads observe the same histogram a few observations may be lost,
+which is acceptable for monitoring.
+"""
+class LatencyHistogram:
+    __slots__ = ('bounds', 'bounds_ns', 'counts', 'count', 'total_ns')
+
+    def __init__(self, bounds = LATENCY_BUCKETS_US):
+        self.bounds = tuple(bounds)
+        self.bounds_ns = [bound * 1000 for bound in self.bounds]
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total_ns = 0
+
+    """
+    Adds a duration in nanoseconds (as given by time.perf_counter_ns) to the histogram.
+    """
+    def observe(self, duration_ns):
+        self.counts[bisect_left(self.bounds_ns, duration_ns)] += 1
+        self.count += 1
+        self.total_ns += duration_ns
+
+    """
+    Returns a dictionary with the count of each bucket by its upper bound in microseconds ('+Inf' for the last one),
+    the number of observations and their sum in microseconds.
+    Bucket counts are not cumulative.
+    """
+    def snapshot(self) -> dict:
+        counts = list(self.counts)
+        buckets = dict(zip(self.bounds, counts))
+        buckets['+Inf'] = counts[-1]
+        return {
+            'buckets_us': buckets,
+            'count': self.count,
+            'sum_us': self.total_ns / 1000,
+        }
+
+"""
+Counters and per-stage latency histograms of a capture component.
+Counters are plain dictionary entries incremented by the hot path, histograms are created for each stage name.
+"""
+class CaptureStats:
+    def __init__(self, counters, stages, bounds = LATENCY_BUCKETS_US):
+        self.counters = dict.fromkeys(counters, 0)
+        self.latency = {stage: LatencyHistogram(bounds) for stage in stages}
+
+    """
+    Returns a dictionary with a copy of the counters and the snapshot of each latency histogram.
+    """
+    def snapshot(self) -> dict:
+        return {
+            'counters': dict(self.counters),
+            'latency_us': {stage: histogram.snapshot() for stage, histogram in self.latency.items()},
+        }
+
+"""
+Formats stats snapshots in the Prometheus text exposition format.
+snapshots is a list of (snapshot, labels) tuples, where labels is a dictionary added to every sample of that snapshot,
+for example {'port': '/dev/ttyACM0'}. Samples of the same metric from different snapshots are grouped under one TYPE line.
+Counters become <prefix>_<name>_total and latency histograms become <prefix>_<stage>_latency_seconds.
+Nested dictionaries of counters (for example the dropped frames of each stage) become a counter with a stage label.
+"""
+def format_prometheus(snapshots, prefix = 'pyniffer') -> str:
+    # Samples of each metric by metric name, in the order they were first seen
+    metrics = {}
+    def add_sample(metric, metric_type, name, labels, value):
+        metrics.setdefault(metric, (metric_type, []))[1].append('{}{} {}'.format(name, _format_labels(labels), value))
+
+    for snapshot, labels in snapshots:
+        labels = dict(labels or {})
+        for name, value in snapshot.get('counters', {}).items():
+            metric = '{}_{}_total'.format(prefix, name)
+            if isinstance(value, dict):
+                for stage, stage_value in value.items():
+                    add_sample(metric, 'counter', metric, dict(labels, stage=stage), stage_value)
+            else:
+                add_sample(metric, 'counter', metric, labels, value)
+
+        for stage, histogram in snapshot.get('latency_us', {}).items():
+            metric = '{}_{}_latency_seconds'.format(prefix, stage)
+            cumulative = 0
+            for bound, count in histogram['buckets_us'].items():
+                cumulative += count
+                le = bound if bound == '+Inf' else repr(bound / 1_000_000)
+                add_sample(metric, 'histogram', metric + '_bucket', dict(labels, le=le), cumulative)
+            add_sample(metric, 'histogram', metric + '_sum', labels, histogram['sum_us'] / 1_000_000)
+            add_sample(metric, 'histogram', metric + '_count', labels, histogram['count'])
+
+    lines = []
+    for metric, (metric_type, samples) in metrics.items():
+        lines.append('# TYPE {} {}'.format(metric, metric_type))
+        lines.extend(samples)
+    return '\n'.join(lines) + '\n'
+
+"""
+Returns the labels of a sample in the {name="value",...} format, or an empty string if there are none.
+"""
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in labels.items()) + '}'
+
+"""
+This class periodically writes the stats of several components to a file in the Prometheus text format,
+to be collected by the node_exporter textfile collector.
+Each source is a function returning a stats snapshot (for example controller.stats), with its own labels.
+The file is written to a temporary file and renamed, so the collector never reads a partial file.
+"""
+class PrometheusExporter:
+    def __init__(self, path, interval = 10, prefix = 'pyniffer'):
+        self.path = path
+        self.interval = interval
+        self.prefix = prefix
+        self.sources = []
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    """
+    Adds a function returning a stats snapshot, exported with the given labels.
+    """
+    def add_source(self, source, labels = None):
+        self.sources.append((source, labels))
+
+    """
+    Starts writing the file every interval seconds.
+    """
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._export_loop, name='prometheus-exporter', daemon=True)
+        self.thread.start()
+
+    """
+    Stops the exporter after writing the file one last time.
+    """
+    def stop(self):
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        self.export()
+
+    """
+    Writes the stats of every source to the file.
+    """
+    def export(self):
+        text = format_prometheus([(source(), labels) for source, labels in self.sources], self.prefix)
+        temporary_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(temporary_path, 'w') as file:
+            file.write(text)
+        os.replace(temporary_path, self.path)
+
+    """
+    Background thread that exports the stats every interval seconds until stop is called.
+    """
+    def _export_loop(self):
+        while not self.stop_event.wait(self.interval):
+            self.export()
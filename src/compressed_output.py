@@ -0,0 +1,185 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+import lzma
+import threading
+import time
+import zlib
+
+from ring_buffer import RingBuffer, OverflowPolicy
+
+# File suffix of each compression
+COMPRESSION_SUFFIXES = {
+    'gzip': '.gz',
+    'xz': '.xz',
+}
+# Default level of each compression. The xz preset is kept low, since higher presets need tens of MB of memory
+DEFAULT_LEVELS = {
+    'gzip': 6,
+    'xz': 2,
+}
+
+"""
+Returns the path with the suffix of the compression, unless it already has it.
+"""
+def compressed_path(path, compression):
+    suffix = COMPRESSION_SUFFIXES[compression]
+    return path if path.endswith(suffix) else path + suffix
+
+"""
+Returns a streaming compressor with compress and flush methods for a compression.
+gzip writes a single gzip member (capture.pcap.gz), which Wireshark opens directly. xz writes an .xz stream (LZMA2).
+"""
+def _create_compressor(compression, level):
+    if compression == 'gzip':
+        # wbits 31 writes the gzip header and trailer around the deflate stream
+        return zlib.compressobj(level, zlib.DEFLATED, 31)
+    return lzma.LZMACompressor(format=lzma.FORMAT_XZ, preset=level)
+
+"""
+This class is a file that compresses everything written to it on a background thread.
+Writes are collected in batches of batch_size bytes, or for flush_interval seconds, and each batch is queued to the compression
+thread on a ring buffer of queue_size batches. The thread writing to the file never compresses and never waits for disk writes.
+If the compression thread falls behind and the ring buffer is full, new batches are dropped and counted, so the capture is
+never slowed down (OverflowPolicy.DROP_NEWEST). Batches are only cut between writes, never inside one, so the file
+stays valid as long as every write holds whole records: PcapBuilder writes each record in a single write, and keeps
+the header of write_packet_header until write_packet completes the record.
+With blocking=True the writer waits instead, and nothing is dropped.
+
+bytes_written is the size the compressed file will have with everything written so far, used by RotatingPcapBuilder
+to rotate on the size on disk. It is estimated with the compression ratio reached so far, which is too low while the
+compressor keeps data it has not written yet (up to hundreds of KB of a capture), so if previous_file is set
+(the previous CompressedFile of a rotation), its final ratio is used when it is higher.
+"""
+class CompressedFile:
+    def __init__(self, path, compression = 'gzip', level = None, batch_size = 65536, flush_interval = 1.0, queue_size = 256, blocking = False, previous_file = None):
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError('Unknown compression {}, use one of {}.'.format(compression, ', '.join(COMPRESSION_SUFFIXES)))
+        self.path = path
+        self.compression = compression
+        self.compressor = _create_compressor(compression, DEFAULT_LEVELS[compression] if level is None else level)
+        self.file = open(path, 'wb')
+
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.batch = bytearray()
+        self.last_put = time.monotonic()
+        self.ring = RingBuffer(queue_size, OverflowPolicy.BLOCK if blocking else OverflowPolicy.DROP_NEWEST)
+
+        # Counters
+        self.compressed_bytes = 0
+        self.uncompressed_bytes = 0
+        self.received_bytes = 0
+        self.previous_file = previous_file
+        self.previous_ratio = None
+        self.closed = False
+        self.dropped_bytes = 0
+
+        self.thread = threading.Thread(target=self._compress_loop, name='pcap-compress', daemon=True)
+        self.thread.start()
+
+    """
+    Adds data to the current batch, which is queued for compression once it is full or old enough.
+    """
+    def write(self, data) -> None:
+        batch = self.batch
+        batch += data
+        self.received_bytes += len(data)
+        if len(batch) >= self.batch_size or time.monotonic() - self.last_put >= self.flush_interval:
+            self._put_batch()
+
+    """
+    Returns the estimated compressed size divided by the uncompressed size, which is exact once the file is closed.
+    Before the first output, without a previous file, it is 1.0.
+    """
+    @property
+    def ratio(self):
+        if self.closed:
+            return self.compressed_bytes / self.uncompressed_bytes if self.uncompressed_bytes else 1.0
+        previous_file = self.previous_file
+        if previous_file is not None and previous_file.closed:
+            # The final ratio is kept, so the previous file is not kept alive by the next ones
+            self.previous_ratio = previous_file.ratio
+            self.previous_file = previous_file = None
+        previous_ratio = previous_file.ratio if previous_file is not None else self.previous_ratio
+        ratio = self.compressed_bytes / self.uncompressed_bytes if self.compressed_bytes else 0.0
+        if previous_ratio is None:
+            return ratio or 1.0
+        return max(ratio, previous_ratio)
+
+    """
+    Returns the estimated size of the compressed file with everything written so far.
+    """
+    @property
+    def bytes_written(self):
+        return max(self.compressed_bytes, int((self.received_bytes - self.dropped_bytes) * self.ratio))
+
+    """
+    Queues the current batch for compression, even if it is not full.
+    """
+    def flush(self) -> None:
+        self._put_batch()
+
+    """
+    Queues the current batch, waits for the compression thread to compress everything queued and closes the file.
+    """
+    def close(self):
+        self._put_batch()
+        self.ring.close()
+        self.thread.join()
+        self.file.close()
+        self.closed = True
+
+    """
+    Returns a dictionary with the counters of the compressed file:
+    - compressed_bytes: Bytes written to the file.
+    - uncompressed_bytes: Bytes compressed.
+    - dropped_bytes: Bytes of the batches dropped because the ring buffer was full.
+    - queued_batches: Batches waiting for the compression thread.
+    """
+    def stats(self) -> dict:
+        return {
+            'compressed_bytes': self.compressed_bytes,
+            'uncompressed_bytes': self.uncompressed_bytes,
+            'dropped_bytes': self.dropped_bytes,
+            'queued_batches': len(self.ring),
+        }
+
+    """
+    Queues the batch for the compressor thread, or drops it and counts its bytes if the queue is full.
+    """
+    def _put_batch(self):
+        self.last_put = time.monotonic()
+        if not self.batch:
+            return
+        batch = bytes(self.batch)
+        self.batch.clear()
+        if not self.ring.put(batch):
+            self.dropped_bytes += len(batch)
+
+    """
+    Compression thread. Compresses the queued batches and writes them until the ring buffer is closed and empty,
+    then writes the end of the compressed stream.
+    """
+    def _compress_loop(self):
+        compress = self.compressor.compress
+        while True:
+            batches = self.ring.get_many(16)
+            if not batches:
+                break
+            output = b''.join([compress(batch) for batch in batches])
+            self.uncompressed_bytes += sum(len(batch) for batch in batches)
+            if output:
+                self.file.write(output)
+                self.compressed_bytes += len(output)
+        output = self.compressor.flush()
+        self.file.write(output)
+        self.compressed_bytes += len(output)
@@ -0,0 +1,75 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+import glob
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from ti_sniffer_controller import TISnifferController
+
+# Serial ports where TI Sniffer devices (XDS110 debuggers of the Launchpads) show up on Linux
+DEFAULT_PATTERNS = ('/dev/ttyACM*', '/dev/serial/by-id/*')
+
+"""
+Returns the serial ports matching the glob patterns, sorted and without duplicates.
+Symbolic links (like the /dev/serial/by-id names) are resolved, so each device is listed once by its /dev/ttyACM path.
+"""
+def find_candidate_ports(patterns = DEFAULT_PATTERNS) -> list:
+    ports = set()
+    for pattern in patterns:
+        for path in glob.glob(pattern):
+            ports.add(os.path.realpath(path))
+    return sorted(ports)
+
+"""
+Connects to a port with TISnifferController.fast_connect, waiting at most timeout seconds for the responses.
+Returns the connected controller if the port is a TI Sniffer, or None after closing the port otherwise.
+Errors raised while probing (a port name without interface number, a serial error...) only skip this port.
+"""
+def probe_port(port, frequency = 2450.0, phy = 0x12, timeout = 0.5, chip_ids = None, debug = False):
+    controller = None
+    try:
+        controller = TISnifferController(port, debug)
+        controller.command_timeout = timeout
+        controller.metadata['frequency'] = controller._frequency_to_list(frequency)
+        controller.metadata['phy'] = phy
+        controller._update_device_metadata()
+
+        if controller.fast_connect(min(timeout, controller.default_timeout) / 10):
+            # chip_id is kept as a hex string, for example '1352'
+            if chip_ids is None or int(controller.board_info['chip_id'], 16) in chip_ids:
+                controller.ser.timeout = controller.default_timeout
+                return controller
+    except Exception as error:
+        if debug:
+            print('[ERROR] Could not probe {}: {}'.format(port, error))
+
+    if controller is not None and controller.ser is not None and controller.ser.is_open:
+        controller.ser.close()
+    return None
+
+"""
+Finds the TI Sniffer devices connected to this computer and returns a connected controller for each one, sorted by port.
+Every candidate port (given in ports, or found with the glob patterns) is probed at the same time on its own thread,
+so bringing up many devices takes about as long as one. A port that does not answer like a TI Sniffer within timeout seconds
+is skipped, so other serial devices never stall the discovery.
+Each controller is stopped and configured with frequency and phy, and its board information (chip_id, fw_rev...) is in board_info.
+If chip_ids is given, only the devices with one of those Chip Ids (for example {0x1352}) are returned.
+"""
+def discover(ports = None, patterns = DEFAULT_PATTERNS, frequency = 2450.0, phy = 0x12, timeout = 0.5, chip_ids = None, max_workers = 32, debug = False) -> list:
+    if ports is None:
+        ports = find_candidate_ports(patterns)
+    if not ports:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(ports))) as executor:
+        controllers = list(executor.map(lambda port: probe_port(port, frequency, phy, timeout, chip_ids, debug), ports))
+    return [controller for controller in controllers if controller is not None]
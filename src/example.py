@@ -2,32 +2,15 @@ from ti_sniffer_controller import TISnifferController
 from pcap_builder import PcapBuilder
 
 
-"""
-Auxiliary method to convert big endian to little endian.
-"""
-def big_endian_to_little_endian(big_endian):
-    bytes_array = [big_endian[i:i+2] for i in range(0, len(big_endian), 2)]
-    bytes_array.reverse()
-    bytes_array = ''.join(bytes_array)
-    return bytes_array
-
 """
 The IO is blocked when the streaming is enabled.
 Because of that, the communication method for when a packet is recieved is a callback.
 This callback is called whenever a new packet is received by the sniffer.
-The callback necessarily takes the packet as a parameter.
+The callback necessarily takes the packet (a SnifferFrame) as a parameter.
 """
 def on_packet_recieve(packet):
-    # Convert package command data to bytes
-    packet['command_data'] = bytes.fromhex(packet['command_data'])
-    
-    # Convert packet lenght to little endian and int
-    packet['packet_length'] = big_endian_to_little_endian(packet['packet_length'])
-    packet['packet_length'] = int(packet['packet_length'], 16)
-
-    # Write packet to pcap file
-    pcap.write_packet_header(packet)
-    pcap.write_packet(packet)
+    # Write packet (header and data) to pcap file
+    pcap.write_frame(packet)
     pass
 
 
@@ -0,0 +1,94 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+from collections import OrderedDict
+
+"""
+This class removes the copies of the same over-the-air frame captured by several sniffers on the same channel.
+Frames are identified by their IEEE 802.15.4 bytes (FCS included), which are hashed as they are, without a copy.
+A frame is a copy of a frame seen before if it has the same bytes, its timestamp is at most ttl seconds after it
+and it was captured by another interface. Identical frames from the same interface (MAC retransmissions) are always kept.
+
+The frames seen in the last ttl seconds are kept on a cache, also bounded by max_entries, and the oldest are evicted first.
+When a copy is found, the frame kept gets the best RSSI of its copies (if keep_best_rssi is True),
+and the interfaces field of the frame kept lists every interface that captured it.
+
+Timestamps of every frame must share the same clock, like the rebased timestamps of CaptureManager,
+which checks every frame with is_duplicate before queueing it (see CaptureManager deduplicator).
+"""
+class FrameDeduplicator:
+    def __init__(self, ttl = 0.005, max_entries = 65536, keep_best_rssi = True):
+        # Time window in microseconds, as the frame timestamps
+        self.ttl = int(ttl * 1_000_000)
+        self.max_entries = max_entries
+        self.keep_best_rssi = keep_best_rssi
+        # Frames kept by their 802.15.4 bytes, in the order they were seen
+        self.cache = OrderedDict()
+
+        # Counters
+        self.unique_frames = 0
+        self.duplicate_frames = 0
+        self.evicted_frames = 0
+
+    """
+    Returns True if the frame (SnifferFrame) is a copy of a frame seen before, which is then updated with its RSSI and interface.
+    Returns False if it is a new frame, which is added to the cache.
+    """
+    def is_duplicate(self, frame) -> bool:
+        cache = self.cache
+        timestamp = frame.timestamp
+        # Evicts the frames older than the time window and the oldest ones over max_entries
+        horizon = timestamp - self.ttl
+        while cache:
+            oldest = next(iter(cache.values()))
+            if oldest.timestamp >= horizon and len(cache) < self.max_entries:
+                break
+            cache.popitem(last=False)
+            self.evicted_frames += 1
+
+        key = frame.payload
+        interface = frame.metadata.interface if frame.metadata is not None else None
+        kept = cache.get(key)
+        if kept is not None and interface not in kept.interfaces and abs(timestamp - kept.timestamp) <= self.ttl:
+            kept.interfaces.append(interface)
+            if self.keep_best_rssi and frame.rssi > kept.rssi:
+                kept.rssi = frame.rssi
+            self.duplicate_frames += 1
+            return True
+
+        frame.interfaces = [interface]
+        if kept is not None:
+            # The older frame with the same bytes is replaced, so the newest one is matched from now on
+            del cache[key]
+        cache[key] = frame
+        self.unique_frames += 1
+        return False
+
+    """
+    Discards every frame of the cache.
+    """
+    def reset(self):
+        self.cache.clear()
+
+    """
+    Returns a dictionary with the counters of the deduplicator:
+    - unique_frames: Frames kept.
+    - duplicate_frames: Copies removed.
+    - evicted_frames: Frames evicted from the cache.
+    - cached_frames: Frames on the cache.
+    """
+    def stats(self) -> dict:
+        return {
+            'unique_frames': self.unique_frames,
+            'duplicate_frames': self.duplicate_frames,
+            'evicted_frames': self.evicted_frames,
+            'cached_frames': len(self.cache),
+        }
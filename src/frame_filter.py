@@ -0,0 +1,191 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+from mac_header import mac_field_offsets
+from sniffer_frame import STATUS_FCS_OK
+
+# Offset of the 802.15.4 frame inside the Command Data of a stream packet: Timestamp (6B) | RSSI (1B) | Frame | Status (1B)
+MAC_OFFSET = 7
+# Bytes of the Command Data around the 802.15.4 frame: Timestamp, RSSI and Status
+MAC_OVERHEAD = 8
+# Length of the 802.15.4 FCS at the end of the frame
+MAC_FCS_LENGTH = 2
+
+"""
+Converts an address to a tuple (value, length), where length is the address type stated by its form:
+- 2 or 8 bytes: short or extended address.
+- Hex string with 4 or 16 digits ('12:34', '00:12:4b:00:01:02:03:04'): short or extended address.
+- int, or hex string prefixed by '0x' or with another number of digits: length is None, the type is not stated.
+Addresses are written most significant byte first, as Wireshark shows them.
+"""
+def parse_address(address):
+    if isinstance(address, str):
+        digits = address.replace(':', '').replace('-', '')
+        if digits.lower().startswith('0x'):
+            return int(digits, 16), None
+        return int(digits, 16), {4: 2, 16: 8}.get(len(digits))
+    if isinstance(address, (bytes, bytearray)):
+        if len(address) not in (2, 8):
+            raise ValueError('Addresses given as bytes must have 2 or 8 bytes, not {}.'.format(len(address)))
+        return int.from_bytes(address, byteorder='big'), len(address)
+    return int(address), None
+
+"""
+Returns True if an address read from a frame (value and length, 0 if absent) matches an address
+converted by parse_address. An address without a stated type matches both types.
+"""
+def address_matches(value, length, expected_value, expected_length):
+    return length != 0 and value == expected_value and expected_length in (None, length)
+
+"""
+Splits addresses into a set of short addresses and a set of extended addresses.
+Addresses whose type is not stated (int) and that fit in 16 bits are put in both sets,
+so an extended address up to 0xFFFF given as int still matches.
+Returns None for both if addresses is None.
+"""
+def _split_addresses(addresses):
+    if addresses is None:
+        return None, None
+    short = set()
+    extended = set()
+    for address in addresses:
+        value, length = parse_address(address)
+        if length != 8 and value <= 0xFFFF:
+            short.add(value)
+        if length != 2:
+            extended.add(value)
+    return frozenset(short), frozenset(extended)
+
+"""
+This class is a filter on the stream packets of the TI Sniffer, evaluated on the raw frame bytes.
+Every given condition must match for a packet to be kept, conditions left as None are not checked:
+- frame_types: 802.15.4 frame types (FRAME_TYPE_* of mac_header).
+- pan_ids: Destination or source PAN ID.
+- addresses: Destination or source address, short (up to 0xFFFF) or extended.
+- source_addresses / destination_addresses: Source or destination address only.
+- min_length / max_length: Length of the 802.15.4 frame, FCS included.
+- min_rssi / max_rssi: RSSI in dBm.
+- fcs_valid: True keeps only packets with a correct 802.15.4 FCS (as reported by the sniffer), False only the corrupted ones.
+Addresses can be given as 2 or 8 bytes or as a hex string with 4 or 16 digits ('00:12:4b:00:01:02:03:04'),
+which state whether they are short or extended. An int up to 0xFFFF matches both a short and an extended address.
+
+The conditions are compiled once into the predicate, which checks the cheap fields first and reads the MAC header
+with the field offsets of its Frame Control (see mac_header.mac_field_offsets), so no frame object or copy is created.
+Packets whose MAC header is too short for the address and PAN conditions do not match.
+
+The filter is installed with TISnifferController.set_filter, and then rejected packets are dropped by the parser
+before a SnifferFrame is created for them.
+"""
+class FrameFilter:
+    def __init__(self, frame_types = None, pan_ids = None, addresses = None, source_addresses = None, destination_addresses = None,
+                 min_length = None, max_length = None, min_rssi = None, max_rssi = None, fcs_valid = None):
+        self.frame_types = frame_types
+        self.pan_ids = pan_ids
+        self.addresses = addresses
+        self.source_addresses = source_addresses
+        self.destination_addresses = destination_addresses
+        self.min_length = min_length
+        self.max_length = max_length
+        self.min_rssi = min_rssi
+        self.max_rssi = max_rssi
+        self.fcs_valid = fcs_valid
+        self.predicate = self._compile()
+
+    """
+    Returns True if the Command Data of a stream packet, buffer[start:end], matches the filter.
+    """
+    def __call__(self, buffer, start, end) -> bool:
+        return self.predicate(buffer, start, end)
+
+    """
+    Returns True if a stream packet (SnifferFrame) matches the filter.
+    """
+    def matches(self, frame) -> bool:
+        return self.predicate(frame.data, 0, len(frame.data))
+
+    """
+    Builds the predicate function of the filter.
+    """
+    def _compile(self):
+        # Lookup table of accepted frame types, indexed by the 3 frame type bits
+        type_table = None if self.frame_types is None else tuple(frame_type in self.frame_types for frame_type in range(8))
+        pan_ids = None if self.pan_ids is None else frozenset(self.pan_ids)
+        any_short, any_extended = _split_addresses(self.addresses)
+        source_short, source_extended = _split_addresses(self.source_addresses)
+        destination_short, destination_extended = _split_addresses(self.destination_addresses)
+
+        # RSSI conditions on the raw byte, which is a signed value
+        min_rssi = self.min_rssi
+        max_rssi = self.max_rssi
+        check_rssi = min_rssi is not None or max_rssi is not None
+        # Length conditions on the Command Data length, which is the 802.15.4 frame length plus MAC_OVERHEAD
+        min_data_length = MAC_OVERHEAD + (self.min_length or 0)
+        max_data_length = None if self.max_length is None else MAC_OVERHEAD + self.max_length
+        fcs_valid = self.fcs_valid
+        needs_header = pan_ids is not None or any_short is not None or source_short is not None or destination_short is not None
+        needs_fcf = type_table is not None or needs_header
+        layout_of = mac_field_offsets
+
+        def read_address(buffer, offset, length):
+            if length == 2:
+                return buffer[offset] | (buffer[offset + 1] << 8)
+            return int.from_bytes(buffer[offset:offset + 8], byteorder='little')
+
+        def address_in(address, length, short, extended):
+            return address in (short if length == 2 else extended)
+
+        def predicate(buffer, start, end):
+            data_length = end - start
+            if data_length < min_data_length:
+                return False
+            if max_data_length is not None and data_length > max_data_length:
+                return False
+            if fcs_valid is not None and bool(buffer[end - 1] & STATUS_FCS_OK) != fcs_valid:
+                return False
+            if check_rssi:
+                rssi = buffer[start + 6]
+                if rssi > 127:
+                    rssi -= 256
+                if (min_rssi is not None and rssi < min_rssi) or (max_rssi is not None and rssi > max_rssi):
+                    return False
+            if not needs_fcf:
+                return True
+
+            mac = start + MAC_OFFSET
+            mac_length = data_length - MAC_OVERHEAD
+            if mac_length < 2:
+                return False
+            fcf = buffer[mac] | (buffer[mac + 1] << 8)
+            if type_table is not None and not type_table[fcf & 7]:
+                return False
+            if not needs_header:
+                return True
+
+            header_length, _, destination_pan, destination, destination_length, source_pan, source, source_length = layout_of(fcf)
+            if header_length > mac_length:
+                return False
+            if pan_ids is not None:
+                if not ((destination_pan >= 0 and (buffer[mac + destination_pan] | (buffer[mac + destination_pan + 1] << 8)) in pan_ids) or
+                        (source_pan >= 0 and (buffer[mac + source_pan] | (buffer[mac + source_pan + 1] << 8)) in pan_ids)):
+                    return False
+            destination_address = read_address(buffer, mac + destination, destination_length) if destination >= 0 else None
+            source_address = read_address(buffer, mac + source, source_length) if source >= 0 else None
+            if destination_short is not None and (destination_address is None or not address_in(destination_address, destination_length, destination_short, destination_extended)):
+                return False
+            if source_short is not None and (source_address is None or not address_in(source_address, source_length, source_short, source_extended)):
+                return False
+            if any_short is not None:
+                if not ((destination_address is not None and address_in(destination_address, destination_length, any_short, any_extended)) or
+                        (source_address is not None and address_in(source_address, source_length, any_short, any_extended))):
+                    return False
+            return True
+
+        return predicate
@@ -0,0 +1,210 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+from enum import Enum
+
+from sniffer_frame import SnifferFrame, DATA_PACKET_INFO
+
+# Start of Frame and End of Frame delimitations
+SOF = b'\x40\x53'
+EOF = b'\x40\x45'
+
+# Largest Command Data accepted: Timestamp (6B) | RSSI (1B) | Frame (up to 2047B, IEEE 802.15.4g) | Status (1B)
+MAX_PACKET_LENGTH = 2055
+# Smallest Command Data of a stream packet: Timestamp, RSSI and Status with an empty frame
+MIN_DATA_PACKET_LENGTH = 8
+
+"""
+Enum to represent the field of the frame the parser is waiting for.
+"""
+class ParserState(Enum):
+    STATE_SOF = 0
+    STATE_PACKET_INFO = 1
+    STATE_PACKET_LENGTH = 2
+    STATE_PAYLOAD = 3
+    STATE_FCS = 4
+    STATE_EOF = 5
+
+"""
+This class is responsible for splitting the serial byte stream of the TI Sniffer into frames.
+Bytes are fed in chunks of any size and kept on a single reusable bytearray.
+The parser walks the frame fields as a state machine and uses the Packet Length field to find the end of the frame,
+so a payload containing the EOF bytes does not end the frame early.
+A single call to feed can return several frames, and an incomplete frame is kept until the next call.
+
+Every frame is validated before it is returned: the Packet Length must be plausible (up to max_packet_length,
+and at least MIN_DATA_PACKET_LENGTH for stream packets), the frame must end with the EOF bytes and, if validate_fcs is True,
+the FCS must match the sum of the Packet Info, Packet Length and Command Data (as TISnifferController._calculate_fcs).
+When a frame is malformed, for example because a byte was lost on the serial link, the parser resynchronizes:
+it looks for the next SOF after the one that started the bad frame, so the frames inside its bytes are not lost.
+The SOF search always continues from where the previous one stopped, so no byte is scanned twice.
+Only the frame being parsed is kept between calls, so the buffer never holds more than one frame of max_packet_length.
+A false SOF can still announce a long frame: calling idle when the link goes quiet discards it, so it cannot hold back the frames after it.
+
+If frame_filter is set, it is called as frame_filter(buffer, start, end) with the Command Data of each stream packet
+(buffer[start:end]) and the packets it rejects are dropped before a SnifferFrame is created (see FrameFilter).
+"""
+class FrameParser:
+    def __init__(self, max_packet_length = MAX_PACKET_LENGTH, validate_fcs = True):
+        self.max_packet_length = max_packet_length
+        self.validate_fcs = validate_fcs
+
+        # Bytes received and not yet consumed
+        self.buffer = bytearray()
+        # Position of the next byte to be parsed
+        self.position = 0
+        # Position of the SOF of the frame being parsed
+        self.frame_start = 0
+        self.state = ParserState.STATE_SOF
+
+        # Device settings attached to every parsed frame
+        self.metadata = None
+        # Predicate on the raw stream packets, None keeps every packet
+        self.frame_filter = None
+
+        # Fields of the frame being parsed
+        self.packet_info = 0
+        self.packet_length = 0
+        self.payload_start = 0
+
+        # Number of malformed frames, each one makes the parser resynchronize
+        self.invalid_frames = 0
+        # Malformed frames by cause: implausible Packet Length, wrong FCS, missing EOF and incomplete when the link went idle
+        self.length_errors = 0
+        self.checksum_errors = 0
+        self.eof_errors = 0
+        self.truncated_frames = 0
+        # Number of bytes skipped while looking for a SOF
+        self.discarded_bytes = 0
+        # Number of stream packets rejected by the frame filter
+        self.filtered_frames = 0
+
+    """
+    Feeds bytes read from the serial port to the parser.
+    Returns a list with every SnifferFrame completed by those bytes.
+    """
+    def feed(self, data) -> list:
+        buffer = self.buffer
+        buffer += data
+        size = len(buffer)
+        position = self.position
+        state = self.state
+        frames = []
+
+        while True:
+            if state is ParserState.STATE_SOF:
+                index = buffer.find(SOF, position)
+                if index < 0:
+                    # The last byte may be the first half of a SOF split between reads
+                    if size - 1 > position:
+                        self.discarded_bytes += size - 1 - position
+                        position = size - 1
+                    break
+                self.discarded_bytes += index - position
+                self.frame_start = index
+                position = index + 2
+                state = ParserState.STATE_PACKET_INFO
+
+            elif state is ParserState.STATE_PACKET_INFO:
+                if position + 1 > size:
+                    break
+                self.packet_info = buffer[position]
+                position += 1
+                state = ParserState.STATE_PACKET_LENGTH
+
+            elif state is ParserState.STATE_PACKET_LENGTH:
+                if position + 2 > size:
+                    break
+                # Packet Length is sent in little endian
+                self.packet_length = buffer[position] | (buffer[position + 1] << 8)
+                if self.packet_length > self.max_packet_length or (self.packet_info == DATA_PACKET_INFO and self.packet_length < MIN_DATA_PACKET_LENGTH):
+                    self.length_errors += 1
+                    position = self._resync()
+                    state = ParserState.STATE_SOF
+                    continue
+                position += 2
+                self.payload_start = position
+                state = ParserState.STATE_PAYLOAD
+
+            elif state is ParserState.STATE_PAYLOAD:
+                if position + self.packet_length > size:
+                    break
+                position += self.packet_length
+                state = ParserState.STATE_FCS
+
+            elif state is ParserState.STATE_FCS:
+                if position + 1 > size:
+                    break
+                position += 1
+                state = ParserState.STATE_EOF
+
+            elif state is ParserState.STATE_EOF:
+                if position + 2 > size:
+                    break
+                fcs_position = position - 1
+                if buffer[position] != 0x40 or buffer[position + 1] != 0x45:
+                    # Not a valid frame, look for the next SOF after the one that started it
+                    self.eof_errors += 1
+                    position = self._resync()
+                elif self.validate_fcs and (self.packet_info + (self.packet_length & 0xFF) + (self.packet_length >> 8) + sum(buffer[self.payload_start:fcs_position])) & 0xFF != buffer[fcs_position]:
+                    self.checksum_errors += 1
+                    position = self._resync()
+                else:
+                    if self.frame_filter is None or self.packet_info != DATA_PACKET_INFO or self.frame_filter(buffer, self.payload_start, fcs_position):
+                        frames.append(SnifferFrame(self.packet_info, bytes(buffer[self.payload_start:fcs_position]), buffer[fcs_position], self.metadata))
+                    else:
+                        self.filtered_frames += 1
+                    position += 2
+                state = ParserState.STATE_SOF
+
+        # Drop consumed bytes, keeping the frame being parsed at the start of the buffer
+        consumed = position if state is ParserState.STATE_SOF else self.frame_start
+        if consumed:
+            del buffer[:consumed]
+            position -= consumed
+            self.frame_start -= consumed
+            self.payload_start -= consumed
+
+        self.position = position
+        self.state = state
+        return frames
+
+    """
+    Tells the parser that the serial link went idle.
+    The TI Sniffer sends each frame at once, so a frame still incomplete when no bytes arrive was started by a false
+    or corrupted SOF. It is discarded and the bytes after its SOF are parsed again.
+    Returns a list with every SnifferFrame found in those bytes.
+    """
+    def idle(self) -> list:
+        if self.state is ParserState.STATE_SOF:
+            return []
+        self.truncated_frames += 1
+        self.position = self._resync()
+        self.state = ParserState.STATE_SOF
+        return self.feed(b'')
+
+    """
+    Counts a malformed frame and returns the position where the search for the next SOF continues:
+    the second byte of the SOF that started the frame, so the bytes of the malformed frame are searched again.
+    """
+    def _resync(self):
+        self.invalid_frames += 1
+        self.discarded_bytes += 1
+        return self.frame_start + 1
+
+    """
+    Discards every buffered byte and waits for a new SOF.
+    """
+    def reset(self):
+        self.buffer.clear()
+        self.position = 0
+        self.frame_start = 0
+        self.state = ParserState.STATE_SOF
@@ -0,0 +1,314 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+import struct
+from collections import namedtuple
+from functools import cached_property
+
+# IEEE 802.15.4 frame types (Frame Control bits 0-2)
+FRAME_TYPE_BEACON = 0
+FRAME_TYPE_DATA = 1
+FRAME_TYPE_ACK = 2
+FRAME_TYPE_COMMAND = 3
+FRAME_TYPE_MULTIPURPOSE = 5
+FRAME_TYPE_FRAGMENT = 6
+FRAME_TYPE_EXTENDED = 7
+
+# Key Identifier length of each Key Identifier Mode of the Auxiliary Security Header
+KEY_IDENTIFIER_LENGTHS = (0, 1, 5, 9)
+
+# Address length of each addressing mode: none, reserved, short and extended
+ADDRESS_LENGTHS = (0, 0, 2, 8)
+
+# Field offsets of each Frame Control value, computed once per value
+_layouts = {}
+
+"""
+Returns the offsets of the MAC header fields of an 802.15.4 frame with the Frame Control fcf, relative to the start of the frame.
+The offsets only depend on the Frame Control, so they are computed once for each value and reused.
+Returns a tuple (header_length, sequence, destination_pan, destination, destination_length, source_pan, source, source_length),
+where absent fields have the offset -1 and length 0. header_length is the length up to the end of the addressing fields.
+"""
+def mac_field_offsets(fcf):
+    layout = _layouts.get(fcf)
+    if layout is None:
+        layout = _layouts[fcf] = _compute_layout(fcf)
+    return layout
+
+"""
+Computes the offsets and lengths returned by mac_field_offsets for a Frame Control value.
+"""
+def _compute_layout(fcf):
+    pan_id_compression = fcf & 0x0040
+    sequence_suppressed = fcf & 0x0100
+    destination_mode = (fcf >> 10) & 3
+    version = (fcf >> 12) & 3
+    source_mode = (fcf >> 14) & 3
+    destination_length = ADDRESS_LENGTHS[destination_mode]
+    source_length = ADDRESS_LENGTHS[source_mode]
+
+    if version < 2:
+        # IEEE 802.15.4-2003/2006: the source PAN is omitted when compressed
+        has_destination_pan = destination_length > 0
+        has_source_pan = source_length > 0 and not pan_id_compression
+    else:
+        # IEEE 802.15.4-2015 table 7-2
+        if not destination_length and not source_length:
+            has_destination_pan, has_source_pan = bool(pan_id_compression), False
+        elif not source_length:
+            has_destination_pan, has_source_pan = not pan_id_compression, False
+        elif not destination_length:
+            has_destination_pan, has_source_pan = False, not pan_id_compression
+        elif destination_mode == 3 and source_mode == 3:
+            has_destination_pan, has_source_pan = not pan_id_compression, False
+        else:
+            has_destination_pan, has_source_pan = True, not pan_id_compression
+
+    offset = 2
+    sequence = -1
+    if not (version == 2 and sequence_suppressed):
+        sequence = offset
+        offset += 1
+    destination_pan = -1
+    if has_destination_pan:
+        destination_pan = offset
+        offset += 2
+    destination = -1
+    if destination_length:
+        destination = offset
+        offset += destination_length
+    source_pan = -1
+    if has_source_pan:
+        source_pan = offset
+        offset += 2
+    source = -1
+    if source_length:
+        source = offset
+        offset += source_length
+    return (offset, sequence, destination_pan, destination, destination_length, source_pan, source, source_length)
+
+"""
+Returns the CRC-16/KERMIT table used by the IEEE 802.15.4 FCS.
+"""
+def _build_crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x8408 if crc & 1 else crc >> 1
+        table.append(crc)
+    return tuple(table)
+
+CRC_TABLE = _build_crc_table()
+
+"""
+Returns the IEEE 802.15.4 FCS (CRC-16/KERMIT) of data.
+"""
+def crc16(data):
+    crc = 0
+    table = CRC_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+"""
+Fields of the Auxiliary Security Header.
+frame_counter, key_source and key_index are None when absent.
+"""
+SecurityHeader = namedtuple('SecurityHeader', ('security_level', 'key_identifier_mode', 'frame_counter', 'key_source', 'key_index', 'length'))
+
+"""
+This class decodes the MAC header of an IEEE 802.15.4 frame (FCS included) without copying it.
+The frame is kept as a memoryview. The Frame Control is read when the object is created and gives the offsets
+of every field (see mac_field_offsets). Every other field is read only when it is accessed, and kept for the next access.
+If the frame is too short for its header, valid is False and the fields that are missing are None.
+
+It can be created from a SnifferFrame with SnifferFrame.mac_header, which keeps the decoder on the frame,
+so filters, statistics and deduplication share the same parse.
+"""
+class MacHeader:
+    __slots__ = ('frame', 'frame_control', 'offsets', '__dict__')
+
+    def __init__(self, frame):
+        self.frame = memoryview(frame)
+        self.frame_control = self.frame[0] | (self.frame[1] << 8) if len(self.frame) >= 2 else 0
+        self.offsets = mac_field_offsets(self.frame_control)
+
+    def __repr__(self):
+        return 'MacHeader(type={}, sequence={}, destination={}/{}, source={}/{}, fcs_ok={})'.format(
+            self.frame_type, self.sequence_number,
+            None if self.destination_pan is None else hex(self.destination_pan), None if self.destination_address is None else hex(self.destination_address),
+            None if self.source_pan is None else hex(self.source_pan), None if self.source_address is None else hex(self.source_address),
+            self.fcs_ok)
+
+    """
+    Frame Control fields.
+    """
+    @property
+    def frame_type(self):
+        return self.frame_control & 0x07
+
+    @property
+    def security_enabled(self):
+        return bool(self.frame_control & 0x0008)
+
+    @property
+    def frame_pending(self):
+        return bool(self.frame_control & 0x0010)
+
+    @property
+    def ack_request(self):
+        return bool(self.frame_control & 0x0020)
+
+    @property
+    def pan_id_compression(self):
+        return bool(self.frame_control & 0x0040)
+
+    @property
+    def ie_present(self):
+        return bool(self.frame_control & 0x0200)
+
+    @property
+    def destination_address_mode(self):
+        return (self.frame_control >> 10) & 3
+
+    @property
+    def frame_version(self):
+        return (self.frame_control >> 12) & 3
+
+    @property
+    def source_address_mode(self):
+        return (self.frame_control >> 14) & 3
+
+    """
+    Returns True if the frame is long enough for its addressing fields and its FCS.
+    """
+    @cached_property
+    def valid(self):
+        return len(self.frame) >= self.offsets[0] + 2
+
+    """
+    Returns the length of the MAC header: Frame Control, Sequence Number, addressing fields and Auxiliary Security Header.
+    Information Elements are part of the payload.
+    """
+    @cached_property
+    def header_length(self):
+        security_header = self.security_header
+        return self.offsets[0] + (security_header.length if security_header is not None else 0)
+
+    """
+    Sequence Number and addressing fields, None when absent or when the frame is too short (little endian ints).
+    """
+    @cached_property
+    def sequence_number(self):
+        offset = self.offsets[1]
+        if offset < 0 or not self.valid:
+            return None
+        return self.frame[offset]
+
+    @cached_property
+    def destination_pan(self):
+        return self._read_uint16(self.offsets[2])
+
+    @cached_property
+    def destination_address(self):
+        return self._read_address(self.offsets[3], self.offsets[4])
+
+    """
+    Returns the source PAN ID. When it is omitted by the PAN ID compression, it is the destination PAN ID.
+    """
+    @cached_property
+    def source_pan(self):
+        if self.offsets[5] < 0 and self.offsets[6] >= 0 and self.pan_id_compression:
+            return self.destination_pan
+        return self._read_uint16(self.offsets[5])
+
+    @cached_property
+    def source_address(self):
+        return self._read_address(self.offsets[6], self.offsets[7])
+
+    """
+    Returns the Auxiliary Security Header (SecurityHeader) or None if security is not enabled or the frame is too short.
+    """
+    @cached_property
+    def security_header(self):
+        if not self.security_enabled or not self.valid:
+            return None
+        frame = self.frame
+        offset = self.offsets[0]
+        if offset >= len(frame) - 2:
+            return None
+        security_control = frame[offset]
+        key_identifier_mode = (security_control >> 3) & 3
+        # Frame Counter Suppression only exists from the 2015 version on
+        counter_suppressed = self.frame_version == 2 and security_control & 0x20
+        length = 1 + (0 if counter_suppressed else 4) + KEY_IDENTIFIER_LENGTHS[key_identifier_mode]
+        if offset + length > len(frame) - 2:
+            return None
+
+        position = offset + 1
+        frame_counter = None
+        if not counter_suppressed:
+            frame_counter = struct.unpack_from('<I', frame, position)[0]
+            position += 4
+        key_source = None
+        key_index = None
+        if key_identifier_mode:
+            key_source_length = KEY_IDENTIFIER_LENGTHS[key_identifier_mode] - 1
+            if key_source_length:
+                key_source = int.from_bytes(frame[position:position + key_source_length], byteorder='little')
+            key_index = frame[position + key_source_length]
+        return SecurityHeader(security_control & 0x07, key_identifier_mode, frame_counter, key_source, key_index, length)
+
+    """
+    Returns a memoryview of the MAC payload, between the MAC header and the FCS.
+    """
+    @cached_property
+    def payload(self):
+        if not self.valid:
+            return self.frame[0:0]
+        return self.frame[self.header_length:len(self.frame) - 2]
+
+    """
+    Returns the FCS at the end of the frame.
+    """
+    @cached_property
+    def fcs(self):
+        if len(self.frame) < 2:
+            return None
+        return self.frame[-2] | (self.frame[-1] << 8)
+
+    """
+    Returns True if the FCS matches the CRC of the frame.
+    """
+    @cached_property
+    def fcs_ok(self):
+        if len(self.frame) < 2:
+            return False
+        return crc16(self.frame[:-2]) == self.fcs
+
+    """
+    Returns the little endian 16-bit field at offset, or None if it is absent or the frame is too short.
+    """
+    def _read_uint16(self, offset):
+        if offset < 0 or not self.valid:
+            return None
+        return self.frame[offset] | (self.frame[offset + 1] << 8)
+
+    """
+    Returns the little endian address of length bytes at offset, or None if it is absent or the frame is too short.
+    """
+    def _read_address(self, offset, length):
+        if offset < 0 or not self.valid:
+            return None
+        if length == 2:
+            return self.frame[offset] | (self.frame[offset + 1] << 8)
+        return int.from_bytes(self.frame[offset:offset + length], byteorder='little')
@@ -10,11 +10,28 @@
 # ////////////////////////////////////////////////////////////////////////////////////////////////////
 
 import struct
+import threading
 import time
 from datetime import datetime, timezone
 
+from capture_stats import CaptureStats
+from compressed_output import CompressedFile, compressed_path
 from wireshark_pipe_factory import WiresharkPipeFactory
 
+# Structs compiled once and shared by every builder
+GLOBAL_HEADER_STRUCT = struct.Struct('IHHiIII')
+PACKET_HEADER_STRUCT = struct.Struct('IIII')
+INTERFACE_STRUCT = struct.Struct('H')
+LENGTH_STRUCT = struct.Struct('>H')
+
+# Offsets inside a record: Packet Header (16B) | IPV4 header (20B) | UDP header (8B) | TI Radio Packet Info
+IPV4_LENGTH_OFFSET = 16 + 2
+UDP_LENGTH_OFFSET = 16 + 20 + 4
+INTERFACE_OFFSET = 16 + 20 + 8 + 4
+RSSI_OFFSET = 16 + 20 + 8 + 4 + 2 + 1 + 1 + 4 + 2
+FCS_OFFSET = RSSI_OFFSET + 1
+PAYLOAD_OFFSET = FCS_OFFSET + 1
+
 """
 This class is responsible for building a pcap file.
 
@@ -32,8 +49,20 @@ class PcapBuilder():
     Pcap info can be found at: https://wiki.wireshark.org/Development/LibpcapOutFormat
     Defult timezone defined as GMT-3 (BRT) 
     Network type 228 is the value for Raw IPV4.
+
+    If buffered is True, packets written with write_frame are coalesced in memory and written
+    when flush_bytes bytes are buffered or flush_interval seconds passed since the last write, whichever comes first.
+
+    Pipes are always written whole records, so a pipe that drops writes never leaves a partial record.
+
+    If index is True, a sidecar index (capture.pcap.idx) with the offset, timestamp, interface, PAN ID and addresses
+    of each record written by write_frame or write_record is written next to the file, see pcap_index.PcapIndex.
+
+    If compression is 'gzip' or 'xz', files are compressed while they are written (capture.pcap.gz or capture.pcap.xz)
+    on a background thread, see compressed_output.CompressedFile. Wireshark opens .pcap.gz files directly.
+    Compressed files have no sidecar index.
     """
-    def __init__(self):
+    def __init__(self, buffered=False, flush_bytes=65536, flush_interval=0.1, index=False, compression=None, compression_level=None):
         self.is_pipe = False
         # File in which the pcap will be saved
         self.pcapOut = None
@@ -51,7 +80,7 @@ class PcapBuilder():
         # Gets the currnt time in UTC and local time
         utc_now = datetime.now(timezone.utc)
         local_now = datetime.now()
-        thiszone = int((local_now - utc_now.replace(tzinfo=None)).total_seconds())
+        thiszone = round((local_now - utc_now.replace(tzinfo=None)).total_seconds())
         self.initial_time = thiszone
 
         self.global_header = {
@@ -101,24 +130,59 @@ class PcapBuilder():
         }
         self.total_length = 0
 
+        # Record templates built for each device metadata, by metadata id
+        # Each template is reused for every packet of that device
+        self.record_templates = {}
+
+        # Buffered writer
+        self.buffered = buffered
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.write_buffer = bytearray()
+        # Reentrant, since the template of a new device can write a header (pcapng) while a packet is written
+        self.write_lock = threading.RLock()
+        self.last_flush = time.monotonic()
+        self.flush_thread = None
+        self.flush_stop = threading.Event()
+
+        # Packet header written by write_packet_header, kept until write_packet completes the record when writing to a pipe
+        # or a compressed file, which must only get whole records, or when the record is indexed
+        self.pending_packet_header = None
+
+        # Sidecar index of the file, files only
+        self.index = index
+        self.index_writer = None
+
+        # Compression of the file, None writes it uncompressed
+        self.compression = compression
+        self.compression_level = compression_level
+
+        # Counters and latency histogram of the writes to the file or pipe, see stats
+        self.capture_stats = CaptureStats(('records', 'bytes_written', 'writes'), ('write',))
+
     """
     Opens a file to write the pcap data.
+    If non_blocking is True, the pipe does not wait for Wireshark to be opened and never stalls the capture (Linux only).
+    Packets written while Wireshark is not attached are discarded, and the global header is sent again when it attaches.
     Returns True if the file/ pipe was opened successfully, False otherwise.
     """
-    def open_pcap(self, output_name, is_pipe=False) -> bool:
+    def open_pcap(self, output_name, is_pipe=False, non_blocking=False) -> bool:
         self.is_pipe = is_pipe
         if is_pipe:
-            self.pcapOut = WiresharkPipeFactory.create_wireshark_pipe()
+            self.pcapOut = WiresharkPipeFactory.create_wireshark_pipe(non_blocking)
             self.pcapOut.open_pipe(output_name)
             self.pcapOut.connect()
 
         if not is_pipe:
-            self.pcapOut = open(output_name, 'wb')
+            self.pcapOut = self._open_file(output_name)
+            self._open_index(output_name)
 
         current_time = int(time.time())
         # Mark initial time
         self.initial_time += current_time
 
+        self._start_flush_thread()
+
         return False if self.pcapOut is None else True
 
     """
@@ -126,8 +190,15 @@ class PcapBuilder():
 
     """
     def close_pcap(self):
+        if self.flush_thread is not None:
+            self.flush_stop.set()
+            self.flush_thread.join()
+            self.flush_thread = None
+        self.flush()
+
         if not self.is_pipe:
             self.pcapOut.close()
+            self._close_index()
             return
         self.pcapOut.close_pipe()
         pass
@@ -144,46 +215,46 @@ class PcapBuilder():
     Network: 4 bytes - Data link type (https://www.tcpdump.org/linktypes.html)
     """
     def write_global_header(self) -> None:
-        # Write global header to a buffer
-        global_header_buffer = bytearray()
-        global_header_buffer.extend(struct.pack('I', self.global_header['magic_number']))   # guint32 -> 'I' em Python
-        global_header_buffer.extend(struct.pack('H', self.global_header['version_major']))  # guint16 -> 'H' em Python
-        global_header_buffer.extend(struct.pack('H', self.global_header['version_minor']))  # guint16 -> 'H' em Python
-        global_header_buffer.extend(struct.pack('i', self.global_header['thiszone']))       # gint32 -> 'i' em Python
-        global_header_buffer.extend(struct.pack('I', self.global_header['sigfigs']))        # guint32 -> 'I' em Python
-        global_header_buffer.extend(struct.pack('I', self.global_header['snaplen']))        # guint32 -> 'I' em Python
-        global_header_buffer.extend(struct.pack('I', self.global_header['network']))        # guint32 -> 'I' em Python
-
         # Write global header from buffer
-        self.pcapOut.write(global_header_buffer)
+        self._write_header(self._build_global_header())
         pass
 
+    """
+    Returns the global header bytes.
+    """
+    def _build_global_header(self):
+        # guint32, guint16, guint16, gint32, guint32, guint32, guint32 -> 'IHHiIII' em Python
+        return GLOBAL_HEADER_STRUCT.pack(
+            self.global_header['magic_number'],
+            self.global_header['version_major'],
+            self.global_header['version_minor'],
+            self.global_header['thiszone'],
+            self.global_header['sigfigs'],
+            self.global_header['snaplen'],
+            self.global_header['network'],
+        )
+
     """
     Writes the packet header to the pcap file.
-    The packet format should be:
-    - sof: Start of Frame bytes.
-    - packet_info: Packet Info byte.
-    - packet_length: Packet Length bytes.
-    - timestamp: Timestamp bytes.
-    - rssi: RSSI bytes.
-    - status: Status bytes.
-    - command_data: Command Data bytes.
-    - fcs: Frame Check Sequence bytes.
-    - eof: End of Frame bytes.
+    The packet should be a SnifferFrame of a stream packet (0xc0), which has:
+    - timestamp: Timestamp in microseconds.
+    - rssi: RSSI value.
+    - status: Status byte.
+    - payload: Command Data bytes.
+    - fcs: Frame Check Sequence byte.
+    - metadata: Interface, PHY, frequency and channel of the device.
     """
     def write_packet_header(self, packet) -> None:
 
         # Calculate total length of the packet
-        self.header_lengths['command_data_lenght'] = len(packet['command_data'])
+        self.header_lengths['command_data_lenght'] = len(packet.payload)
         self.total_length = int(sum(self.header_lengths.values()))
         # print(f'Total length: {self.total_length}')
 
-        packet_time = packet['timestamp']
-        packet_time = self._big_endian_to_little_endian(packet_time)
-        packet_time = int(packet_time, 16)
+        packet_time = packet.timestamp
         packet_time_seconds = packet_time // 1_000_000
-        packet_time_milliseconds = (packet_time % 1_000_000) // 1_000
-        # print(f'Packet time: {packet_time_seconds}.{packet_time_milliseconds}')
+        packet_time_microseconds = packet_time % 1_000_000
+        # print(f'Packet time: {packet_time_seconds}.{packet_time_microseconds}')
 
         if self.is_first_packet:
             self.is_first_packet = False
@@ -192,26 +263,27 @@ class PcapBuilder():
         # Write packet header to a buffer
         packet_header_buffer = bytearray()
         packet_header_buffer.extend(struct.pack('I', int(self.initial_time + packet_time_seconds)))     # guint32 -> 'I' em Python
-        packet_header_buffer.extend(struct.pack('I', int(packet_time_milliseconds)))    # guint32 -> 'I' em Python
+        packet_header_buffer.extend(struct.pack('I', int(packet_time_microseconds)))    # guint32 -> 'I' em Python
         packet_header_buffer.extend(struct.pack('I', int(self.total_length)))   # guint32 -> 'I' em Python
         packet_header_buffer.extend(struct.pack('I', int(self.total_length)))   # guint32 -> 'I' em Python
 
         # Write packet header from buffer
-        self.pcapOut.write(packet_header_buffer)
+        # A pipe, a compressed file or the index gets it together with the packet data, see write_packet
+        if self.is_pipe or self.compression or self.index_writer is not None:
+            self.pending_packet_header = packet_header_buffer
+            return
+        self._write(packet_header_buffer)
         pass
 
     """
     Writes the packet data to the pcap file.
-    The packet format should be:
-    - sof: Start of Frame bytes.
-    - packet_info: Packet Info byte.
-    - packet_length: Packet Length bytes.
-    - timestamp: Timestamp bytes.
-    - rssi: RSSI bytes.
-    - status: Status bytes.
-    - command_data: Command Data bytes.
-    - fcs: Frame Check Sequence bytes.
-    - eof: End of Frame bytes.
+    The packet should be a SnifferFrame of a stream packet (0xc0), which has:
+    - timestamp: Timestamp in microseconds.
+    - rssi: RSSI value.
+    - status: Status byte.
+    - payload: Command Data bytes.
+    - fcs: Frame Check Sequence byte.
+    - metadata: Interface, PHY, frequency and channel of the device.
     """
     def write_packet(self, packet):
         """
@@ -233,54 +305,281 @@ class PcapBuilder():
         self.ipv4_header = self.ipv4_header[:2] + struct.pack('>H', self.total_length) + self.ipv4_header[4:]
         self.udp_header = self.udp_header[:4] + struct.pack('>H', (self.total_length - 20)) + self.udp_header[6:]
 
+        metadata = packet.metadata
 
         # Write TI packet info
         ti_packet_info = {
             # TI radio packet info starts with 0x00 0x3c 0x00 0x00
             'header': self.ti_header,
             # Interface is the com port number (2B)
-            'interface': packet['interface'],
+            'interface': metadata.interface,
             # After that the package is separated by 0x02
             'separator': self.separator,
             # PHY config (1B)
-            'phy': packet['phy'],
+            'phy': metadata.phy,
             # Frequency (4B) (2B - freq. 2B - fraq. freq.)
-            'frequency': packet['frequency'],
+            'frequency': metadata.frequency,
             # Channel (2B)
-            'channel': packet['channel'],
+            'channel': metadata.channel,
             # RSSI (1B)
-            'rssi': packet['rssi'],
+            'rssi': packet.rssi & 0xFF,
             # Frame control sequence (1B) normally 0x80
-            'fcs': packet['fcs'],
+            'fcs': packet.fcs,
             # Command data (variable)
-            'payload': packet['command_data'],
+            'payload': packet.payload,
         }
 
         # Write data to a buffer
         buffer = bytearray()
         buffer.extend(self.ipv4_header)
         buffer.extend(self.udp_header)
-        buffer.extend(struct.pack('4B', *ti_packet_info['header']))
+        buffer.extend(ti_packet_info['header'])
         buffer.extend(struct.pack('H', ti_packet_info['interface']))
         buffer.extend(ti_packet_info['separator'])
-        buffer.extend(bytes([ti_packet_info['phy']]))
-        buffer.extend(struct.pack('4B', *ti_packet_info['frequency']))
-        buffer.extend(struct.pack('2B', *ti_packet_info['channel']))
-        buffer.extend(bytes.fromhex(ti_packet_info['rssi']))
-        buffer.extend(bytes.fromhex(ti_packet_info['fcs']))
+        buffer.append(ti_packet_info['phy'])
+        buffer.extend(ti_packet_info['frequency'])
+        buffer.extend(ti_packet_info['channel'])
+        buffer.append(ti_packet_info['rssi'])
+        buffer.append(ti_packet_info['fcs'])
         buffer.extend(ti_packet_info['payload'])
 
         # Write data from buffer
-        self.pcapOut.write(buffer)
+        if self.pending_packet_header is not None:
+            buffer[0:0] = self.pending_packet_header
+            self.pending_packet_header = None
+            if self.index_writer is not None:
+                self.index_writer.add(buffer, packet.payload)
+        self._write(buffer)
+        self.capture_stats.counters['records'] += 1
 
 
         pass
 
     """
-    Aux function to convert big endian string to little endian string.
+    Writes a packet (header and data) to the pcap file.
+    Produces the same bytes as write_packet_header followed by write_packet, but the constant part of the record
+    (IPV4, UDP and TI headers, interface, PHY, frequency and channel) is built once for each device metadata
+    and only the lengths, timestamp, RSSI and FCS are filled for each packet.
+    In buffered mode the record is appended to the write buffer instead of being written immediately.
+    The shared template is filled and written under write_lock, so several threads can write to the same builder.
+    """
+    def write_frame(self, packet) -> None:
+        with self.write_lock:
+            record, payload = self._fill_record(packet)
+            self.capture_stats.counters['records'] += 1
+            if self.index_writer is not None:
+                self.index_writer.add(record, payload)
+
+            if not self.buffered:
+                self._write_out(record + payload)
+                return
+
+            write_buffer = self.write_buffer
+            write_buffer += record
+            write_buffer += payload
+            if len(write_buffer) >= self.flush_bytes or time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush_locked()
+
+    """
+    Returns the bytes of the record (packet header and data) of a packet, the same bytes written by write_frame.
+    Used to serialize a packet once and write it to several outputs with write_record.
+    """
+    def build_record(self, packet) -> bytes:
+        with self.write_lock:
+            record, payload = self._fill_record(packet)
+            return bytes(record) + payload
+
+    """
+    Writes a record built by build_record to the pcap file.
+    """
+    def write_record(self, record) -> None:
+        with self.write_lock:
+            self.capture_stats.counters['records'] += 1
+            if self.index_writer is not None:
+                self.index_writer.add(record, memoryview(record)[PAYLOAD_OFFSET:])
+
+            if not self.buffered:
+                self._write_out(record)
+                return
+
+            self.write_buffer += record
+            if len(self.write_buffer) >= self.flush_bytes or time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush_locked()
+
+    """
+    Fills the record template of the packet device with the packet lengths, timestamp, RSSI and FCS.
+    Returns the template, which is reused by the next packet, and the payload. Must be called with write_lock held.
+    """
+    def _fill_record(self, packet):
+        metadata = packet.metadata
+        entry = self.record_templates.get(id(metadata))
+        if entry is None or entry[0] is not metadata:
+            entry = self._build_record_template(metadata)
+        record = entry[1]
+
+        payload = packet.payload
+        total_length = RSSI_OFFSET - 16 + 2 + len(payload)
+
+        packet_time = packet.timestamp
+        packet_time_seconds = packet_time // 1_000_000
+        if self.is_first_packet:
+            self.is_first_packet = False
+            self.initial_time -= packet_time_seconds
+
+        PACKET_HEADER_STRUCT.pack_into(record, 0, self.initial_time + packet_time_seconds, packet_time % 1_000_000, total_length, total_length)
+        LENGTH_STRUCT.pack_into(record, IPV4_LENGTH_OFFSET, total_length)
+        LENGTH_STRUCT.pack_into(record, UDP_LENGTH_OFFSET, total_length - 20)
+        record[RSSI_OFFSET] = packet.rssi & 0xFF
+        record[FCS_OFFSET] = packet.fcs
+        return record, payload
+
+    """
+    Writes data to the pcap file, or to the write buffer in buffered mode.
+    """
+    def _write(self, data):
+        if not self.buffered:
+            self._write_out(data)
+            return
+        with self.write_lock:
+            self.write_buffer += data
+            if len(self.write_buffer) >= self.flush_bytes:
+                self._flush_locked()
+
+    """
+    Writes data that starts the file, like the global header.
+    Pipes keep it to send it again to each new reader.
+    """
+    def _write_header(self, data):
+        if not self.is_pipe:
+            self._write(data)
+            return
+        with self.write_lock:
+            self._flush_locked()
+            self.pcapOut.write_header(data)
+
+    """
+    Writes every buffered packet to the pcap file.
+    """
+    def flush(self) -> None:
+        with self.write_lock:
+            self._flush_locked()
+            if self.compression and not self.is_pipe:
+                # Hands the partial batch to the compression thread
+                self.pcapOut.flush()
+            if self.index_writer is not None:
+                self.index_writer.flush()
+
+    """
+    Opens a file for writing, compressed if compression is set.
+    """
+    def _open_file(self, path):
+        if self.compression:
+            return CompressedFile(compressed_path(path, self.compression), self.compression, self.compression_level)
+        return open(path, 'wb')
+
+    """
+    Starts the sidecar index of a file, if index is enabled.
+    """
+    def _open_index(self, path):
+        if self.index and not self.compression:
+            # Imported here because pcap_index uses the record layout defined in this module
+            from pcap_index import PcapIndexWriter, index_path
+            self.index_writer = PcapIndexWriter(index_path(path), self.global_header['thiszone'])
+
+    """
+    Writes the rest of the sidecar index and closes it.
+    """
+    def _close_index(self):
+        if self.index_writer is not None:
+            self.index_writer.close()
+            self.index_writer = None
+
+    """
+    Writes the write buffer out and restarts the flush interval. Must be called with write_lock held.
+    """
+    def _flush_locked(self):
+        if self.write_buffer:
+            self._write_out(self.write_buffer)
+            self.write_buffer.clear()
+        self.last_flush = time.monotonic()
+
+    """
+    Writes data to the file or pipe, updating the write counters and latency histogram.
+    """
+    def _write_out(self, data):
+        write_start = time.perf_counter_ns()
+        self.pcapOut.write(data)
+        self.capture_stats.latency['write'].observe(time.perf_counter_ns() - write_start)
+        counters = self.capture_stats.counters
+        counters['bytes_written'] += len(data)
+        counters['writes'] += 1
+
+    """
+    Returns a snapshot of the output statistics:
+    - counters: Packets written (records), bytes written to the file or pipe (bytes_written) and number of writes (writes).
+      Non-blocking pipes add their own counters (pipe_connections, pipe_dropped_writes...),
+      and compressed files theirs (compressed_bytes, uncompressed_bytes, dropped_bytes, queued_batches).
+      In buffered mode each write carries several packets.
+    - latency_us: Histogram of the time spent on each write to the file or pipe, in microseconds.
+    The snapshot can be exported with capture_stats.PrometheusExporter.
+    """
+    def stats(self) -> dict:
+        snapshot = self.capture_stats.snapshot()
+        # Counters of the non-blocking pipe (connections, dropped writes...) or of the compressed file
+        if hasattr(self.pcapOut, 'stats'):
+            snapshot['counters'].update(self.pcapOut.stats())
+        return snapshot
+
+    """
+    Starts the thread that flushes the buffered packets even when no new packets arrive.
+    """
+    def _start_flush_thread(self):
+        if self.buffered and self.flush_interval:
+            self.flush_stop.clear()
+            self.flush_thread = threading.Thread(target=self._flush_loop, name='pcap-flush', daemon=True)
+            self.flush_thread.start()
+
+    """
+    Background thread of the buffered mode that flushes packets older than flush_interval.
+    """
+    def _flush_loop(self):
+        while not self.flush_stop.wait(self.flush_interval):
+            with self.write_lock:
+                if self.write_buffer and time.monotonic() - self.last_flush >= self.flush_interval:
+                    self._flush_locked()
+
+    """
+    Builds the record template for a device metadata.
+    The template is a reusable buffer with the Packet Header, IPV4 and UDP headers and the TI Radio Packet Info up to the FCS.
+    Returns a tuple with the metadata and the template.
+    """
+    def _build_record_template(self, metadata):
+        record = bytearray(16) + self._build_ti_prefix(metadata) + bytearray(2)
+        return self._cache_record_template(metadata, record)
+
+    """
+    Returns the IPV4 and UDP headers and the TI Radio Packet Info up to the channel for a device metadata.
+    The IPV4 and UDP lengths must be filled for each packet.
+    """
+    def _build_ti_prefix(self, metadata):
+        prefix = bytearray()
+        prefix.extend(self.ipv4_header)
+        prefix.extend(self.udp_header)
+        prefix.extend(self.ti_header)
+        prefix.extend(INTERFACE_STRUCT.pack(metadata.interface))
+        prefix.extend(self.separator)
+        prefix.append(metadata.phy)
+        prefix.extend(metadata.frequency)
+        prefix.extend(metadata.channel)
+        return prefix
+
+    """
+    Stores a record template for a device metadata.
+    Metadata objects are replaced when the device settings change, so old templates are discarded from time to time.
     """
-    def _big_endian_to_little_endian(self, big_endian):
-        bytes_array = [big_endian[i:i+2] for i in range(0, len(big_endian), 2)]
-        bytes_array.reverse()
-        bytes_array = ''.join(bytes_array)
-        return bytes_array
\ No newline at end of file
+    def _cache_record_template(self, metadata, record, *extra):
+        if len(self.record_templates) >= 64:
+            self.record_templates.clear()
+        entry = (metadata, record, *extra)
+        self.record_templates[id(metadata)] = entry
+        return entry
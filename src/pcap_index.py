@@ -0,0 +1,314 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+import argparse
+import mmap
+import struct
+from bisect import bisect_left
+from collections import namedtuple
+
+from frame_filter import parse_address, address_matches
+from mac_header import mac_field_offsets
+from pcap_builder import GLOBAL_HEADER_STRUCT, PACKET_HEADER_STRUCT, INTERFACE_OFFSET, PAYLOAD_OFFSET
+
+# Suffix of the index file of a capture, for example capture.pcap -> capture.pcap.idx
+INDEX_SUFFIX = '.idx'
+
+# Index file: Magic (4B) | Version (2B) | Entry Size (2B) | Entries
+INDEX_MAGIC = b'PNIX'
+# Version 2 stores UTC timestamps, version 1 stored the local time of the pcap packet headers
+INDEX_VERSION = 2
+INDEX_HEADER_STRUCT = struct.Struct('<4sHH')
+# Entry: File Offset (8B) | Timestamp (8B) | Source (8B) | Destination (8B) | Interface (2B) | PAN ID (2B) | Record Length (2B)
+#        | Destination Length (1B) | Source Length (1B)
+INDEX_ENTRY_STRUCT = struct.Struct('<QQQQHHHBB')
+TIMESTAMP_OFFSET = 8
+
+# PAN ID of the entries of frames without PAN ID, the same as the broadcast PAN ID
+NO_PAN_ID = 0xFFFF
+# Index entry fields of frames without addresses: source, destination, PAN ID, destination length and source length
+NO_ADDRESSES = (0, 0, NO_PAN_ID, 0, 0)
+# Bytes of index entries kept in memory before they are written
+INDEX_FLUSH_BYTES = 65536
+
+"""
+Entry of the index of a capture:
+- offset: Offset of the record (packet header and data) in the pcap file.
+- timestamp: Timestamp of the record in microseconds since the epoch (UTC), the pcap timestamp minus the thiszone of the file.
+- source / destination: 802.15.4 source and destination addresses as int, 0 if absent.
+- interface: Interface number of the device that captured the packet.
+- pan_id: Destination PAN ID, or the source PAN ID if there is no destination PAN ID, NO_PAN_ID if absent.
+- length: Length of the record, packet header included.
+- destination_length / source_length: Length of the addresses (2 for short, 8 for extended, 0 if absent).
+"""
+IndexEntry = namedtuple('IndexEntry', ('offset', 'timestamp', 'source', 'destination', 'interface', 'pan_id', 'length', 'destination_length', 'source_length'))
+
+"""
+Returns the path of the index file of a capture.
+"""
+def index_path(pcap_path):
+    return pcap_path + INDEX_SUFFIX
+
+"""
+Returns the index entry fields (source, destination, pan_id, destination_length, source_length) of an 802.15.4 frame.
+Frames too short for the addressing fields of their Frame Control have no addresses.
+"""
+def decode_addresses(frame):
+    if len(frame) < 2:
+        return NO_ADDRESSES
+    header_length, _, destination_pan, destination, destination_length, source_pan, source, source_length = mac_field_offsets(frame[0] | (frame[1] << 8))
+    if header_length > len(frame):
+        return NO_ADDRESSES
+
+    pan_offset = destination_pan if destination_pan >= 0 else source_pan
+    pan_id = frame[pan_offset] | (frame[pan_offset + 1] << 8) if pan_offset >= 0 else NO_PAN_ID
+    # Short addresses are read byte by byte, which is faster than int.from_bytes on a slice
+    if source_length == 2:
+        source_address = frame[source] | (frame[source + 1] << 8)
+    else:
+        source_address = int.from_bytes(frame[source:source + 8], byteorder='little') if source_length else 0
+    if destination_length == 2:
+        destination_address = frame[destination] | (frame[destination + 1] << 8)
+    else:
+        destination_address = int.from_bytes(frame[destination:destination + 8], byteorder='little') if destination_length else 0
+    return source_address, destination_address, pan_id, destination_length, source_length
+
+"""
+This class writes the index of a pcap file while the file is written, one entry for each record (see IndexEntry).
+Entries are kept in memory and written every INDEX_FLUSH_BYTES bytes, when flush is called and when the index is closed.
+Records must be added in the order they are written to the pcap file, which is expected to start with the global header.
+thiszone is the thiszone field of that global header (local time minus UTC, in seconds), which PcapBuilder adds
+to the packet header timestamps and is subtracted from them, so index timestamps are in UTC.
+"""
+class PcapIndexWriter:
+    def __init__(self, path, thiszone = 0):
+        self.path = path
+        self.thiszone = thiszone
+        self.file = open(path, 'wb')
+        self.file.write(INDEX_HEADER_STRUCT.pack(INDEX_MAGIC, INDEX_VERSION, INDEX_ENTRY_STRUCT.size))
+        self.buffer = bytearray()
+        # Offset of the next record, after the global header
+        self.offset = GLOBAL_HEADER_STRUCT.size
+        self.entries = 0
+
+    """
+    Adds the entry of a record. record holds at least the packet header and the TI Radio Packet Info up to the FCS,
+    like the record templates of PcapBuilder, and frame is the 802.15.4 frame of the record.
+    """
+    def add(self, record, frame) -> None:
+        seconds, microseconds, length, _ = PACKET_HEADER_STRUCT.unpack_from(record, 0)
+        length += PACKET_HEADER_STRUCT.size
+        source, destination, pan_id, destination_length, source_length = decode_addresses(frame)
+        interface = record[INTERFACE_OFFSET] | (record[INTERFACE_OFFSET + 1] << 8)
+        self.buffer += INDEX_ENTRY_STRUCT.pack(self.offset, (seconds - self.thiszone) * 1_000_000 + microseconds, source, destination,
+                                               interface, pan_id, length, destination_length, source_length)
+        self.offset += length
+        self.entries += 1
+        if len(self.buffer) >= INDEX_FLUSH_BYTES:
+            self.flush()
+
+    """
+    Writes the entries kept in memory to the index file.
+    """
+    def flush(self) -> None:
+        if self.buffer:
+            self.file.write(self.buffer)
+            self.buffer.clear()
+        self.file.flush()
+
+    """
+    Writes the entries kept in memory and closes the index file.
+    """
+    def close(self):
+        self.flush()
+        self.file.close()
+
+"""
+Builds the index of a pcap file written by PcapBuilder, for captures written without one.
+Returns the number of records indexed.
+"""
+def build_index(pcap_path, output_path = None) -> int:
+    with open(pcap_path, 'rb') as pcap_file:
+        size = pcap_file.seek(0, 2)
+        if size <= GLOBAL_HEADER_STRUCT.size:
+            PcapIndexWriter(output_path or index_path(pcap_path)).close()
+            return 0
+        with mmap.mmap(pcap_file.fileno(), 0, access=mmap.ACCESS_READ) as pcap_map:
+            view = memoryview(pcap_map)
+            thiszone = GLOBAL_HEADER_STRUCT.unpack_from(view, 0)[3]
+            writer = PcapIndexWriter(output_path or index_path(pcap_path), thiszone)
+            offset = GLOBAL_HEADER_STRUCT.size
+            while offset + PAYLOAD_OFFSET <= size:
+                length = PACKET_HEADER_STRUCT.size + PACKET_HEADER_STRUCT.unpack_from(view, offset)[2]
+                if offset + length > size:
+                    # Record cut by the end of the file
+                    break
+                writer.add(view[offset:offset + PAYLOAD_OFFSET], view[offset + PAYLOAD_OFFSET:offset + length])
+                offset += length
+            view.release()
+    writer.close()
+    return writer.entries
+
+"""
+Timestamps of the index entries as a sequence, to binary search them without reading the whole index.
+"""
+class _TimestampColumn:
+    def __init__(self, index):
+        self.view = index.view
+        self.start = INDEX_HEADER_STRUCT.size + TIMESTAMP_OFFSET
+        self.entry_size = index.entry_size
+        self.length = len(index)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, position):
+        return struct.unpack_from('<Q', self.view, self.start + position * self.entry_size)[0]
+
+"""
+This class answers queries on a capture through its index, without reading the pcap file.
+Both files are memory-mapped, so only the parts that are needed are read from disk, and matching records are copied
+to a new pcap file straight from the mapped file with extract.
+
+Time ranges are found by binary search on the timestamps, which assumes the records were written in timestamp order
+(as written by TISnifferController and CaptureManager). Address, PAN and interface conditions are checked on the index entries
+of the time range, which are a small fixed-size part of the capture.
+"""
+class PcapIndex:
+    def __init__(self, pcap_path, path = None):
+        self.pcap_path = pcap_path
+        self.path = path or index_path(pcap_path)
+        self.pcap_file = open(pcap_path, 'rb')
+        self.index_file = open(self.path, 'rb')
+        self.pcap_map = mmap.mmap(self.pcap_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.index_map = mmap.mmap(self.index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.pcap_view = memoryview(self.pcap_map)
+        self.view = memoryview(self.index_map)
+
+        magic, version, self.entry_size = INDEX_HEADER_STRUCT.unpack_from(self.view, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION or self.entry_size != INDEX_ENTRY_STRUCT.size:
+            self.close()
+            raise ValueError('{} is not a pcap index.'.format(self.path))
+        # Entries of records cut by the end of the pcap file are ignored
+        self.entry_count = (len(self.view) - INDEX_HEADER_STRUCT.size) // self.entry_size
+        while self.entry_count and self[self.entry_count - 1].offset + self[self.entry_count - 1].length > len(self.pcap_view):
+            self.entry_count -= 1
+
+    def __len__(self):
+        return self.entry_count
+
+    def __getitem__(self, position) -> IndexEntry:
+        if not 0 <= position < self.entry_count:
+            raise IndexError('Index entry out of range.')
+        return IndexEntry._make(INDEX_ENTRY_STRUCT.unpack_from(self.view, INDEX_HEADER_STRUCT.size + position * self.entry_size))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    """
+    Returns the range of entry positions with timestamps from start to end (in seconds since the epoch).
+    """
+    def time_range(self, start = None, end = None) -> range:
+        timestamps = _TimestampColumn(self)
+        first = 0 if start is None else bisect_left(timestamps, int(start * 1_000_000))
+        last = self.entry_count if end is None else bisect_left(timestamps, int(end * 1_000_000) + 1, first)
+        return range(first, last)
+
+    """
+    Returns the entries (IndexEntry) of the records matching every given condition, in file order:
+    - start / end: Timestamp range in seconds since the epoch, both included.
+    - address: Source or destination address. source / destination: Source or destination address only.
+      Addresses can be given as int, 2 or 8 bytes or hex string, as in FrameFilter.
+    - pan_id: Destination or source PAN ID (the one kept in the index).
+    - interface: Interface number of the device.
+    """
+    def query(self, start = None, end = None, address = None, source = None, destination = None, pan_id = None, interface = None) -> list:
+        positions = self.time_range(start, end)
+        address = None if address is None else parse_address(address)
+        source = None if source is None else parse_address(source)
+        destination = None if destination is None else parse_address(destination)
+
+        begin = INDEX_HEADER_STRUCT.size + positions.start * self.entry_size
+        entries = self.view[begin:begin + len(positions) * self.entry_size]
+        matches = []
+        for fields in INDEX_ENTRY_STRUCT.iter_unpack(entries):
+            _, _, entry_source, entry_destination, entry_interface, entry_pan_id, _, destination_length, source_length = fields
+            if address is not None and not (address_matches(entry_source, source_length, *address) or
+                                           address_matches(entry_destination, destination_length, *address)):
+                continue
+            if source is not None and not address_matches(entry_source, source_length, *source):
+                continue
+            if destination is not None and not address_matches(entry_destination, destination_length, *destination):
+                continue
+            if pan_id is not None and entry_pan_id != pan_id:
+                continue
+            if interface is not None and entry_interface != interface:
+                continue
+            matches.append(IndexEntry._make(fields))
+        entries.release()
+        return matches
+
+    """
+    Writes the records of the given entries to a new pcap file, with the global header of the capture.
+    Records are written straight from the mapped capture, without being copied in memory.
+    Returns the number of records written.
+    """
+    def extract(self, entries, output_path) -> int:
+        view = self.pcap_view
+        with open(output_path, 'wb') as output_file:
+            output_file.write(view[:GLOBAL_HEADER_STRUCT.size])
+            for entry in entries:
+                output_file.write(view[entry.offset:entry.offset + entry.length])
+        return len(entries)
+
+    """
+    Unmaps and closes both files.
+    """
+    def close(self):
+        self.pcap_view.release()
+        self.view.release()
+        self.pcap_map.close()
+        self.index_map.close()
+        self.pcap_file.close()
+        self.index_file.close()
+
+
+"""
+Extracts the records matching a query from a capture, building its index first if asked.
+"""
+if __name__ == '__main__':
+    def number(value):
+        return int(value, 0)
+
+    argument_parser = argparse.ArgumentParser(description='Queries a pcap capture through its sidecar index.')
+    argument_parser.add_argument('pcap', help='Capture written by PcapBuilder.')
+    argument_parser.add_argument('--build', action='store_true', help='Build the index of the capture before the query.')
+    argument_parser.add_argument('--start', type=float, default=None, help='Start of the time range, in seconds since the epoch.')
+    argument_parser.add_argument('--end', type=float, default=None, help='End of the time range, in seconds since the epoch.')
+    argument_parser.add_argument('--address', default=None, help='Source or destination address (0x1234 or 00:12:4b:00:01:02:03:04).')
+    argument_parser.add_argument('--source', default=None, help='Source address.')
+    argument_parser.add_argument('--destination', default=None, help='Destination address.')
+    argument_parser.add_argument('--pan-id', type=number, default=None, help='PAN ID.')
+    argument_parser.add_argument('--interface', type=int, default=None, help='Interface number of the device.')
+    argument_parser.add_argument('--output', default=None, help='Pcap file for the matching records, only counted if not given.')
+    arguments = argument_parser.parse_args()
+
+    if arguments.build:
+        print('[INFO] Indexed {} records.'.format(build_index(arguments.pcap)))
+    with PcapIndex(arguments.pcap) as capture_index:
+        matches = capture_index.query(arguments.start, arguments.end, arguments.address, arguments.source, arguments.destination, arguments.pan_id, arguments.interface)
+        print('[INFO] {} of {} records match.'.format(len(matches), len(capture_index)))
+        if arguments.output:
+            capture_index.extract(matches, arguments.output)
+            print('[INFO] Records written to {}.'.format(arguments.output))
@@ -0,0 +1,271 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+import struct
+import time
+
+from pcap_builder import PcapBuilder, LENGTH_STRUCT
+
+# Block types
+SECTION_HEADER_BLOCK = 0x0A0D0D0A
+INTERFACE_DESCRIPTION_BLOCK = 0x00000001
+INTERFACE_STATISTICS_BLOCK = 0x00000005
+ENHANCED_PACKET_BLOCK = 0x00000006
+
+# Option codes
+OPT_ENDOFOPT = 0
+SHB_USERAPPL = 4
+IF_NAME = 2
+IF_DESCRIPTION = 3
+IF_TSRESOL = 9
+ISB_STARTTIME = 2
+ISB_ENDTIME = 3
+ISB_IFRECV = 4
+
+BLOCK_HEADER_STRUCT = struct.Struct('<II')
+BLOCK_LENGTH_STRUCT = struct.Struct('<I')
+SECTION_HEADER_STRUCT = struct.Struct('<IHHq')
+INTERFACE_DESCRIPTION_STRUCT = struct.Struct('<HHI')
+OPTION_HEADER_STRUCT = struct.Struct('<HH')
+TIMESTAMP_STRUCT = struct.Struct('<II')
+EPB_HEADER_STRUCT = struct.Struct('<IIII')
+ISB_HEADER_STRUCT = struct.Struct('<III')
+COUNTER_STRUCT = struct.Struct('<Q')
+
+# Offsets inside an Enhanced Packet Block: Block Type (4B) | Block Length (4B) | Interface ID (4B) | Timestamp (8B) | Lengths (8B) | Packet Data
+EPB_LENGTH_OFFSET = 4
+EPB_TIMESTAMP_OFFSET = 12
+EPB_DATA_OFFSET = 28
+EPB_IPV4_LENGTH_OFFSET = EPB_DATA_OFFSET + 2
+EPB_UDP_LENGTH_OFFSET = EPB_DATA_OFFSET + 20 + 4
+EPB_RSSI_OFFSET = EPB_DATA_OFFSET + 20 + 8 + 4 + 2 + 1 + 1 + 4 + 2
+EPB_FCS_OFFSET = EPB_RSSI_OFFSET + 1
+EPB_PAYLOAD_OFFSET = EPB_FCS_OFFSET + 1
+
+PADDING = (b'', b'\x00\x00\x00', b'\x00\x00', b'\x00')
+
+"""
+This class is responsible for building a pcapng file.
+It writes the same packet data as the PcapBuilder (IPV4, UDP and TI Radio Packet Info), but:
+- Each sniffer device (interface, PHY, frequency and channel) has its own Interface Description Block,
+  with the PHY and frequency in its description.
+- Timestamps keep the microsecond resolution given by the device.
+- Interface Statistics Blocks with the number of packets of each interface are written every stats_interval seconds and when the file is closed.
+- Packets are written in batches, since the builder is buffered by default.
+
+The .pcapng file is organized as follows:
+- Section Header Block
+- Interface Description Block (before the first packet of each device)
+- Enhanced Packet Block
+- [...]
+- Interface Statistics Block (one for each interface)
+- [...]
+
+Pcapng info can be found at: https://www.ietf.org/archive/id/draft-ietf-opsawg-pcapng-02.html
+"""
+class PcapngBuilder(PcapBuilder):
+    def __init__(self, buffered=True, flush_bytes=65536, flush_interval=0.1, stats_interval=10):
+        super().__init__(buffered, flush_bytes, flush_interval)
+        # Time in seconds between Interface Statistics Blocks
+        self.stats_interval = stats_interval
+        self.last_stats = time.monotonic()
+
+        # Interface ID of each device metadata, by its value
+        self.interface_ids = {}
+        self.interface_packets = []
+        self.interface_start_times = []
+
+        # Offset added to the device timestamps to get microseconds since the epoch
+        self.start_time = int(time.time() * 1_000_000)
+        self.time_offset = 0
+        self.last_timestamp = 0
+
+    """
+    Writes the Section Header Block.
+    """
+    def write_global_header(self) -> None:
+        self.start_time = int(time.time() * 1_000_000)
+        options = self._build_option(SHB_USERAPPL, b'Pyniffer') + self._build_option(OPT_ENDOFOPT, b'')
+        # Byte order magic, version 1.0 and unknown section length
+        body = SECTION_HEADER_STRUCT.pack(0x1A2B3C4D, 1, 0, -1) + options
+        self._write_header(self._build_block(SECTION_HEADER_BLOCK, body))
+
+    """
+    The packet header is part of the Enhanced Packet Block written by write_packet.
+    """
+    def write_packet_header(self, packet) -> None:
+        pass
+
+    """
+    Writes a packet as an Enhanced Packet Block.
+    """
+    def write_packet(self, packet):
+        self.write_frame(packet)
+
+    """
+    Records of PcapBuilder have a pcap packet header, which is not valid in a pcapng file.
+    Raises NotImplementedError, use write_frame instead.
+    """
+    def build_record(self, packet) -> bytes:
+        raise NotImplementedError('PcapngBuilder does not build pcap records, use write_frame instead.')
+
+    """
+    Records of PcapBuilder have a pcap packet header, which is not valid in a pcapng file.
+    Raises NotImplementedError, use write_frame instead.
+    """
+    def write_record(self, record) -> None:
+        raise NotImplementedError('PcapngBuilder does not write pcap records, use write_frame instead.')
+
+    """
+    Writes a packet as an Enhanced Packet Block.
+    The Interface Description Block of its device is written before the first packet of that device,
+    and the Interface Statistics Blocks after it when stats_interval seconds have passed since the last ones.
+    """
+    def write_frame(self, packet) -> None:
+        with self.write_lock:
+            metadata = packet.metadata
+            entry = self.record_templates.get(id(metadata))
+            if entry is None or entry[0] is not metadata:
+                entry = self._build_record_template(metadata)
+            record = entry[1]
+            self.interface_packets[entry[2]] += 1
+
+            payload = packet.payload
+            data_length = EPB_PAYLOAD_OFFSET - EPB_DATA_OFFSET + len(payload)
+            padding = PADDING[data_length & 3]
+            block_length = EPB_PAYLOAD_OFFSET + len(payload) + len(padding) + 4
+
+            if self.is_first_packet:
+                self.is_first_packet = False
+                self.time_offset = self.start_time - packet.timestamp
+            timestamp = self.time_offset + packet.timestamp
+            self.last_timestamp = timestamp
+
+            BLOCK_LENGTH_STRUCT.pack_into(record, EPB_LENGTH_OFFSET, block_length)
+            EPB_HEADER_STRUCT.pack_into(record, EPB_TIMESTAMP_OFFSET, timestamp >> 32, timestamp & 0xFFFFFFFF, data_length, data_length)
+            LENGTH_STRUCT.pack_into(record, EPB_IPV4_LENGTH_OFFSET, data_length)
+            LENGTH_STRUCT.pack_into(record, EPB_UDP_LENGTH_OFFSET, data_length - 20)
+            record[EPB_RSSI_OFFSET] = packet.rssi & 0xFF
+            record[EPB_FCS_OFFSET] = packet.fcs
+            self.capture_stats.counters['records'] += 1
+
+            if not self.buffered:
+                self._write_out(record + payload + padding + BLOCK_LENGTH_STRUCT.pack(block_length))
+                if self._statistics_due():
+                    self._write_out(self._build_statistics())
+                return
+
+            write_buffer = self.write_buffer
+            write_buffer += record
+            write_buffer += payload
+            write_buffer += padding
+            write_buffer += BLOCK_LENGTH_STRUCT.pack(block_length)
+            if len(write_buffer) >= self.flush_bytes or time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush_locked()
+
+    """
+    Writes an Interface Statistics Block for each interface with the number of packets received so far.
+    """
+    def write_statistics(self) -> None:
+        with self.write_lock:
+            self.write_buffer += self._build_statistics()
+            if not self.buffered:
+                self._flush_locked()
+
+    """
+    Closes the pcapng file after writing the final statistics.
+    """
+    def close_pcap(self):
+        self.write_statistics()
+        super().close_pcap()
+
+    """
+    Adds the Interface Statistics Blocks to the write buffer when they are due, then writes it out.
+    """
+    def _flush_locked(self):
+        if self._statistics_due():
+            self.write_buffer += self._build_statistics()
+        super()._flush_locked()
+
+    """
+    Returns True if stats_interval seconds have passed since the last Interface Statistics Blocks.
+    """
+    def _statistics_due(self):
+        return self.stats_interval and time.monotonic() - self.last_stats >= self.stats_interval
+
+    """
+    Returns the Interface Statistics Blocks of every interface.
+    """
+    def _build_statistics(self):
+        self.last_stats = time.monotonic()
+        timestamp = self.last_timestamp or int(time.time() * 1_000_000)
+        blocks = bytearray()
+        for interface_id, packets in enumerate(self.interface_packets):
+            options = (
+                self._build_option(ISB_STARTTIME, TIMESTAMP_STRUCT.pack(self.interface_start_times[interface_id] >> 32, self.interface_start_times[interface_id] & 0xFFFFFFFF)) +
+                self._build_option(ISB_ENDTIME, TIMESTAMP_STRUCT.pack(timestamp >> 32, timestamp & 0xFFFFFFFF)) +
+                self._build_option(ISB_IFRECV, COUNTER_STRUCT.pack(packets)) +
+                self._build_option(OPT_ENDOFOPT, b'')
+            )
+            body = ISB_HEADER_STRUCT.pack(interface_id, timestamp >> 32, timestamp & 0xFFFFFFFF) + options
+            blocks += self._build_block(INTERFACE_STATISTICS_BLOCK, body)
+        return blocks
+
+    """
+    Builds the Enhanced Packet Block template for a device metadata.
+    Writes the Interface Description Block of the device if it is the first time it is seen.
+    Returns a tuple with the metadata, the template and the interface ID.
+    """
+    def _build_record_template(self, metadata):
+        interface_id = self.interface_ids.get(metadata)
+        if interface_id is None:
+            interface_id = self._add_interface(metadata)
+
+        record = bytearray(EPB_DATA_OFFSET) + self._build_ti_prefix(metadata) + bytearray(2)
+        BLOCK_HEADER_STRUCT.pack_into(record, 0, ENHANCED_PACKET_BLOCK, 0)
+        BLOCK_LENGTH_STRUCT.pack_into(record, 8, interface_id)
+        return self._cache_record_template(metadata, record, interface_id)
+
+    """
+    Writes an Interface Description Block for a device metadata.
+    Returns the ID of the new interface.
+    """
+    def _add_interface(self, metadata):
+        interface_id = len(self.interface_packets)
+        self.interface_ids[metadata] = interface_id
+        self.interface_packets.append(0)
+        self.interface_start_times.append(int(time.time() * 1_000_000))
+
+        name = 'COM{}'.format(metadata.interface).encode()
+        description = 'PHY {}, {} MHz, channel {}'.format(hex(metadata.phy), metadata.frequency_mhz, int.from_bytes(metadata.channel, byteorder='little')).encode()
+        options = (
+            self._build_option(IF_NAME, name) +
+            self._build_option(IF_DESCRIPTION, description) +
+            # Timestamps in microseconds (10^-6)
+            self._build_option(IF_TSRESOL, bytes([6])) +
+            self._build_option(OPT_ENDOFOPT, b'')
+        )
+        body = INTERFACE_DESCRIPTION_STRUCT.pack(self.global_header['network'], 0, self.global_header['snaplen']) + options
+        self._write_header(self._build_block(INTERFACE_DESCRIPTION_BLOCK, body))
+        return interface_id
+
+    """
+    Builds a block with its type, body and both length fields.
+    """
+    def _build_block(self, block_type, body):
+        block_length = 12 + len(body)
+        return BLOCK_HEADER_STRUCT.pack(block_type, block_length) + body + BLOCK_LENGTH_STRUCT.pack(block_length)
+
+    """
+    Builds an option with its code, length and value padded to 32 bits.
+    """
+    def _build_option(self, code, value):
+        return OPTION_HEADER_STRUCT.pack(code, len(value)) + value + PADDING[len(value) & 3]
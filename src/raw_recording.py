@@ -0,0 +1,208 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+import mmap
+import struct
+import time
+
+from sniffer_frame import DeviceMetadata
+
+# Recording file: Magic (4B) | Version (2B) | Reserved (2B) | Start Time (8B, ns since the epoch) | Chunks
+RECORDING_MAGIC = b'PNRR'
+RECORDING_VERSION = 1
+RECORDING_HEADER_STRUCT = struct.Struct('<4sHHQ')
+# Chunk: Time (8B, ns since the start of the recording) | Type (1B) | Length (4B) | Data
+CHUNK_HEADER_STRUCT = struct.Struct('<QBI')
+# Metadata chunk data: Interface (2B) | PHY (1B) | Frequency (4B) | Channel (2B)
+METADATA_STRUCT = struct.Struct('<HB4s2s')
+
+# Chunk types
+CHUNK_SERIAL = 0
+CHUNK_METADATA = 1
+
+"""
+This class records the raw bytes read from the serial port of a TI Sniffer, as they were read, to be replayed later.
+Each read is stored as a chunk with the time it was read, and the device settings (DeviceMetadata) are stored
+whenever they change, so a replay produces the same frames and metadata as the capture.
+Chunks are kept in memory and written every buffer_size bytes, so recording costs a copy and no system call per read.
+It is started with TISnifferController.start_recording.
+"""
+class RawRecorder:
+    def __init__(self, path, buffer_size = 1 << 20):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.file = open(path, 'wb')
+        self.start_ns = time.monotonic_ns()
+        self.file.write(RECORDING_HEADER_STRUCT.pack(RECORDING_MAGIC, RECORDING_VERSION, 0, time.time_ns()))
+        self.buffer = bytearray()
+        self.bytes_recorded = 0
+
+    """
+    Records bytes read from the serial port.
+    """
+    def write(self, data) -> None:
+        buffer = self.buffer
+        buffer += CHUNK_HEADER_STRUCT.pack(time.monotonic_ns() - self.start_ns, CHUNK_SERIAL, len(data))
+        buffer += data
+        self.bytes_recorded += len(data)
+        if len(buffer) >= self.buffer_size:
+            self.flush()
+
+    """
+    Records the device settings used for the bytes recorded after them.
+    """
+    def write_metadata(self, metadata) -> None:
+        data = METADATA_STRUCT.pack(metadata.interface, metadata.phy, metadata.frequency, metadata.channel)
+        self.buffer += CHUNK_HEADER_STRUCT.pack(time.monotonic_ns() - self.start_ns, CHUNK_METADATA, len(data))
+        self.buffer += data
+
+    """
+    Writes the chunks kept in memory to the file.
+    """
+    def flush(self) -> None:
+        if self.buffer:
+            self.file.write(self.buffer)
+            self.buffer.clear()
+        self.file.flush()
+
+    """
+    Writes the chunks kept in memory and closes the file.
+    """
+    def close(self):
+        self.flush()
+        self.file.close()
+
+"""
+Reads a recording written by RawRecorder and yields its chunks as (time in ns since the start, type, data) tuples.
+The file is memory-mapped and the data of serial chunks is a memoryview of it, so the chunks are not copied.
+A chunk cut by the end of the file, as left by an interrupted recording, ends the iteration.
+"""
+def read_recording(path):
+    with open(path, 'rb') as recording_file:
+        if recording_file.seek(0, 2) < RECORDING_HEADER_STRUCT.size:
+            raise ValueError('{} is not a raw recording.'.format(path))
+        with mmap.mmap(recording_file.fileno(), 0, access=mmap.ACCESS_READ) as recording_map:
+            view = memoryview(recording_map)
+            try:
+                magic, version, _, _ = RECORDING_HEADER_STRUCT.unpack_from(view, 0)
+                if magic != RECORDING_MAGIC or version != RECORDING_VERSION:
+                    raise ValueError('{} is not a raw recording.'.format(path))
+                offset = RECORDING_HEADER_STRUCT.size
+                size = len(view)
+                while offset + CHUNK_HEADER_STRUCT.size <= size:
+                    chunk_time, chunk_type, length = CHUNK_HEADER_STRUCT.unpack_from(view, offset)
+                    offset += CHUNK_HEADER_STRUCT.size
+                    if offset + length > size:
+                        break
+                    data = view[offset:offset + length]
+                    try:
+                        if chunk_type == CHUNK_METADATA:
+                            yield chunk_time, chunk_type, DeviceMetadata(*METADATA_STRUCT.unpack(data))
+                        else:
+                            yield chunk_time, chunk_type, data
+                    finally:
+                        # The mapping can only be closed once every view of it is released
+                        data.release()
+                    offset += length
+            finally:
+                view.release()
+
+"""
+This class replaces the serial port of a TISnifferController to feed it a recording written by RawRecorder.
+It has the part of the pyserial interface used by the controller: read returns the recorded bytes, in the same chunks
+they were read during the capture, and written commands are discarded.
+
+If realtime is True, each chunk is returned at the time it was recorded, divided by speed, so the capture is reproduced
+with its timing. Otherwise the recording is returned as fast as it is read, which measures the throughput of the pipeline.
+on_metadata is called with the recorded device settings before the bytes received with them.
+on_end is called once when the recording is over, and read then returns no bytes.
+"""
+class ReplaySerial:
+    def __init__(self, path, realtime = False, speed = 1.0, on_metadata = None, on_end = None):
+        self.path = path
+        self.realtime = realtime
+        self.speed = speed
+        self.on_metadata = on_metadata
+        self.on_end = on_end
+        self.timeout = 0
+        self.is_open = True
+        self.exhausted = False
+
+        self.chunks = read_recording(path)
+        # Bytes of the current chunk not yet read and the time they are due, by time.monotonic
+        self.pending = b''
+        self.pending_position = 0
+        self.due = 0
+        self.start = None
+        self.bytes_read = 0
+
+    """
+    Returns the number of recorded bytes that can be read without waiting.
+    """
+    @property
+    def in_waiting(self):
+        if self.pending_position >= len(self.pending) and not self._next_chunk():
+            return 0
+        if self.realtime and time.monotonic() < self.due:
+            return 0
+        return len(self.pending) - self.pending_position
+
+    """
+    Returns up to size recorded bytes, waiting until they are due in realtime mode.
+    Returns no bytes once the recording is over.
+    """
+    def read(self, size = 1) -> bytes:
+        if self.pending_position >= len(self.pending) and not self._next_chunk():
+            return b''
+        if self.realtime:
+            delay = self.due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        data = self.pending[self.pending_position:self.pending_position + size]
+        self.pending_position += len(data)
+        self.bytes_read += len(data)
+        return data
+
+    """
+    Discards commands written to the recording.
+    """
+    def write(self, data) -> int:
+        return len(data)
+
+    """
+    Closes the recording, like closing a serial port.
+    """
+    def close(self):
+        self.is_open = False
+        self.chunks.close()
+
+    """
+    Moves to the next serial chunk, applying the metadata chunks before it.
+    Returns False if the recording is over.
+    """
+    def _next_chunk(self) -> bool:
+        for chunk_time, chunk_type, data in self.chunks:
+            if chunk_type == CHUNK_METADATA:
+                if self.on_metadata is not None:
+                    self.on_metadata(data)
+                continue
+            if self.start is None:
+                self.start = time.monotonic() - chunk_time / 1e9 / self.speed
+            self.due = self.start + chunk_time / 1e9 / self.speed
+            # The memoryview of the chunk is only valid until the next one is read
+            self.pending = bytes(data)
+            self.pending_position = 0
+            return True
+        if not self.exhausted:
+            self.exhausted = True
+            if self.on_end is not None:
+                self.on_end()
+        return False
@@ -0,0 +1,160 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+import threading
+import time
+from enum import Enum
+
+"""
+Enum to represent what the ring buffer does with a new item when it is full.
+- BLOCK: The producer waits until a consumer frees a slot.
+- DROP_OLDEST: The oldest item in the buffer is discarded to make room.
+- DROP_NEWEST: The new item is discarded.
+"""
+class OverflowPolicy(Enum):
+    BLOCK = 0
+    DROP_OLDEST = 1
+    DROP_NEWEST = 2
+
+"""
+This class is a bounded FIFO shared between producer and consumer threads.
+The slots are preallocated when the buffer is created and reused, so it never grows.
+Items are pushed and popped in batches to take the lock once per batch instead of once per item.
+Every item discarded by the overflow policy is counted, and so are the items of producers blocked (BLOCK) when the buffer is closed.
+"""
+class RingBuffer:
+    def __init__(self, capacity = 4096, overflow_policy = OverflowPolicy.DROP_OLDEST):
+        self.capacity = capacity
+        self.overflow_policy = overflow_policy
+        self.slots = [None] * capacity
+        # Index of the oldest item and number of items in the buffer
+        self.head = 0
+        self.count = 0
+        self.closed = False
+
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+
+        # Counters
+        self.pushed = 0
+        self.popped = 0
+        self.dropped_oldest = 0
+        self.dropped_newest = 0
+        self.dropped_closed = 0
+
+    """
+    Pushes a single item to the buffer.
+    Returns True if the item was stored, False if it was dropped.
+    """
+    def put(self, item) -> bool:
+        return self.put_many((item,)) == 1
+
+    """
+    Pushes several items to the buffer, applying the overflow policy to each item that does not fit.
+    With BLOCK, the items left when the buffer is closed while waiting are discarded and counted as dropped_closed.
+    Returns the number of items stored.
+    """
+    def put_many(self, items) -> int:
+        slots = self.slots
+        capacity = self.capacity
+        stored = 0
+        remaining = iter(items)
+        with self.lock:
+            for item in remaining:
+                if self.count == capacity:
+                    if self.overflow_policy is OverflowPolicy.DROP_NEWEST:
+                        self.dropped_newest += 1
+                        continue
+                    if self.overflow_policy is OverflowPolicy.DROP_OLDEST:
+                        slots[self.head] = None
+                        self.head = (self.head + 1) % capacity
+                        self.count -= 1
+                        self.dropped_oldest += 1
+                    else:
+                        while self.count == capacity and not self.closed:
+                            # Consumers waiting for the items stored so far must be woken before waiting for them
+                            self.not_empty.notify()
+                            self.not_full.wait()
+                        if self.closed:
+                            self.dropped_closed += 1 + sum(1 for _ in remaining)
+                            break
+                slots[(self.head + self.count) % capacity] = item
+                self.count += 1
+                stored += 1
+            self.pushed += stored
+            if stored:
+                self.not_empty.notify()
+        return stored
+
+    """
+    Pops up to max_items items from the buffer, waiting up to timeout seconds for the first one.
+    If timeout is None, waits until an item is available or the buffer is closed.
+    Returns a list with the items, which is empty on timeout or when the buffer is closed and empty.
+    """
+    def get_many(self, max_items = 256, timeout = None) -> list:
+        slots = self.slots
+        capacity = self.capacity
+        with self.lock:
+            if not self.count:
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while not self.count and not self.closed:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        break
+                    self.not_empty.wait(remaining)
+
+            items = []
+            head = self.head
+            for _ in range(min(max_items, self.count)):
+                items.append(slots[head])
+                slots[head] = None
+                head = (head + 1) % capacity
+            self.head = head
+            self.count -= len(items)
+            self.popped += len(items)
+            if items:
+                self.not_full.notify()
+                # Other consumers may still have items to take
+                if self.count:
+                    self.not_empty.notify()
+        return items
+
+    """
+    Closes the buffer. Blocked producers and consumers are woken up.
+    Consumers still receive the remaining items.
+    """
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.not_empty.notify_all()
+            self.not_full.notify_all()
+
+    """
+    Returns the number of items in the buffer.
+    """
+    def __len__(self):
+        return self.count
+
+    """
+    Returns a dictionary with the counters of the buffer.
+    """
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'capacity': self.capacity,
+                'size': self.count,
+                'pushed': self.pushed,
+                'popped': self.popped,
+                'dropped_oldest': self.dropped_oldest,
+                'dropped_newest': self.dropped_newest,
+                'dropped_closed': self.dropped_closed,
+            }
@@ -0,0 +1,193 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from compressed_output import CompressedFile, compressed_path
+from pcap_builder import PcapBuilder
+from pcap_index import index_path
+
+"""
+File wrapper that counts the bytes written to it.
+"""
+class CountingFile:
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.bytes_written = 0
+
+    """
+    Writes data to the file and counts its bytes.
+    """
+    def write(self, data):
+        self.bytes_written += len(data)
+        self.file.write(data)
+
+    """
+    Closes the file.
+    """
+    def close(self):
+        self.file.close()
+
+"""
+This class is a PcapBuilder that splits the capture into a ring of files, like the dumpcap -b option.
+A new file is started when the current one reaches filesize bytes or was opened duration seconds ago.
+Each file starts with its own global header, so every file can be opened on its own.
+If files is set, only the newest files are kept and the oldest one is deleted.
+
+Files are named after the output name with an index and the time they were opened,
+for example capture.pcap -> capture_00001_20240101120000.pcap.
+Closing the previous file and deleting old files is done on a background thread, so the capture is not stalled.
+Rotation only happens between packets and is not supported for pipes.
+If index is True, each file has its own sidecar index.
+If compression is set, each file is compressed (capture_00001_20240101120000.pcap.gz) and filesize applies to the compressed size.
+"""
+class RotatingPcapBuilder(PcapBuilder):
+    def __init__(self, filesize=None, duration=None, files=None, buffered=False, flush_bytes=65536, flush_interval=0.1, index=False, compression=None, compression_level=None):
+        super().__init__(buffered, flush_bytes, flush_interval, index, compression, compression_level)
+        # Rotation conditions
+        self.filesize = filesize
+        self.duration = duration
+        self.files = files
+
+        self.output_name = None
+        self.file_index = 0
+        self.file_opened = 0
+        # Paths of the files that were not deleted, oldest first
+        self.file_paths = deque()
+        # Threads closing and deleting old files
+        self.retire_threads = []
+
+    """
+    Opens the first file of the ring.
+    Returns True if the file was opened successfully, False otherwise.
+    """
+    def open_pcap(self, output_name, is_pipe=False) -> bool:
+        if is_pipe:
+            return False
+        self.output_name = output_name
+        self.file_index = 0
+        self.file_paths.clear()
+
+        self.pcapOut = self._open_next_file()
+        self._open_index(self.file_paths[-1])
+
+        current_time = int(time.time())
+        # Mark initial time
+        self.initial_time += current_time
+
+        self._start_flush_thread()
+
+        return True
+
+    """
+    Closes the current file and waits for old files to be closed and deleted.
+    """
+    def close_pcap(self):
+        super().close_pcap()
+        for thread in self.retire_threads:
+            thread.join()
+        self.retire_threads = []
+
+    """
+    Starts the next file if needed, then writes the packet header as PcapBuilder does.
+    """
+    def write_packet_header(self, packet) -> None:
+        with self.write_lock:
+            self._rotate_if_needed()
+            super().write_packet_header(packet)
+
+    """
+    Starts the next file if needed, then writes the packet as PcapBuilder does.
+    """
+    def write_frame(self, packet) -> None:
+        with self.write_lock:
+            self._rotate_if_needed()
+            super().write_frame(packet)
+
+    """
+    Starts the next file if needed, then writes the record as PcapBuilder does.
+    """
+    def write_record(self, record) -> None:
+        with self.write_lock:
+            self._rotate_if_needed()
+            super().write_record(record)
+
+    """
+    Closes the current file and starts the next one with a new global header.
+    """
+    def rotate(self):
+        with self.write_lock:
+            self._flush_locked()
+            previous_file = self.pcapOut
+            self.pcapOut = self._open_next_file()
+            self._write_out(self._build_global_header())
+            self._close_index()
+            self._open_index(self.file_paths[-1])
+
+        expired_paths = []
+        if self.files:
+            while len(self.file_paths) > self.files:
+                expired_path = self.file_paths.popleft()
+                expired_paths.append(expired_path)
+                if self.index:
+                    expired_paths.append(index_path(expired_path))
+
+        self.retire_threads = [thread for thread in self.retire_threads if thread.is_alive()]
+        thread = threading.Thread(target=self._retire, args=(previous_file, expired_paths), name='pcap-rotate', daemon=True)
+        thread.start()
+        self.retire_threads.append(thread)
+
+    """
+    Starts a new file if the current one reached the size or duration limit.
+    """
+    def _rotate_if_needed(self):
+        if self.filesize and self.pcapOut.bytes_written + len(self.write_buffer) >= self.filesize:
+            self.rotate()
+        elif self.duration and time.monotonic() - self.file_opened >= self.duration:
+            self.rotate()
+
+    """
+    Opens the next file of the ring.
+    """
+    def _open_next_file(self):
+        self.file_index += 1
+        root, extension = os.path.splitext(self.output_name)
+        path = '{}_{:05d}_{}{}'.format(root, self.file_index, datetime.now().strftime('%Y%m%d%H%M%S'), extension)
+        if self.compression:
+            path = compressed_path(path, self.compression)
+        self.file_paths.append(path)
+        self.file_opened = time.monotonic()
+        return self._open_file(path)
+
+    """
+    Opens a file of the ring for writing.
+    """
+    def _open_file(self, path):
+        if self.compression:
+            # The size of the new file is estimated with the compression ratio of the previous one until it has its own
+            previous_file = self.pcapOut if isinstance(self.pcapOut, CompressedFile) else None
+            return CompressedFile(path, self.compression, self.compression_level, previous_file=previous_file)
+        return CountingFile(path)
+
+    """
+    Closes a file that is no longer written and deletes the files that left the ring.
+    """
+    def _retire(self, previous_file, expired_paths):
+        previous_file.close()
+        for path in expired_paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
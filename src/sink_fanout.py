@@ -0,0 +1,133 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+import threading
+import time
+from collections import deque
+
+from pcap_builder import PcapBuilder
+from pcapng_builder import PcapngBuilder
+from ring_buffer import RingBuffer, OverflowPolicy
+
+"""
+Sink that keeps the records in memory, for consumers in the same process.
+If max_records is set, only the newest max_records records are kept.
+"""
+class MemorySink:
+    def __init__(self, max_records = None):
+        self.records = deque(maxlen=max_records)
+
+    """
+    Keeps a record.
+    """
+    def write_record(self, record):
+        self.records.append(record)
+
+"""
+This class writes one capture stream to any number of sinks at the same time.
+A sink is any object with a write_record(record) method, like a PcapBuilder (file or pipe), a RotatingPcapBuilder,
+a MemorySink or a UdpExporter. Sinks must be opened (and have their global header written) before the capture.
+
+Each packet is serialized to its pcap record once, by write_frame, and the same bytes are shared by every sink.
+Each sink has its own ring buffer and worker thread, so a slow or stalled sink only fills its own ring buffer.
+When it is full, the overflow_policy of the sink decides which records are dropped, and the drops are reported by stats.
+The default DROP_NEWEST never makes write_frame wait, so the serial reader is never slowed down by a sink.
+
+Records are in the pcap format, so a PcapngBuilder cannot be used as serializer or sink (TypeError).
+"""
+class SinkFanout:
+    def __init__(self, serializer = None):
+        if isinstance(serializer, PcapngBuilder):
+            raise TypeError('SinkFanout serializes pcap records, a PcapngBuilder cannot be its serializer.')
+        # Builder used only to serialize the packets, its file is never opened
+        self.serializer = serializer or PcapBuilder()
+        # Mark initial time, as open_pcap does
+        self.serializer.initial_time += int(time.time())
+        self.sinks = []
+        self.serialize_lock = threading.Lock()
+
+    """
+    Adds a sink with its own ring buffer of queue_size records and worker thread.
+    The name identifies the sink in stats, the class name is used if it is not given.
+    """
+    def add_sink(self, sink, queue_size = 4096, overflow_policy = OverflowPolicy.DROP_NEWEST, name = None):
+        if isinstance(sink, PcapngBuilder):
+            raise TypeError('SinkFanout writes pcap records, a PcapngBuilder cannot be one of its sinks.')
+        entry = {
+            'name': name or '{}-{}'.format(type(sink).__name__, len(self.sinks)),
+            'sink': sink,
+            'ring': RingBuffer(queue_size, overflow_policy),
+            'errors': 0,
+            'thread': None,
+        }
+        entry['thread'] = threading.Thread(target=self._sink_loop, args=(entry,), name='sink-{}'.format(entry['name']), daemon=True)
+        entry['thread'].start()
+        self.sinks.append(entry)
+        return sink
+
+    """
+    Serializes a packet and queues its record to every sink.
+    Can be used directly as the packet callback of TISnifferController.stream or CaptureManager.capture.
+    """
+    def write_frame(self, packet) -> None:
+        # The serializer reuses its record templates, so packets are serialized one at a time
+        with self.serialize_lock:
+            record = self.serializer.build_record(packet)
+        for entry in self.sinks:
+            entry['ring'].put(record)
+
+    """
+    Stops the workers after they wrote the records left in their ring buffers, and flushes the sinks that can be flushed.
+    The sinks are not closed.
+    """
+    def close(self):
+        for entry in self.sinks:
+            entry['ring'].close()
+        for entry in self.sinks:
+            entry['thread'].join()
+            flush = getattr(entry['sink'], 'flush', None)
+            if flush is not None:
+                flush()
+
+    """
+    Returns a dictionary with the counters of each sink, by name:
+    - queued: Records waiting in the ring buffer of the sink.
+    - written: Records given to the sink.
+    - dropped: Records dropped because the ring buffer of the sink was full.
+    - errors: Records the sink failed to write.
+    """
+    def stats(self) -> dict:
+        stats = {}
+        for entry in self.sinks:
+            ring_stats = entry['ring'].stats()
+            stats[entry['name']] = {
+                'queued': ring_stats['size'],
+                'written': ring_stats['popped'] - entry['errors'],
+                'dropped': ring_stats['dropped_oldest'] + ring_stats['dropped_newest'] + ring_stats['dropped_closed'],
+                'errors': entry['errors'],
+            }
+        return stats
+
+    """
+    Worker thread of a sink. Writes the records of its ring buffer until the ring buffer is closed and empty.
+    """
+    def _sink_loop(self, entry):
+        ring = entry['ring']
+        write_record = entry['sink'].write_record
+        while True:
+            records = ring.get_many()
+            if not records:
+                return
+            for record in records:
+                try:
+                    write_record(record)
+                except Exception:
+                    entry['errors'] += 1
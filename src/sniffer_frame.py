@@ -0,0 +1,121 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+from mac_header import MacHeader
+
+# Packet Info of the frames that carry sniffed data (Data streaming from the sniffer)
+DATA_PACKET_INFO = 0xC0
+# Bit of the Status byte of data frames set when the IEEE 802.15.4 FCS of the packet is correct
+STATUS_FCS_OK = 0x80
+
+"""
+This class holds the settings of a sniffer device that are attached to every frame it produces.
+A new object is created whenever the device settings change, so frames can safely share the same one.
+- interface: Interface number (COM port number).
+- phy: PHY index.
+- frequency: Frequency bytes in the format [0x92 0x09 0x00 0x00].
+- channel: Channel bytes.
+"""
+class DeviceMetadata:
+    __slots__ = ('interface', 'phy', 'frequency', 'channel')
+
+    def __init__(self, interface, phy, frequency, channel):
+        object.__setattr__(self, 'interface', interface)
+        object.__setattr__(self, 'phy', phy)
+        object.__setattr__(self, 'frequency', bytes(frequency))
+        object.__setattr__(self, 'channel', bytes(channel))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('DeviceMetadata is immutable.')
+
+    def __eq__(self, other):
+        if not isinstance(other, DeviceMetadata):
+            return NotImplemented
+        return (self.interface, self.phy, self.frequency, self.channel) == (other.interface, other.phy, other.frequency, other.channel)
+
+    def __hash__(self):
+        return hash((self.interface, self.phy, self.frequency, self.channel))
+
+    def __repr__(self):
+        return 'DeviceMetadata(interface={}, phy={}, frequency={} MHz, channel={})'.format(self.interface, hex(self.phy), self.frequency_mhz, int.from_bytes(self.channel, byteorder='little'))
+
+    """
+    Returns the frequency in MHz.
+    """
+    @property
+    def frequency_mhz(self):
+        whole_frequency = int.from_bytes(self.frequency[:2], byteorder='little')
+        fractionary_frequency = int.from_bytes(self.frequency[2:], byteorder='little')
+        return whole_frequency + (fractionary_frequency / 65536)
+
+"""
+This class represents a frame received from the TI Sniffer device.
+It keeps the raw Command Data bytes and parses only the fields used on every packet.
+Data streaming frames (Packet Info 0xC0) have the Command Data format:
+Timestamp (6B) | RSSI (1B) | Payload (0-2047B) | Status (1B)
+- timestamp: Timestamp in microseconds as int.
+- rssi: RSSI as signed int.
+- status: Status byte as int.
+For other frames (command responses) the status is the first Command Data byte and timestamp and rssi are None.
+"""
+class SnifferFrame:
+    __slots__ = ('packet_info', 'data', 'fcs', 'metadata', 'timestamp', 'rssi', 'status', 'decoded_mac_header', 'interfaces')
+
+    def __init__(self, packet_info, data, fcs, metadata = None):
+        self.packet_info = packet_info
+        self.data = data
+        self.fcs = fcs
+        # Shared with every other frame of the same device settings, must not be modified
+        self.metadata = metadata
+        # MacHeader created by the first access to mac_header
+        self.decoded_mac_header = None
+        # Interfaces that captured the frame, set by FrameDeduplicator
+        self.interfaces = None
+
+        if packet_info == DATA_PACKET_INFO:
+            self.timestamp = int.from_bytes(data[0:6], byteorder='little')
+            rssi = data[6]
+            self.rssi = rssi - 256 if rssi > 127 else rssi
+            self.status = data[-1]
+        else:
+            self.timestamp = None
+            self.rssi = None
+            self.status = data[0] if data else None
+
+    def __repr__(self):
+        return 'SnifferFrame(packet_info={}, length={}, timestamp={}, rssi={}, status={})'.format(hex(self.packet_info), len(self.data), self.timestamp, self.rssi, self.status)
+
+    """
+    Returns True if the frame carries sniffed data.
+    """
+    @property
+    def is_data(self):
+        return self.packet_info == DATA_PACKET_INFO
+
+    """
+    Returns a memoryview of the payload without copying it.
+    For data streaming frames this is the sniffed packet, for other frames the whole Command Data.
+    """
+    @property
+    def payload(self):
+        if self.packet_info == DATA_PACKET_INFO:
+            return memoryview(self.data)[7:-1]
+        return memoryview(self.data)
+
+    """
+    Returns the MacHeader decoder of the IEEE 802.15.4 frame carried by a data streaming frame.
+    The decoder is created on the first access and kept, so every consumer of the frame shares the same parse.
+    """
+    @property
+    def mac_header(self):
+        if self.decoded_mac_header is None:
+            self.decoded_mac_header = MacHeader(self.payload)
+        return self.decoded_mac_header
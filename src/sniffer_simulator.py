@@ -0,0 +1,292 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+import argparse
+import os
+import random
+import struct
+import threading
+import time
+import tty
+
+from frame_parser import FrameParser, SOF, EOF
+from mac_header import crc16
+
+# Packet Info of the commands
+PING = 0x40
+START = 0x41
+STOP = 0x42
+FREQUENCY = 0x45
+PHY = 0x47
+
+# Packet Info of the frames sent by the sniffer
+COMMAND_RESPONSE = 0x80
+DATA_STREAMING = 0xC0
+
+# Command status
+STATUS_OK = 0x00
+STATUS_FCS_ERROR = 0x02
+STATUS_INVALID_FORMAT = 0x03
+STATUS_INVALID_STATE = 0x04
+
+# Status byte of sniffed packets with a correct 802.15.4 FCS
+PACKET_STATUS_FCS_OK = 0x80
+
+"""
+Returns a frame with SOF, Packet Info, Packet Length, Command Data, FCS and EOF.
+"""
+def build_frame(packet_info, command_data):
+    length = len(command_data).to_bytes(2, byteorder='little')
+    fcs = (packet_info + sum(length) + sum(command_data)) & 0xFF
+    return SOF + bytes([packet_info]) + length + command_data + bytes([fcs]) + EOF
+
+"""
+This class simulates the firmware of a TI Sniffer device on a Linux pseudo-terminal.
+The TISnifferController can connect to it using the path of the pseudo-terminal as port.
+
+It answers the ping, start, stop, frequency and PHY commands with the right status and FCS, and while started emits
+data streaming frames (0xC0) with IEEE 802.15.4 data frames at rate frames per second.
+Payload sizes are drawn uniformly between min_size and max_size, or from the sizes list if it is given.
+A share of the payloads (pattern_probability) contains the SOF and EOF byte patterns, to exercise the framing.
+
+If replay_path is given, the bytes of that file (a raw serial dump) are sent instead of generated frames,
+at replay_rate bytes per second or as fast as possible if replay_rate is None.
+"""
+class SnifferSimulator:
+    def __init__(self, rate = 1000, min_size = 5, max_size = 125, sizes = None, pattern_probability = 0.05, replay_path = None, replay_rate = 300000, seed = None):
+        self.rate = rate
+        self.min_size = min_size
+        self.max_size = max_size
+        self.sizes = sizes
+        self.pattern_probability = pattern_probability
+        self.replay_path = replay_path
+        self.replay_rate = replay_rate
+        self.random = random.Random(seed)
+
+        # Board information returned by the ping command
+        self.chip_id = 0x1352
+        self.chip_rev = 0x21
+        self.fw_id = 0x01
+        self.fw_rev = (1, 10)
+
+        # Settings changed by the commands
+        self.frequency = [0x92, 0x09, 0x00, 0x00]
+        self.phy = 0x12
+
+        # Pseudo-terminal
+        self.master = None
+        self.slave = None
+        self.path = None
+        self.write_lock = threading.Lock()
+
+        self.started = threading.Event()
+        self.closed = threading.Event()
+        self.threads = []
+        self.start_time = time.monotonic()
+
+        # Counters
+        self.frames_sent = 0
+        self.bytes_sent = 0
+
+        # Addresses used by the generated packets
+        self.pan_ids = [0x1A62, 0xBEEF, 0x0001]
+        self.addresses = [self.random.randrange(0x0000, 0xFFF8) for _ in range(16)]
+        self.sequence_number = 0
+
+    """
+    Opens the pseudo-terminal and starts answering commands.
+    Returns the path of the pseudo-terminal.
+    """
+    def open(self) -> str:
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.path = os.ttyname(self.slave)
+        self.closed.clear()
+        self.threads = [
+            threading.Thread(target=self._command_loop, name='simulator-commands', daemon=True),
+            threading.Thread(target=self._data_loop, name='simulator-data', daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+        return self.path
+
+    """
+    Closes the pseudo-terminal.
+    """
+    def close(self):
+        self.closed.set()
+        self.started.set()
+        os.close(self.master)
+        os.close(self.slave)
+
+    """
+    Reads the commands written to the pseudo-terminal and answers them.
+    """
+    def _command_loop(self):
+        # Commands with a wrong FCS are answered with STATUS_FCS_ERROR, like the firmware does, instead of being dropped
+        parser = FrameParser(validate_fcs=False)
+        while not self.closed.is_set():
+            try:
+                data = os.read(self.master, 4096)
+            except OSError:
+                return
+            for frame in parser.feed(data):
+                self._write(build_frame(COMMAND_RESPONSE, self._handle_command(frame)))
+
+    """
+    Executes a command and returns the Command Data of the response.
+    """
+    def _handle_command(self, frame):
+        command_data = frame.data
+        length = len(command_data).to_bytes(2, byteorder='little')
+        if (frame.packet_info + sum(length) + sum(command_data)) & 0xFF != frame.fcs:
+            return bytes([STATUS_FCS_ERROR])
+
+        if frame.packet_info == PING:
+            return struct.pack('<BHBBBB', STATUS_OK, self.chip_id, self.chip_rev, self.fw_id, self.fw_rev[1], self.fw_rev[0])
+        if frame.packet_info == START:
+            self.started.set()
+            return bytes([STATUS_OK])
+        if frame.packet_info == STOP:
+            self.started.clear()
+            return bytes([STATUS_OK])
+        if frame.packet_info == FREQUENCY:
+            if len(command_data) != 4:
+                return bytes([STATUS_INVALID_FORMAT])
+            if self.started.is_set():
+                return bytes([STATUS_INVALID_STATE])
+            self.frequency = list(command_data)
+            return bytes([STATUS_OK])
+        if frame.packet_info == PHY:
+            if len(command_data) != 1:
+                return bytes([STATUS_INVALID_FORMAT])
+            if self.started.is_set():
+                return bytes([STATUS_INVALID_STATE])
+            self.phy = command_data[0]
+            return bytes([STATUS_OK])
+        return bytes([STATUS_INVALID_FORMAT])
+
+    """
+    Sends data streaming frames while the simulator is started.
+    """
+    def _data_loop(self):
+        if self.replay_path is not None:
+            self._replay_loop()
+            return
+
+        # Frames are sent in batches every tick to keep the rate without sleeping between frames
+        tick = 0.001
+        max_batch = max(1, int(self.rate * 0.01))
+        while not self.closed.is_set():
+            self.started.wait()
+            batch_start = time.monotonic()
+            sent = 0
+            while self.started.is_set() and not self.closed.is_set():
+                due = int((time.monotonic() - batch_start) * self.rate) - sent
+                # When the simulator falls behind, the late frames are skipped instead of sent in one burst
+                if due > max_batch:
+                    sent += due - max_batch
+                    due = max_batch
+                if due > 0:
+                    frames = self.generate_frames(due)
+                    self._write(frames)
+                    sent += due
+                    self.frames_sent += due
+                time.sleep(tick)
+
+    """
+    Sends the bytes of the replay file once the simulator is started.
+    """
+    def _replay_loop(self):
+        self.started.wait()
+        chunk_size = 4096
+        replay_start = time.monotonic()
+        sent = 0
+        with open(self.replay_path, 'rb') as replay_file:
+            while not self.closed.is_set():
+                self.started.wait()
+                chunk = replay_file.read(chunk_size)
+                if not chunk:
+                    return
+                self._write(chunk)
+                sent += len(chunk)
+                if self.replay_rate:
+                    delay = sent / self.replay_rate - (time.monotonic() - replay_start)
+                    if delay > 0:
+                        time.sleep(delay)
+
+    """
+    Returns the bytes of count data streaming frames, as the device would send them.
+    Can be used without opening the pseudo-terminal to build synthetic serial streams.
+    """
+    def generate_frames(self, count) -> bytes:
+        return b''.join(self._build_data_frame() for _ in range(count))
+
+    """
+    Builds a data streaming frame with a random IEEE 802.15.4 data frame.
+    Command Data: Timestamp (6B) | RSSI (1B) | Payload | Status (1B)
+    """
+    def _build_data_frame(self):
+        timestamp = int((time.monotonic() - self.start_time) * 1_000_000)
+        rssi = self.random.randrange(-95, -20) & 0xFF
+        command_data = timestamp.to_bytes(6, byteorder='little') + bytes([rssi]) + self._build_mac_frame() + bytes([PACKET_STATUS_FCS_OK])
+        return build_frame(DATA_STREAMING, command_data)
+
+    """
+    Builds an IEEE 802.15.4 data frame with short addresses, PAN ID compression and a valid FCS.
+    """
+    def _build_mac_frame(self):
+        size = self.random.choice(self.sizes) if self.sizes else self.random.randint(self.min_size, self.max_size)
+        # Frame Control: data frame, PAN ID compression, short destination and source addresses
+        header = struct.pack('<HBHHH', 0x8841, self.sequence_number, self.random.choice(self.pan_ids), self.random.choice(self.addresses), self.random.choice(self.addresses))
+        self.sequence_number = (self.sequence_number + 1) & 0xFF
+        payload = bytearray(self.random.randbytes(max(0, size - len(header) - 2)))
+        if len(payload) >= 4 and self.random.random() < self.pattern_probability:
+            position = self.random.randrange(0, len(payload) - 3)
+            payload[position:position + 4] = EOF + SOF
+        frame = header + bytes(payload)
+        return frame + crc16(frame).to_bytes(2, byteorder='little')
+
+    """
+    Writes data to the pseudo-terminal, keeping frames from the command and data threads whole.
+    """
+    def _write(self, data):
+        with self.write_lock:
+            view = memoryview(data)
+            while view:
+                try:
+                    written = os.write(self.master, view)
+                except OSError:
+                    return
+                view = view[written:]
+                self.bytes_sent += written
+
+
+"""
+Runs the simulator until interrupted and prints the path to connect to.
+"""
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(description='Simulates a TI Sniffer device on a pseudo-terminal.')
+    argument_parser.add_argument('--rate', type=float, default=1000, help='Data frames per second.')
+    argument_parser.add_argument('--min-size', type=int, default=5, help='Minimum 802.15.4 frame size.')
+    argument_parser.add_argument('--max-size', type=int, default=125, help='Maximum 802.15.4 frame size.')
+    argument_parser.add_argument('--pattern-probability', type=float, default=0.05, help='Share of payloads with SOF/EOF patterns.')
+    argument_parser.add_argument('--replay', default=None, help='Raw serial dump to send instead of generated frames.')
+    argument_parser.add_argument('--replay-rate', type=float, default=300000, help='Replay rate in bytes per second, 0 for as fast as possible.')
+    arguments = argument_parser.parse_args()
+
+    simulator = SnifferSimulator(arguments.rate, arguments.min_size, arguments.max_size, pattern_probability=arguments.pattern_probability, replay_path=arguments.replay, replay_rate=arguments.replay_rate or None)
+    print('[INFO] Simulated sniffer available at {}'.format(simulator.open()))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        simulator.close()
@@ -10,9 +10,28 @@
 # ////////////////////////////////////////////////////////////////////////////////////////////////////
 
 import serial
+import threading
 import time
+from collections import deque
 from enum import Enum
 
+from capture_stats import CaptureStats
+from frame_parser import FrameParser
+from raw_recording import RawRecorder, ReplaySerial
+from ring_buffer import RingBuffer, OverflowPolicy
+from sniffer_frame import DeviceMetadata, DATA_PACKET_INFO, STATUS_FCS_OK
+
+# IEEE 802.15.4 channels of the 2.4 GHz O-QPSK PHY
+SURVEY_CHANNELS = range(11, 27)
+# Width of the bins of the RSSI distribution of the survey, in dBm
+SURVEY_RSSI_BIN = 5
+
+"""
+Returns the center frequency in MHz of an IEEE 802.15.4 2.4 GHz channel (11 to 26).
+"""
+def channel_to_frequency(channel):
+    return 2405 + 5 * (channel - 11)
+
 """
 Enum to represent the state of the TI Sniffer device.
 """
@@ -39,6 +58,8 @@ class TISnifferController:
         self.stop_bits = serial.STOPBITS_ONE
         self.parity = serial.PARITY_NONE
         self.default_timeout = 0.5
+        # Seconds to wait for the response of a command, None waits forever
+        self.command_timeout = 2.0
 
         # Start of Frame and End of Frame delimitations
         self.sof = [0x40, 0x53]
@@ -64,11 +85,11 @@ class TISnifferController:
 
         # Each command has a status byte that indicates if the command was received correctly.
         self.status_lookup = {
-            '00': 'Command was received correctly.',
-            '01': 'Reception of Command timed out before all data was received.',
-            '02': 'Computation of frame check sequence did not succeed.',
-            '03': 'The Command has invalid format or is not supported.',
-            '04': 'The Command is invalid for the current state of sniffer FW.',
+            0x00: 'Command was received correctly.',
+            0x01: 'Reception of Command timed out before all data was received.',
+            0x02: 'Computation of frame check sequence did not succeed.',
+            0x03: 'The Command has invalid format or is not supported.',
+            0x04: 'The Command is invalid for the current state of sniffer FW.',
         }
 
         self.board_info = {
@@ -85,6 +106,8 @@ class TISnifferController:
             'frequency': [0x92, 0x09, 0x00, 0x00],
             'channel': [0x14, 0x00],
         }
+        # Immutable copy of the metadata shared by every frame received with the current settings
+        self.device_metadata = None
 
         # Manages the current state of the sniffer
         # Initialize the sniffer in the WAITING_FOR_COMMAND state
@@ -93,6 +116,25 @@ class TISnifferController:
 
         # Serial connection
         self.ser = None
+        # Records the raw bytes read from the serial port, see start_recording
+        self.recorder = None
+        # Held while the recorder is written or swapped, since the reader thread writes to it
+        self.recorder_lock = threading.Lock()
+        # Splits the bytes read from the serial port into frames
+        self.parser = FrameParser()
+        # Frames already parsed but not yet returned by _recieve_packet
+        self.pending_frames = deque()
+        self._update_device_metadata()
+
+        # Threaded streaming: ring buffer between the reader thread and the consumer threads
+        self.ring = None
+        self.stop_event = threading.Event()
+        # Number of frames lost because the packet callback raised an exception
+        self.callback_errors = 0
+        self.callback_errors_lock = threading.Lock()
+
+        # Counters and latency histograms of the read, parse and callback stages, see stats
+        self.capture_stats = CaptureStats(('bytes', 'frames', 'data_frames', 'fcs_errors'), ('read', 'parse', 'callback'))
         pass
 
     """
@@ -100,31 +142,51 @@ class TISnifferController:
     Returns True if the connection was successfully opened, False otherwise.
     """
     def connect(self) -> bool:
-        try:
-            self.ser = serial.Serial(port=self.port, baudrate=self.baudrate, bytesize=self.data_bits, parity=self.parity, stopbits=self.stop_bits, timeout=self.default_timeout)
-        except serial.SerialException:
-            exit('[ERROR] Could not open serial port {}: {}'.format(self.port, serial.SerialException))
-        
-        if not self.ser.is_open:
-            self._debug('[ERROR] Serial port {} could not be opened.'.format(self.port))
+        if not self._open_serial(self.default_timeout):
             return False
 
-        self._change_state(State.STATE_WAITING_FOR_COMMAND)
         self.stop()
 
         self.configure(self.metadata['frequency'], self.metadata['phy'])
 
-        self._debug('[INFO] Connection settings: ')
-        self._debug('--Interface: COM{}'.format(self.metadata['interface']))
-        self._debug('--PHY: {}'.format(hex(self.metadata['phy'])))
-        self._debug('--Frequency: {}'.format(int.from_bytes(self.metadata['frequency'], byteorder='little')))
-        self._debug('--Channel: {}'.format(int.from_bytes(self.metadata['channel'], byteorder='little')))
+        self._debug_connection_settings()
 
         self._debug('[INFO] Getting board information through ping command.')
         self.ping()
 
         return True
 
+    """
+    Opens the serial connection and brings the sniffer up with a single round trip:
+    the stop, frequency, PHY and ping commands are written at once and their responses are read in order.
+    Uses the frequency and PHY of the metadata. Does not exit if the port cannot be opened.
+    read_timeout is the timeout of each serial read, which bounds how late a missing response is noticed.
+    Returns True if every command succeeded and the device answered the ping like a TI Sniffer, False otherwise.
+    """
+    def fast_connect(self, read_timeout = 0.05) -> bool:
+        if not self._open_serial(read_timeout, exit_on_error=False):
+            return False
+
+        frequency = list(self.metadata['frequency'])
+        phy = self.metadata['phy']
+        stop, frequency_response, phy_response, ping = self._send_commands([
+            self.stop_command,
+            self._build_frequency_command(frequency),
+            self._build_phy_command(phy),
+            self.ping_command,
+        ])
+        if not self._on_stop_response(stop):
+            return False
+        if not self._on_frequency_response(frequency_response, frequency):
+            return False
+        if not self._on_phy_response(phy_response, phy):
+            return False
+        # Status, Chip Id (2B), Chip Revision, FW Id and FW Revision (2B)
+        if ping is None or len(ping.data) < 7:
+            self._debug('[ERROR] Ping response of {} is not from a TI Sniffer.'.format(self.port))
+            return False
+        return self._on_ping_response(ping)
+
 
     """
     Closes the serial connection with the TI Sniffer device.
@@ -153,51 +215,16 @@ class TISnifferController:
             return False
 
         # If the input is in the format 2450.0, convert it to the format [0x92 0x09 0x00 0x00]
-        if type(frequency) is float or type(frequency) is int:
-            whole_frequency = int(frequency)
-            fractionary_frequency = frequency - whole_frequency
-            whole_frequency = whole_frequency.to_bytes(2, byteorder='little')
-            fractionary_frequency = int(fractionary_frequency * 65536)
-            fractionary_frequency = fractionary_frequency.to_bytes(2, byteorder='little')
-            frequency = whole_frequency + fractionary_frequency
-            frequency = [int(byte) for byte in frequency]     
-
-        # Configure Frequency command
-        freq_command = bytes(self.sof + self.frequency_command_base + frequency + [self._calculate_fcs(self.frequency_command_base, frequency)] + self.eof)
+        frequency = self._frequency_to_list(frequency)
 
         # Configure Frequency
-        self.ser.write(freq_command)
-        response = self._recieve_packet()  
-        self._debug('[INFO] Frequency command status: {}'.format(self._get_command_status(response['command_data'])))
-        if response['command_data'] == '00':
-            # Saves the new frequency as list format in the metadata
-            self.metadata['frequency'] = frequency
-            # Converts the frequency to MHz to show in the debug message
-            whole_frequency = bytes(frequency[:2])
-            fractionary_frequency = bytes(frequency[2:])
-            whole_frequency = int.from_bytes(whole_frequency, byteorder='little')
-            fractionary_frequency = int.from_bytes(fractionary_frequency, byteorder='little')
-            frequency = whole_frequency + (fractionary_frequency / 65536)
-            self._debug('[INFO] Frequency configured successfully to {} MHz.'.format(frequency))
-        if response['command_data'] != '00':
-            self._debug('[INFO] Frequency could not be configured correctly to {} MHz.'.format(frequency))
+        response = self._send_command(self._build_frequency_command(frequency))
+        if not self._on_frequency_response(response, frequency):
             return False
 
-        # Configure PHY command
-        phy_command = bytes(self.sof + self.phy_command_base + [phy] + [self._calculate_fcs(self.phy_command_base, [phy])] + self.eof)
-
         # Configure PHY
-        self.ser.write(phy_command)
-        response = self._recieve_packet()
-        self._debug('[INFO] PHY command status: {}'.format(self._get_command_status(response['command_data'])))
-        if response['command_data'] == '00':
-            self._debug('[INFO] PHY configured successfully to {}'.format(hex(phy)))
-            self.metadata['phy'] = phy
-        if response['command_data'] != '00':
-            self._debug('[INFO] PHY could not be configured correctly to {}'.format(hex(phy)))
-            return False
-
-        return True
+        response = self._send_command(self._build_phy_command(phy))
+        return self._on_phy_response(response, phy)
 
     """
     Starts the sniffing process on the TI Sniffer device.
@@ -209,12 +236,8 @@ class TISnifferController:
     def start(self) -> bool:
         # Send the start command to the device
         self._debug('[INFO] Start command sent.')
-        self.ser.write(self.start_command)
-        response = self._recieve_packet()
-        self._debug('[INFO] Start command status: {}'.format(self._get_command_status(response['command_data'])))
-        if response['command_data'] == '00':
-            self._change_state(State.STATE_STARTED)
-        return response['command_data']
+        response = self._send_command(self.start_command)
+        return self._on_start_response(response)
 
     """
     Stops the sniffing process on the TI Sniffer device.
@@ -224,12 +247,8 @@ class TISnifferController:
     def stop(self) -> bool:
         # Send the stop command to the device
         self._debug('[INFO] Stop command sent.')
-        self.ser.write(self.stop_command)
-        response = self._recieve_packet()
-        self._debug('[INFO] Stop command status: {}'.format(self._get_command_status(response['command_data'])))
-        if response['command_data'] == '00':
-            self._change_state(State.STATE_STOPPED)
-        return response['command_data']
+        response = self._send_command(self.stop_command)
+        return self._on_stop_response(response)
     
     """
     The ping command is used to get the board information.
@@ -239,40 +258,29 @@ class TISnifferController:
     def ping(self) -> bool:
         # Send the ping command to the device
         self._debug('[INFO] Ping command sent.')
-        self.ser.write(self.ping_command)
-        response = self._recieve_packet()
-        board_info = self._get_board_info(response)
-        # Print board info
-        self._debug('[INFO] Ping command status: {}'.format(self._get_command_status(board_info['status'])))
-        self._debug('[INFO] Board Information:')
-        self._debug('--Chip Id: {}'.format(board_info['chip_id']))
-        self._debug('--Chip Revision: {}'.format(board_info['chip_rev']))
-        self._debug('--FW Id: {}'.format(board_info['fw_id']))
-        self._debug('--FW Revision: {}'.format(board_info['fw_rev']))
-
-        self._debug('[INFO] Board Information updated.')
-        self.board_info = board_info
-
-        # If the board is in the WAITING_FOR_COMMAND state, change it to INIT if the ping was successful
-        if board_info['status'] == '00' and self.state == State.STATE_WAITING_FOR_COMMAND:
-            self._change_state(State.STATE_INIT)
-
-        return board_info['status']
+        response = self._send_command(self.ping_command)
+        return self._on_ping_response(response)
 
     """
     If the sniffer is in the STARTED state, this method will start streaming packets from the device.
     Each recieved packet will call a callback function called process_packet if the return info is 0xc0 (Data streaming from the sniffer).
-    This callback function should be implemented by the, takes a packet as input and have no return.
-    Bytes are sent in little endian format.
+    This callback function should be implemented by the, takes a SnifferFrame as input and have no return.
+    The frame metadata is shared between frames and must not be modified by the callback.
 
     If read_time is -1, the method will stream packets indefinitely (Blocking IO until interrupted).
     If read_time is a positive number, the method will stream packets for read_time seconds.
     Actual Read Time can surpass the read_time because it will wait until the end of the next packet.
 
+    If threaded is True, a dedicated reader thread only frames the bytes from the serial port and pushes the packets
+    to a preallocated ring buffer of ring_size packets, which is drained by a number of consumer threads calling the packet callback.
+    A slow callback then no longer stops the serial port from being read. When the ring buffer is full, the overflow_policy
+    decides whether the reader waits or which packet is dropped. With more than one consumer the callback must be thread-safe
+    and packets may be processed out of order. The frames dropped at each stage are reported by dropped_frames.
+
     Returns True if the streaming was successful, False otherwise.
     Does not return anything if the read_time is -1.
     """
-    def stream(self, packet_callback, read_time = -1) -> bool:
+    def stream(self, packet_callback, read_time = -1, threaded = False, consumers = 1, ring_size = 4096, overflow_policy = OverflowPolicy.DROP_OLDEST) -> bool:
         if read_time == -1:
             self._debug('[INFO] Starting streaming indefinitely.')
         else:
@@ -281,58 +289,595 @@ class TISnifferController:
         if self.state != State.STATE_STARTED:
             self._debug('[ERROR] Sniffer is not in the STARTED state. Cannot start streaming.')
             return False
+
+        if threaded:
+            return self._stream_threaded(packet_callback, read_time, consumers, ring_size, overflow_policy)
         
+        callback_latency = self.capture_stats.latency['callback']
         # Executes the loop for read_time seconds or forever if read_time is -1
         start_time = time.time()
         while read_time == -1 or (time.time() - start_time) < read_time:
             packet = self._recieve_packet()
-            packet.update(self.metadata)
             # If the packet is a stream packet, call the packet_callback function
-            if packet['packet_info'] == 'c0':
-                self._debug('[INFO] Packet received. Calling packet callback after {:.3f} seconds.'.format(time.time() - start_time))
+            if packet.packet_info == DATA_PACKET_INFO:
+                # The message is only formatted when debugging, since it would cost time on every packet
+                if self.debug:
+                    self._debug('[INFO] Packet received. Calling packet callback after {:.3f} seconds.'.format(time.time() - start_time))
+                callback_start = time.perf_counter_ns()
                 packet_callback(packet)
+                callback_latency.observe(time.perf_counter_ns() - callback_start)
+        return True
+
+    """
+    Streams packets with a reader thread and consumer threads connected by a ring buffer.
+    Blocks for read_time seconds, or until interrupted if read_time is -1.
+    """
+    def _stream_threaded(self, packet_callback, read_time, consumers, ring_size, overflow_policy) -> bool:
+        self.ring = RingBuffer(ring_size, overflow_policy)
+        self.stop_event.clear()
+
+        reader = threading.Thread(target=self._reader_loop, name='sniffer-reader', daemon=True)
+        workers = [threading.Thread(target=self._consumer_loop, args=(packet_callback,), name='sniffer-consumer-{}'.format(index), daemon=True) for index in range(consumers)]
+        reader.start()
+        for worker in workers:
+            worker.start()
+
+        try:
+            self.stop_event.wait(None if read_time == -1 else read_time)
+        finally:
+            # Consumers drain the packets left in the ring buffer before returning
+            self.stop_event.set()
+            reader.join()
+            self.ring.close()
+            for worker in workers:
+                worker.join()
+        return True
+
+    """
+    Reader thread of the threaded streaming.
+    Frames the bytes from the serial port and pushes the stream packets to the ring buffer.
+    Other packets are kept to be returned by _recieve_packet.
+    """
+    def _reader_loop(self):
+        ring = self.ring
+        while not self.stop_event.is_set():
+            frames = []
+            for frame in self._read_frames():
+                if frame.packet_info == DATA_PACKET_INFO:
+                    frames.append(frame)
+                else:
+                    self.pending_frames.append(frame)
+            if frames:
+                ring.put_many(frames)
+
+    """
+    Consumer thread of the threaded streaming.
+    Pops batches of packets from the ring buffer and calls the packet callback for each one, until the ring buffer is closed and empty.
+    """
+    def _consumer_loop(self, packet_callback):
+        ring = self.ring
+        callback_latency = self.capture_stats.latency['callback']
+        while True:
+            frames = ring.get_many()
+            if not frames:
+                return
+            for frame in frames:
+                callback_start = time.perf_counter_ns()
+                try:
+                    packet_callback(frame)
+                except Exception as exception:
+                    with self.callback_errors_lock:
+                        self.callback_errors += 1
+                    self._debug('[ERROR] Packet callback failed: {}'.format(exception))
+                callback_latency.observe(time.perf_counter_ns() - callback_start)
+
+    """
+    Starts recording the raw bytes read from the serial port to a file, with the time of each read and the device settings
+    (see raw_recording.RawRecorder), until stop_recording is called. The recording can be fed back with replay.
+    Returns the recorder.
+    """
+    def start_recording(self, path, buffer_size = 1 << 20) -> RawRecorder:
+        recorder = RawRecorder(path, buffer_size)
+        with self.recorder_lock:
+            recorder.write_metadata(self.device_metadata)
+            previous_recorder, self.recorder = self.recorder, recorder
+        # Once swapped, the reader thread no longer writes to the previous recorder
+        if previous_recorder is not None:
+            previous_recorder.close()
+        return recorder
+
+    """
+    Stops recording and closes the recording file.
+    It can be called while streaming: bytes read before the call are written to the file, later ones are not.
+    """
+    def stop_recording(self):
+        with self.recorder_lock:
+            recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            recorder.close()
+
+    """
+    Feeds a recording made with start_recording through the controller, calling packet_callback with each stream packet
+    as stream does: the recorded bytes go through the same parser, frame filter, stats and (if threaded is True) ring buffer
+    and consumer threads, and frames get the recorded device settings. No device is needed.
+
+    If realtime is True, the bytes are replayed with their recorded timing (divided by speed).
+    Otherwise they are replayed as fast as possible, which also measures the throughput of the capture pipeline.
+    The threaded replay waits for the consumers by default (OverflowPolicy.BLOCK), so no packet is dropped.
+    The serial port, state and settings of the controller are restored at the end.
+    Returns True once the whole recording was replayed.
+    """
+    def replay(self, path, packet_callback, realtime = False, speed = 1.0, threaded = False, consumers = 1, ring_size = 4096, overflow_policy = OverflowPolicy.BLOCK) -> bool:
+        previous_serial, previous_state, previous_metadata = self.ser, self.state, self.device_metadata
+        # In threaded mode the end of the recording stops the reader thread
+        self.ser = ReplaySerial(path, realtime, speed, self._set_frame_metadata, self.stop_event.set if threaded else None)
+        self.parser.reset()
+        self.pending_frames.clear()
+        self._change_state(State.STATE_STARTED)
+        try:
+            if threaded:
+                return self._stream_threaded(packet_callback, -1, consumers, ring_size, overflow_policy)
+
+            callback_latency = self.capture_stats.latency['callback']
+            while not self.ser.exhausted:
+                for frame in self._read_frames():
+                    if frame.packet_info == DATA_PACKET_INFO:
+                        callback_start = time.perf_counter_ns()
+                        packet_callback(frame)
+                        callback_latency.observe(time.perf_counter_ns() - callback_start)
+            return True
+        finally:
+            self.ser.close()
+            self.ser = previous_serial
+            self._set_frame_metadata(previous_metadata)
+            self.parser.reset()
+            self.pending_frames.clear()
+            self._change_state(previous_state)
+
+    """
+    Sets the device settings attached to the frames parsed from now on, without changing the device settings.
+    """
+    def _set_frame_metadata(self, metadata):
+        self.device_metadata = metadata
+        self.parser.metadata = metadata
+
+    """
+    Walks a list of channels, listening dwell seconds on each one, and returns the traffic seen on each channel.
+    channels are IEEE 802.15.4 2.4 GHz channels (11 to 26 by default). If frequencies (in MHz) are given, they are used instead
+    and the results are keyed by frequency.
+
+    The PHY is configured once, and each retune only sends the stop, frequency and start commands, without ping or messages.
+    With rounds greater than 1 the list is walked several times and the counts are added up. If adaptive is True,
+    after the first round the dwell time of each round (dwell seconds per channel in total) is split in proportion to the frames
+    seen on each channel, so busy channels are sampled longer. Every channel keeps at least min_dwell seconds.
+    If packet_callback is given, it is called with every stream packet, whose metadata has the channel it was received on.
+
+    Returns a dictionary by channel (or frequency) with:
+    - frequency: Frequency in MHz.
+    - dwell: Seconds listened on the channel.
+    - frames, bytes: Stream packets and bytes of their 802.15.4 frames.
+    - frames_per_second, bytes_per_second: Rates while listening on the channel.
+    - fcs_errors: Stream packets with a wrong IEEE 802.15.4 FCS.
+    - rssi_min, rssi_max, rssi_mean: RSSI of the packets in dBm, None without packets.
+    - rssi_histogram: Packets by RSSI bin, keyed by the lower bound of each SURVEY_RSSI_BIN dBm bin.
+    At the end the frequency and PHY that were configured before the survey are restored, and the sniffer is left stopped.
+    Returns None if a command failed.
+    """
+    def survey(self, channels = SURVEY_CHANNELS, dwell = 0.2, phy = 0x12, frequencies = None, rounds = 1, adaptive = False, min_dwell = 0.05, packet_callback = None):
+        if frequencies is not None:
+            targets = [(frequency, frequency, 0) for frequency in frequencies]
+        else:
+            targets = [(channel, channel_to_frequency(channel), channel) for channel in channels]
+        results = {key: {
+            'frequency': frequency, 'dwell': 0.0, 'frames': 0, 'bytes': 0, 'frames_per_second': 0.0, 'bytes_per_second': 0.0,
+            'fcs_errors': 0, 'rssi_min': None, 'rssi_max': None, 'rssi_mean': None, 'rssi_histogram': {},
+        } for key, frequency, _ in targets}
+        rssi_sums = dict.fromkeys(results, 0)
+
+        previous_frequency = list(self.metadata['frequency'])
+        previous_phy = self.metadata['phy']
+        previous_channel = self.metadata['channel']
+        # Short reads, so an idle channel does not extend the dwell time
+        previous_timeout = self.ser.timeout
+        self.ser.timeout = min(min_dwell, 0.01)
+        try:
+            if not self._survey_command(self.stop_command):
+                return None
+            self._change_state(State.STATE_STOPPED)
+            if phy != previous_phy:
+                if not self._survey_command(self._build_phy_command(phy)):
+                    return None
+                self.metadata['phy'] = phy
+
+            dwell_times = {key: dwell for key in results}
+            for survey_round in range(rounds):
+                if adaptive and survey_round > 0:
+                    dwell_times = self._survey_dwell_times(results, dwell, min_dwell)
+                for key, frequency, channel in targets:
+                    if not self._survey_listen(key, frequency, channel, dwell_times[key], results[key], rssi_sums, packet_callback):
+                        return None
+        finally:
+            self.ser.timeout = previous_timeout
+            # Restores the previous settings, leaving the sniffer stopped
+            if self.state == State.STATE_STARTED and self._survey_command(self.stop_command):
+                self._change_state(State.STATE_STOPPED)
+            self.metadata['channel'] = previous_channel
+            if self.state == State.STATE_STOPPED:
+                self.configure(previous_frequency, previous_phy)
+
+        for key, result in results.items():
+            if result['dwell']:
+                result['frames_per_second'] = result['frames'] / result['dwell']
+                result['bytes_per_second'] = result['bytes'] / result['dwell']
+            if result['frames']:
+                result['rssi_mean'] = rssi_sums[key] / result['frames']
+            result['rssi_histogram'] = dict(sorted(result['rssi_histogram'].items()))
+        return results
+
+    """
+    Retunes to a frequency and counts the stream packets received during dwell seconds.
+    Returns False if a command failed.
+    """
+    def _survey_listen(self, key, frequency, channel, dwell, result, rssi_sums, packet_callback) -> bool:
+        frequency = self._frequency_to_list(frequency)
+        if self.state == State.STATE_STARTED:
+            if not self._survey_command(self.stop_command):
+                return False
+            self._change_state(State.STATE_STOPPED)
+        if not self._survey_command(self._build_frequency_command(frequency)):
+            return False
+        self.metadata['frequency'] = frequency
+        self.metadata['channel'] = list(channel.to_bytes(2, byteorder='little'))
+        self._update_device_metadata()
+        if not self._survey_command(self.start_command):
+            return False
+        self._change_state(State.STATE_STARTED)
+
+        frames = 0
+        length = 0
+        fcs_errors = 0
+        rssi_sum = 0
+        rssi_min = result['rssi_min']
+        rssi_max = result['rssi_max']
+        histogram = result['rssi_histogram']
+        start_time = time.monotonic()
+        end_time = start_time + dwell
+        while True:
+            now = time.monotonic()
+            if now >= end_time:
+                break
+            for frame in self._read_frames():
+                if frame.packet_info != DATA_PACKET_INFO:
+                    self.pending_frames.append(frame)
+                    continue
+                rssi = frame.rssi
+                frames += 1
+                # Timestamp, RSSI and Status are not part of the 802.15.4 frame
+                length += len(frame.data) - 8
+                rssi_sum += rssi
+                if not frame.status & STATUS_FCS_OK:
+                    fcs_errors += 1
+                if rssi_min is None or rssi < rssi_min:
+                    rssi_min = rssi
+                if rssi_max is None or rssi > rssi_max:
+                    rssi_max = rssi
+                rssi_bin = rssi - rssi % SURVEY_RSSI_BIN
+                histogram[rssi_bin] = histogram.get(rssi_bin, 0) + 1
+                if packet_callback is not None:
+                    packet_callback(frame)
+
+        result['dwell'] += now - start_time
+        result['frames'] += frames
+        result['bytes'] += length
+        result['fcs_errors'] += fcs_errors
+        result['rssi_min'] = rssi_min
+        result['rssi_max'] = rssi_max
+        rssi_sums[key] += rssi_sum
         return True
 
+    """
+    Splits the dwell time of a round (dwell seconds per channel) in proportion to the frames seen on each channel so far.
+    Every channel keeps at least min_dwell seconds.
+    """
+    def _survey_dwell_times(self, results, dwell, min_dwell):
+        total_frames = sum(result['frames'] for result in results.values())
+        if not total_frames:
+            return {key: dwell for key in results}
+        spare_time = max(0.0, (dwell - min_dwell) * len(results))
+        return {key: min_dwell + spare_time * result['frames'] / total_frames for key, result in results.items()}
+
+    """
+    Sends a survey command and returns True if the sniffer accepted it, without printing anything.
+    """
+    def _survey_command(self, command) -> bool:
+        response = self._send_command(command)
+        return response is not None and response.status == 0x00
+
+    """
+    Installs a FrameFilter (see frame_filter.py) on the stream packets, or removes it if frame_filter is None.
+    Rejected packets are dropped while framing, before a SnifferFrame is created, and are counted as filtered in stats.
+    """
+    def set_filter(self, frame_filter):
+        self.parser.frame_filter = None if frame_filter is None else frame_filter.predicate
+
+    """
+    Returns the number of frames dropped at each stage of the streaming:
+    - framing: Frames discarded by the parser because they were malformed.
+    - ring_oldest: Frames discarded from the ring buffer to make room for new ones.
+    - ring_newest: New frames discarded because the ring buffer was full.
+    - ring_closed: Frames discarded because the ring buffer was closed while the reader waited for room (BLOCK).
+    - callback: Frames for which the packet callback raised an exception.
+    """
+    def dropped_frames(self) -> dict:
+        return self._dropped_frames_by_stage()
+
+    """
+    Returns a snapshot of the streaming statistics:
+    - counters: bytes read, frames parsed, stream packets (data_frames), stream packets with a wrong IEEE 802.15.4 FCS (fcs_errors),
+      stream packets rejected by the frame filter (filtered), times the parser resynchronized on a malformed frame (resyncs),
+      those malformed frames by cause (framing_errors: length, checksum, eof and truncated), bytes skipped by the parser between frames (discarded_bytes)
+      and the frames dropped at each stage (drops, see dropped_frames). Filtered packets are not counted as frames.
+    - latency_us: Histogram of the time spent on each stage, in microseconds:
+        - read: Serial port reads, including the time waiting for bytes.
+        - parse: Splitting the bytes read into frames.
+        - callback: Packet callback, which includes the pcap write when the callback writes the packet.
+    The snapshot can be exported with capture_stats.PrometheusExporter.
+    """
+    def stats(self) -> dict:
+        snapshot = self.capture_stats.snapshot()
+        snapshot['counters']['filtered'] = self.parser.filtered_frames
+        snapshot['counters']['resyncs'] = self.parser.invalid_frames
+        snapshot['counters']['framing_errors'] = {
+            'length': self.parser.length_errors,
+            'checksum': self.parser.checksum_errors,
+            'eof': self.parser.eof_errors,
+            'truncated': self.parser.truncated_frames,
+        }
+        snapshot['counters']['discarded_bytes'] = self.parser.discarded_bytes
+        snapshot['counters']['drops'] = self._dropped_frames_by_stage()
+        return snapshot
+
+    """
+    Returns the number of frames dropped at each stage, as described in dropped_frames.
+    """
+    def _dropped_frames_by_stage(self):
+        ring_stats = self.ring.stats() if self.ring is not None else {'dropped_oldest': 0, 'dropped_newest': 0, 'dropped_closed': 0}
+        return {
+            'framing': self.parser.invalid_frames,
+            'ring_oldest': ring_stats['dropped_oldest'],
+            'ring_newest': ring_stats['dropped_newest'],
+            'ring_closed': ring_stats['dropped_closed'],
+            'callback': self.callback_errors,
+        }
+
     """
     Receives a packet from the TI Sniffer device.
     The packet is delimited by the SOF and EOF bytes.
-    Returns a dictionary with the packet information:
-    - sof: Start of Frame bytes.
+    Returns a SnifferFrame with the packet information:
     - packet_info: Packet Info byte.
-    - packet_length: Packet Length bytes.
-    - command_data: Command Data bytes.
-    - fcs: Frame Check Sequence bytes.
-    - eof: End of Frame bytes.
+    - data: Command Data bytes.
+    - fcs: Frame Check Sequence byte.
+    - metadata: Device settings when the packet was received.
+    Stream packets (0xc0) also have the timestamp, rssi and status parsed.
+    If deadline (a time.monotonic value) is given, returns None if no packet arrived before it.
+    The deadline is checked between serial reads, so it can be passed by up to the serial timeout.
     """
-    def _recieve_packet(self):
+    def _recieve_packet(self, deadline = None):
         # Start of Frame | Packet Info | Packet Length | Command data | FCS | End of Frame (EOF)
         # 2B             | 1B          | 2B            | 0-255B       | 1B  | 2B
 
-        eof = ''.join(format(x, '02x') for x in self.eof)
-        sof = ''.join(format(x, '02x') for x in self.sof)
-        buffer = ''
-        while True:
-            byte = self.ser.read(1)
-            buffer += byte.hex()
-            if eof in buffer:
+        # Reads everything available on the serial port at once, which may complete several frames
+        while not self.pending_frames:
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            self.pending_frames.extend(self._read_frames())
+        return self.pending_frames.popleft()
+
+    """
+    Reads the bytes available on the serial port (waiting for at least one) and returns the frames they complete.
+    Updates the counters and the read and parse latency histograms.
+    """
+    def _read_frames(self):
+        latency = self.capture_stats.latency
+        read_start = time.perf_counter_ns()
+        data = self.ser.read(self.ser.in_waiting or 1)
+        parse_start = time.perf_counter_ns()
+        latency['read'].observe(parse_start - read_start)
+        if not data:
+            # A frame left incomplete for a whole read timeout was started by a corrupted or false SOF
+            if self.ser.timeout:
+                return self.parser.idle()
+            return ()
+        if self.recorder is not None:
+            with self.recorder_lock:
+                if self.recorder is not None:
+                    self.recorder.write(data)
+
+        frames = self.parser.feed(data)
+        latency['parse'].observe(time.perf_counter_ns() - parse_start)
+
+        data_frames = 0
+        fcs_errors = 0
+        for frame in frames:
+            if frame.packet_info == DATA_PACKET_INFO:
+                data_frames += 1
+                if not frame.status & STATUS_FCS_OK:
+                    fcs_errors += 1
+        counters = self.capture_stats.counters
+        counters['bytes'] += len(data)
+        counters['frames'] += len(frames)
+        counters['data_frames'] += data_frames
+        counters['fcs_errors'] += fcs_errors
+        return frames
+
+    """
+    Opens the serial port and resets the parser and the state.
+    The timeout is applied to every read, 0 makes the port non-blocking.
+    If the port cannot be opened the program exits, unless exit_on_error is False.
+    Returns True if the port was opened, False otherwise.
+    """
+    def _open_serial(self, timeout, exit_on_error = True) -> bool:
+        try:
+            self.ser = serial.Serial(port=self.port, baudrate=self.baudrate, bytesize=self.data_bits, parity=self.parity, stopbits=self.stop_bits, timeout=timeout)
+        except serial.SerialException as exception:
+            if not exit_on_error:
+                self._debug('[ERROR] Could not open serial port {}: {}'.format(self.port, exception))
+                return False
+            exit('[ERROR] Could not open serial port {}: {}'.format(self.port, serial.SerialException))
+        
+        if not self.ser.is_open:
+            self._debug('[ERROR] Serial port {} could not be opened.'.format(self.port))
+            return False
+
+        # Discards partial frames left from a previous connection
+        self.parser.reset()
+        self.pending_frames.clear()
+
+        self._change_state(State.STATE_WAITING_FOR_COMMAND)
+        return True
+
+    """
+    Writes a command to the TI Sniffer device and returns its response frame.
+    Stream packets still arriving from a previous start are discarded.
+    Returns None if the response did not arrive within command_timeout seconds.
+    """
+    def _send_command(self, command):
+        return self._send_commands([command])[0]
+
+    """
+    Writes several commands to the TI Sniffer device at once and returns their responses, in the same order.
+    The sniffer answers the commands in the order they were written.
+    Stream packets are discarded. Responses that did not arrive within command_timeout seconds are None.
+    """
+    def _send_commands(self, commands):
+        deadline = None if self.command_timeout is None else time.monotonic() + self.command_timeout
+        self.ser.write(b''.join(commands))
+        responses = []
+        while len(responses) < len(commands):
+            response = self._recieve_packet(deadline)
+            if response is None:
                 break
+            if response.packet_info != DATA_PACKET_INFO:
+                responses.append(response)
+        return responses + [None] * (len(commands) - len(responses))
 
-        response = {
-            'sof': buffer[0:4],
-            'packet_info': buffer[4:6],
-            'packet_length': buffer[6:10],
-            'command_data': buffer[10:-6],
-            'fcs': buffer[-6:-4],
-            'eof': buffer[-4:]
-        }
+    """
+    Prints the current interface, PHY, frequency and channel.
+    """
+    def _debug_connection_settings(self):
+        self._debug('[INFO] Connection settings: ')
+        self._debug('--Interface: COM{}'.format(self.metadata['interface']))
+        self._debug('--PHY: {}'.format(hex(self.metadata['phy'])))
+        self._debug('--Frequency: {}'.format(int.from_bytes(self.metadata['frequency'], byteorder='little')))
+        self._debug('--Channel: {}'.format(int.from_bytes(self.metadata['channel'], byteorder='little')))
+
+    """
+    Converts a frequency in MHz (for example 2450.0) to the format [0x92 0x09 0x00 0x00].
+    Frequencies already in the list format are returned as they are.
+    """
+    def _frequency_to_list(self, frequency):
+        if type(frequency) is float or type(frequency) is int:
+            whole_frequency = int(frequency)
+            fractionary_frequency = frequency - whole_frequency
+            whole_frequency = whole_frequency.to_bytes(2, byteorder='little')
+            fractionary_frequency = int(fractionary_frequency * 65536)
+            fractionary_frequency = fractionary_frequency.to_bytes(2, byteorder='little')
+            frequency = whole_frequency + fractionary_frequency
+            frequency = [int(byte) for byte in frequency]
+        return list(frequency)
+
+    """
+    Builds the configure frequency command for a frequency in the format [0x92 0x09 0x00 0x00].
+    """
+    def _build_frequency_command(self, frequency):
+        return bytes(self.sof + self.frequency_command_base + frequency + [self._calculate_fcs(self.frequency_command_base, frequency)] + self.eof)
+
+    """
+    Builds the configure PHY command for a PHY index.
+    """
+    def _build_phy_command(self, phy):
+        return bytes(self.sof + self.phy_command_base + [phy] + [self._calculate_fcs(self.phy_command_base, [phy])] + self.eof)
+
+    """
+    Prints the status of a command response.
+    Returns True if the command was received correctly, False otherwise or if there was no response.
+    """
+    def _check_response(self, command_name, response) -> bool:
+        if response is None:
+            self._debug('[ERROR] {} command got no response.'.format(command_name))
+            return False
+        self._debug('[INFO] {} command status: {}'.format(command_name, self._get_command_status(response.status)))
+        return response.status == 0x00
+
+    """
+    Handles the response of the configure frequency command.
+    Saves the new frequency in the metadata if it was configured.
+    """
+    def _on_frequency_response(self, response, frequency) -> bool:
+        if not self._check_response('Frequency', response):
+            self._debug('[INFO] Frequency could not be configured correctly to {}.'.format(frequency))
+            return False
+
+        # Saves the new frequency as list format in the metadata
+        self.metadata['frequency'] = frequency
+        self._update_device_metadata()
+        self._debug('[INFO] Frequency configured successfully to {} MHz.'.format(self.device_metadata.frequency_mhz))
+        return True
+
+    """
+    Handles the response of the configure PHY command.
+    Saves the new PHY in the metadata if it was configured.
+    """
+    def _on_phy_response(self, response, phy) -> bool:
+        if not self._check_response('PHY', response):
+            self._debug('[INFO] PHY could not be configured correctly to {}'.format(hex(phy)))
+            return False
+
+        self.metadata['phy'] = phy
+        self._update_device_metadata()
+        self._debug('[INFO] PHY configured successfully to {}'.format(hex(phy)))
+        return True
+
+    """
+    Handles the response of the start command.
+    """
+    def _on_start_response(self, response) -> bool:
+        if not self._check_response('Start', response):
+            return False
+        self._change_state(State.STATE_STARTED)
+        return True
+
+    """
+    Handles the response of the stop command.
+    """
+    def _on_stop_response(self, response) -> bool:
+        if not self._check_response('Stop', response):
+            return False
+        self._change_state(State.STATE_STOPPED)
+        return True
+
+    """
+    Handles the response of the ping command and updates the board information.
+    """
+    def _on_ping_response(self, response) -> bool:
+        if not self._check_response('Ping', response):
+            return False
+
+        board_info = self._get_board_info(response)
+        # Print board info
+        self._debug('[INFO] Board Information:')
+        self._debug('--Chip Id: {}'.format(board_info['chip_id']))
+        self._debug('--Chip Revision: {}'.format(board_info['chip_rev']))
+        self._debug('--FW Id: {}'.format(board_info['fw_id']))
+        self._debug('--FW Revision: {}'.format(board_info['fw_rev']))
 
-        # If the packet is a stream packet, the timestamp and the rssi are included in the packet info field
-        if response['packet_info'] == 'c0':
-            response['timestamp'] = response['command_data'][0:12]
-            response['rssi'] = response['command_data'][12:14]
-            response['command_data'] = response['command_data'][14:-2]
+        self._debug('[INFO] Board Information updated.')
+        self.board_info = board_info
 
-        return response
+        # If the board is in the WAITING_FOR_COMMAND state, change it to INIT if the ping was successful
+        if self.state == State.STATE_WAITING_FOR_COMMAND:
+            self._change_state(State.STATE_INIT)
+        return True
 
     """
     If debbuging is enabled, this method will print the message to the console.
@@ -345,7 +890,7 @@ class TISnifferController:
     Returns the status of a command based on the status byte received.
     """
     def _get_command_status(self, status_byte):
-        if status_byte not in self.status_lookup.keys():
+        if status_byte not in self.status_lookup:
             return 'Invalid status byte.'
         return self.status_lookup[status_byte]
     
@@ -361,12 +906,13 @@ class TISnifferController:
         - fw_rev: 2 bytes FW revision field. 1 byte major revision (MSB) and 1 byte minor revison (LSB) (for example Revision 1.10 -> 0x01 0x0a).
     """
     def _get_board_info(self, packet):
+        command_data = packet.data
         board_info = {
-            'status': self._big_endian_to_little_endian(packet['command_data'][0:2]),
-            'chip_id': self._big_endian_to_little_endian(packet['command_data'][2:6]),
-            'chip_rev': self._big_endian_to_little_endian(packet['command_data'][6:8]),
-            'fw_id': self._big_endian_to_little_endian(packet['command_data'][8:10]),
-            'fw_rev': self._big_endian_to_little_endian(packet['command_data'][10:14])
+            'status': packet.status,
+            'chip_id': command_data[1:3][::-1].hex(),
+            'chip_rev': command_data[3:4].hex(),
+            'fw_id': command_data[4:5].hex(),
+            'fw_rev': command_data[5:7][::-1].hex()
         }
         return board_info
 
@@ -385,17 +931,15 @@ class TISnifferController:
         return fcs
     
     """
-    Converts a big endian string to a little endian string.
-    For example: '1a2b3c' -> '3c2b1a'.
-    """
-    def _big_endian_to_little_endian(self, big_endian):
-        # Break string into 2 characters each
-        bytes_array = [big_endian[i:i+2] for i in range(0, len(big_endian), 2)]
-        # Reverse the array
-        bytes_array.reverse()
-        # Concatenate all elements and convert to string
-        bytes_array = ''.join(bytes_array)
-        return bytes_array
+    Rebuilds the immutable metadata attached to received frames from the current settings.
+    """
+    def _update_device_metadata(self):
+        self.device_metadata = DeviceMetadata(self.metadata['interface'], self.metadata['phy'], self.metadata['frequency'], self.metadata['channel'])
+        self.parser.metadata = self.device_metadata
+        if self.recorder is not None:
+            with self.recorder_lock:
+                if self.recorder is not None:
+                    self.recorder.write_metadata(self.device_metadata)
 
     """
     Changes the state of the sniffer to the specified state.
@@ -0,0 +1,347 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+import argparse
+import struct
+import threading
+import time
+
+import numpy as np
+
+from pcap_index import decode_addresses
+from sniffer_frame import STATUS_FCS_OK
+
+# Sliding windows by name: (duration in seconds, slots). A window moves forward by duration / slots seconds at a time
+WINDOWS = {
+    '1s': (1, 10),
+    '1m': (60, 12),
+    '15m': (900, 15),
+}
+# Frame of a micro-batch: Source (8B) | Destination (8B) | PAN ID (2B) | Length (2B) | RSSI (1B) | Flags (1B)
+FRAME_STRUCT = struct.Struct('<QQHHbB')
+FRAME_DTYPE = np.dtype([('source', '<u8'), ('destination', '<u8'), ('pan_id', '<u2'), ('length', '<u2'), ('rssi', 'i1'), ('flags', 'u1')])
+# Flags of a frame of a micro-batch
+FLAG_FCS_OK = 0x01
+FLAG_SOURCE = 0x02
+FLAG_DESTINATION = 0x04
+# RSSI histogram with 1 dB bins, from -128 to 127 dBm
+RSSI_BINS = 256
+RSSI_MIN = -128
+# Keys counted by the sketches, in the order of the sketches of a window
+SKETCH_KEYS = ('pan_id', 'source', 'destination')
+
+"""
+This class holds the counters of one sliding window of TrafficStats.
+The window is a ring of slots, each one with the counters, RSSI histogram and count-min sketches of the frames added
+while it was the current slot, and the sums of every slot are kept up to date, so a snapshot does not add the slots.
+When a slot leaves the window it is subtracted from the sums and reused.
+Every sketch also has a bounded set of candidate keys, the keys most likely to be the top talkers of the window.
+"""
+class _SlidingWindow:
+    def __init__(self, duration, slots, depth, width, top, now):
+        self.duration = duration
+        self.slots = slots
+        self.slot_duration = duration / slots
+        self.top = top
+        self.start = now
+        # Number of the current slot since the start of the clock
+        self.slot = int(now // self.slot_duration)
+
+        self.counters = np.zeros((slots, 3), dtype=np.int64)
+        self.rssi = np.zeros((slots, RSSI_BINS), dtype=np.int64)
+        self.sketches = np.zeros((slots, len(SKETCH_KEYS), depth * width), dtype=np.int32)
+        self.total_counters = np.zeros(3, dtype=np.int64)
+        self.total_rssi = np.zeros(RSSI_BINS, dtype=np.int64)
+        self.total_sketches = np.zeros((len(SKETCH_KEYS), depth * width), dtype=np.int64)
+        # Candidate keys of each sketch, pruned to the capacity keys with the highest counts
+        self.capacity = top * 4
+        self.candidates = [set() for _ in SKETCH_KEYS]
+
+    """
+    Moves the window to the time now, clearing the slots that left it.
+    """
+    def advance(self, now):
+        slot = int(now // self.slot_duration)
+        if slot <= self.slot:
+            return
+        if slot - self.slot >= self.slots:
+            self.counters[:] = 0
+            self.rssi[:] = 0
+            self.sketches[:] = 0
+            self.total_counters[:] = 0
+            self.total_rssi[:] = 0
+            self.total_sketches[:] = 0
+        else:
+            for expired in range(self.slot + 1, slot + 1):
+                index = expired % self.slots
+                self.total_counters -= self.counters[index]
+                self.total_rssi -= self.rssi[index]
+                self.total_sketches -= self.sketches[index]
+                self.counters[index] = 0
+                self.rssi[index] = 0
+                self.sketches[index] = 0
+        self.slot = slot
+
+    """
+    Adds the counts of a micro-batch to the current slot. keys holds the distinct keys of the batch for each sketch.
+    """
+    def add(self, now, counters, rssi, sketches, keys, sketch_indices):
+        self.advance(now)
+        index = self.slot % self.slots
+        self.counters[index] += counters
+        self.rssi[index] += rssi
+        self.sketches[index] += sketches
+        self.total_counters += counters
+        self.total_rssi += rssi
+        self.total_sketches += sketches
+        for sketch, batch_keys in enumerate(keys):
+            candidates = self.candidates[sketch]
+            candidates.update(batch_keys.tolist())
+            if len(candidates) > 2 * self.capacity:
+                self.candidates[sketch] = set(self._top_keys(sketch, self.capacity, sketch_indices)[0].tolist())
+
+    """
+    Returns the estimated frames of keys (uint64 array) in the window, from the sketch of SKETCH_KEYS[sketch].
+    """
+    def estimate(self, sketch, keys, sketch_indices):
+        return self.total_sketches[sketch][sketch_indices(keys)].min(axis=0)
+
+    """
+    Returns the count candidate keys with the most frames and their estimated frames, the busiest first.
+    """
+    def _top_keys(self, sketch, count, sketch_indices):
+        keys = np.fromiter(self.candidates[sketch], dtype=np.uint64, count=len(self.candidates[sketch]))
+        estimates = self.estimate(sketch, keys, sketch_indices)
+        order = np.argsort(-estimates, kind='stable')[:count]
+        order = order[estimates[order] > 0]
+        return keys[order], estimates[order]
+
+    """
+    Returns the time covered by the window at the time now, shorter than duration while it is being filled.
+    """
+    def covered(self, now):
+        covered = (self.slots - 1) * self.slot_duration + (now - self.slot * self.slot_duration)
+        return max(min(covered, now - self.start), 1e-9)
+
+    """
+    Returns the snapshot of the window at the time now, see TrafficStats.snapshot.
+    """
+    def snapshot(self, now, sketch_indices):
+        self.advance(now)
+        covered = self.covered(now)
+        frames, length, fcs_errors = (int(value) for value in self.total_counters)
+        bins = np.flatnonzero(self.total_rssi)
+        snapshot = {
+            'duration': covered,
+            'frames': frames,
+            'bytes': length,
+            'fcs_errors': fcs_errors,
+            'frames_per_second': frames / covered,
+            'bytes_per_second': length / covered,
+            'fcs_error_rate': fcs_errors / frames if frames else 0.0,
+            'rssi_min': int(bins[0]) + RSSI_MIN if frames else None,
+            'rssi_max': int(bins[-1]) + RSSI_MIN if frames else None,
+            'rssi_mean': float(np.dot(self.total_rssi, np.arange(RSSI_MIN, RSSI_MIN + RSSI_BINS))) / frames if frames else None,
+            'rssi_histogram': {int(rssi_bin) + RSSI_MIN: int(self.total_rssi[rssi_bin]) for rssi_bin in bins},
+        }
+        for sketch, name in enumerate(SKETCH_KEYS):
+            keys, estimates = self._top_keys(sketch, self.top, sketch_indices)
+            snapshot['top_{}s'.format(name)] = [(int(key), int(estimate), int(estimate) / covered) for key, estimate in zip(keys, estimates)]
+        return snapshot
+
+"""
+This class computes live traffic statistics of a capture, without keeping its frames:
+frames, bytes and FCS errors per second, the RSSI distribution, and the frames per second of each PAN ID, source address
+and destination address, with the busiest ones (top talkers). They are kept for sliding windows of the last second,
+minute and 15 minutes (WINDOWS), which are read at any time with snapshot.
+
+write_frame is the packet callback of TISnifferController.stream (or replay, or CaptureManager.capture), and passes each frame on
+to packet_callback, so the statistics can be added in front of any other consumer of the stream. It only decodes the addresses
+of the frame and appends a fixed size entry to the current micro-batch. Every batch_size frames, or flush_interval seconds,
+the batch is counted at once with NumPy: the RSSI histogram with one bincount, and PAN IDs and addresses with count-min
+sketches of depth x width counters. Memory is fixed by the windows and the sketch size, whatever the number of frames
+or addresses seen. The frames of a key are overestimated by at most 2 / width of the frames of the window in most cases.
+
+Frames without a PAN ID are counted on PAN ID 0xFFFF, and frames without a source or destination address are not counted
+on that sketch. Windows follow time.monotonic, so a replay faster than realtime is counted in the windows it is replayed in.
+"""
+class TrafficStats:
+    def __init__(self, windows = WINDOWS, batch_size = 512, flush_interval = 0.1, depth = 4, width = 1024, top = 10, packet_callback = None):
+        if width & (width - 1):
+            raise ValueError('The sketch width must be a power of 2.')
+        self.batch_size = batch_size
+        self.batch_bytes = batch_size * FRAME_STRUCT.size
+        self.flush_interval = flush_interval
+        self.depth = depth
+        self.width = width
+        self.packet_callback = packet_callback
+        self.lock = threading.Lock()
+        self.batch = bytearray()
+        self.last_flush = time.monotonic()
+
+        # Multiply-shift hash of each sketch row, the same for every window so sketches can be added
+        generator = np.random.default_rng(0x5EED)
+        self.multipliers = generator.integers(1, 1 << 63, size=(depth, 1), dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.increments = generator.integers(0, 1 << 63, size=(depth, 1), dtype=np.uint64)
+        self.shift = np.uint64(64 - width.bit_length() + 1)
+        self.row_offsets = (np.arange(depth, dtype=np.intp) * width).reshape(depth, 1)
+
+        self.windows = {name: _SlidingWindow(duration, slots, depth, width, top, self.last_flush) for name, (duration, slots) in windows.items()}
+
+        # Counters
+        self.frames = 0
+        self.batches = 0
+
+    """
+    Adds a stream packet (SnifferFrame) to the statistics and passes it on to packet_callback.
+    """
+    def write_frame(self, packet) -> None:
+        payload = packet.payload
+        source, destination, pan_id, destination_length, source_length = decode_addresses(payload)
+        flags = FLAG_FCS_OK if packet.status & STATUS_FCS_OK else 0
+        if source_length:
+            flags |= FLAG_SOURCE
+        if destination_length:
+            flags |= FLAG_DESTINATION
+        entry = FRAME_STRUCT.pack(source, destination, pan_id, len(payload), packet.rssi, flags)
+        with self.lock:
+            batch = self.batch
+            batch += entry
+            if len(batch) >= self.batch_bytes or time.monotonic() - self.last_flush >= self.flush_interval:
+                self._count_batch()
+        if self.packet_callback is not None:
+            self.packet_callback(packet)
+
+    """
+    Counts the frames of the current micro-batch.
+    """
+    def flush(self) -> None:
+        with self.lock:
+            self._count_batch()
+
+    """
+    Returns a dictionary with the statistics of each window, by name ('1s', '1m' and '15m' by default):
+    - duration: Seconds covered by the window, shorter than the window while it is being filled.
+    - frames, bytes, fcs_errors: Frames, bytes of the 802.15.4 frames and frames with a wrong FCS.
+    - frames_per_second, bytes_per_second, fcs_error_rate: The same over the duration, and FCS errors over frames.
+    - rssi_min, rssi_max, rssi_mean: RSSI in dBm, None without frames.
+    - rssi_histogram: Frames by RSSI in dBm, for the RSSI values seen.
+    - top_pan_ids, top_sources, top_destinations: Lists of (key, frames, frames per second) of the busiest keys.
+    Frames of the current micro-batch are counted first.
+    """
+    def snapshot(self) -> dict:
+        with self.lock:
+            self._count_batch()
+            now = time.monotonic()
+            return {name: window.snapshot(now, self._sketch_indices) for name, window in self.windows.items()}
+
+    """
+    Returns the estimated frames per second of a PAN ID, source address or destination address (kind is one of SKETCH_KEYS)
+    over a window. Extended addresses are given as int, like the addresses of MacHeader.
+    """
+    def frames_per_second(self, kind, key, window = '1m') -> float:
+        sketch = SKETCH_KEYS.index(kind)
+        with self.lock:
+            self._count_batch()
+            now = time.monotonic()
+            sliding_window = self.windows[window]
+            sliding_window.advance(now)
+            frames = sliding_window.estimate(sketch, np.array([key], dtype=np.uint64), self._sketch_indices)[0]
+            return int(frames) / sliding_window.covered(now)
+
+    """
+    Returns a dictionary with the counters of the statistics:
+    - traffic_frames: Frames counted.
+    - traffic_batches: Micro-batches counted.
+    """
+    def stats(self) -> dict:
+        return {
+            'counters': {
+                'traffic_frames': self.frames,
+                'traffic_batches': self.batches,
+            },
+        }
+
+    """
+    Returns the flat indexes of keys (uint64 array) on the rows of a sketch, as an array of depth rows.
+    """
+    def _sketch_indices(self, keys):
+        return ((keys * self.multipliers + self.increments) >> self.shift).astype(np.intp) + self.row_offsets
+
+    """
+    Counts the frames of the current micro-batch on every window. Must be called with the lock held.
+    """
+    def _count_batch(self):
+        self.last_flush = time.monotonic()
+        if not self.batch:
+            return
+        frames = np.frombuffer(bytes(self.batch), dtype=FRAME_DTYPE)
+        self.batch.clear()
+
+        flags = frames['flags']
+        fcs_errors = len(frames) - int(np.count_nonzero(flags & FLAG_FCS_OK))
+        counters = np.array((len(frames), int(frames['length'].sum()), fcs_errors), dtype=np.int64)
+        rssi = np.bincount(frames['rssi'].astype(np.intp) - RSSI_MIN, minlength=RSSI_BINS)
+
+        keys = (
+            frames['pan_id'].astype(np.uint64),
+            frames['source'][(flags & FLAG_SOURCE) != 0],
+            frames['destination'][(flags & FLAG_DESTINATION) != 0],
+        )
+        sketch_size = self.depth * self.width
+        sketches = np.stack([np.bincount(self._sketch_indices(sketch_keys).ravel(), minlength=sketch_size) for sketch_keys in keys])
+        distinct_keys = [np.unique(sketch_keys) for sketch_keys in keys]
+        for window in self.windows.values():
+            window.add(self.last_flush, counters, rssi, sketches, distinct_keys, self._sketch_indices)
+
+        self.frames += len(frames)
+        self.batches += 1
+
+"""
+Returns the snapshot of a window as text, for the command line.
+"""
+def format_snapshot(name, snapshot) -> str:
+    lines = ['[{}] {:.1f} frames/s, {:.0f} B/s, FCS errors {:.2%}, RSSI mean {} dBm'.format(
+        name, snapshot['frames_per_second'], snapshot['bytes_per_second'], snapshot['fcs_error_rate'],
+        '{:.1f}'.format(snapshot['rssi_mean']) if snapshot['rssi_mean'] is not None else '-')]
+    for kind in SKETCH_KEYS:
+        talkers = ', '.join('{:#x}: {:.1f}/s'.format(key, rate) for key, _, rate in snapshot['top_{}s'.format(kind)])
+        lines.append('    {}: {}'.format(kind, talkers or '-'))
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    from ti_sniffer_controller import TISnifferController
+
+    argument_parser = argparse.ArgumentParser(description='Prints live traffic statistics of a TI Sniffer.')
+    argument_parser.add_argument('port', help='Serial port of the TI Sniffer.')
+    argument_parser.add_argument('--interval', type=float, default=1.0, help='Seconds between printed statistics.')
+    argument_parser.add_argument('--window', default='1m', choices=list(WINDOWS), help='Window printed.')
+    argument_parser.add_argument('--top', type=int, default=5, help='Number of top PAN IDs and addresses printed.')
+    argument_parser.add_argument('--duration', type=float, default=-1, help='Seconds to run, forever if negative.')
+    arguments = argument_parser.parse_args()
+
+    traffic_stats = TrafficStats(top=arguments.top)
+    controller = TISnifferController(arguments.port)
+    if not controller.connect():
+        print('[ERROR] Could not connect to {}.'.format(arguments.port))
+        raise SystemExit(1)
+    controller.start()
+    start_time = time.monotonic()
+    try:
+        while arguments.duration < 0 or time.monotonic() - start_time < arguments.duration:
+            if not controller.stream(traffic_stats.write_frame, arguments.interval):
+                break
+            print(format_snapshot(arguments.window, traffic_stats.snapshot()[arguments.window]))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        controller.stop()
+        controller.disconnect()
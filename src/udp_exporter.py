@@ -0,0 +1,155 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+import socket
+import threading
+import time
+
+from pcap_builder import PcapBuilder, PACKET_HEADER_STRUCT, RSSI_OFFSET
+
+# UDP port used by the SmartRF Packet Sniffer 2 for the TI Radio Packet Info (0x4560, as in the placeholder UDP header)
+TI_UDP_PORT = 17760
+
+# Offset of the TI Radio Packet Info inside a pcap record: Packet Header (16B) | IPV4 header (20B) | UDP header (8B)
+RECORD_PAYLOAD_OFFSET = PACKET_HEADER_STRUCT.size + 20 + 8
+# Offsets of the RSSI and FCS inside a datagram
+DATAGRAM_RSSI_OFFSET = RSSI_OFFSET - RECORD_PAYLOAD_OFFSET
+DATAGRAM_FCS_OFFSET = DATAGRAM_RSSI_OFFSET + 1
+
+"""
+This class sends the packets as real UDP datagrams, like the SmartRF Packet Sniffer 2 does for live view.
+Each datagram carries the TI Radio Packet Info of one packet (the bytes after the IPV4 and UDP placeholders of the pcap records),
+so Wireshark with the TI dissector, or any collector, can receive live traffic from several sniffers over the network.
+
+Datagrams are queued and sent in batches of batch_size, or after flush_interval seconds, to keep the per-packet cost low.
+The socket is non-blocking: datagrams that the system cannot take are dropped and counted, so the capture never waits.
+It can be used as the packet callback (write_frame) or as a SinkFanout sink (write_record).
+"""
+class UdpExporter:
+    def __init__(self, host = '127.0.0.1', port = TI_UDP_PORT, batch_size = 64, flush_interval = 0.05):
+        self.address = (host, port)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        family = socket.AF_INET6 if ':' in host else socket.AF_INET
+        self.socket = socket.socket(family, socket.SOCK_DGRAM)
+        self.socket.connect(self.address)
+        self.socket.setblocking(False)
+
+        # Builds the TI Radio Packet Info with the same fields as the pcap records
+        self.builder = PcapBuilder()
+        # Datagram templates by metadata id, as the record templates of PcapBuilder
+        self.datagram_templates = {}
+
+        self.batch = []
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        self.flush_stop = threading.Event()
+        self.flush_thread = threading.Thread(target=self._flush_loop, name='udp-flush', daemon=True)
+        self.flush_thread.start()
+
+        # Counters
+        self.datagrams_sent = 0
+        self.bytes_sent = 0
+        self.dropped_datagrams = 0
+
+    """
+    Sends a packet (SnifferFrame) as a datagram.
+    """
+    def write_frame(self, packet) -> None:
+        metadata = packet.metadata
+        entry = self.datagram_templates.get(id(metadata))
+        if entry is None or entry[0] is not metadata:
+            entry = self._build_datagram_template(metadata)
+        # The template is shared by the threads calling write_frame, so the RSSI and FCS are filled in a copy
+        datagram = bytearray(entry[1])
+        datagram[DATAGRAM_RSSI_OFFSET] = packet.rssi & 0xFF
+        datagram[DATAGRAM_FCS_OFFSET] = packet.fcs
+        datagram += packet.payload
+        self._queue(datagram)
+
+    """
+    Sends a pcap record built by PcapBuilder.build_record as a datagram, without its packet header and IPV4/UDP placeholders.
+    """
+    def write_record(self, record) -> None:
+        self._queue(record[RECORD_PAYLOAD_OFFSET:])
+
+    """
+    Sends every queued datagram.
+    """
+    def flush(self) -> None:
+        with self.lock:
+            self._flush_locked()
+
+    """
+    Sends the queued datagrams and closes the socket.
+    """
+    def close(self):
+        self.flush_stop.set()
+        self.flush_thread.join()
+        self.flush()
+        self.socket.close()
+
+    """
+    Returns a dictionary with the counters of the exporter.
+    """
+    def stats(self) -> dict:
+        return {
+            'datagrams_sent': self.datagrams_sent,
+            'bytes_sent': self.bytes_sent,
+            'dropped_datagrams': self.dropped_datagrams,
+        }
+
+    """
+    Adds a datagram to the batch, and sends the batch when it is full or flush_interval seconds have passed.
+    """
+    def _queue(self, datagram):
+        with self.lock:
+            self.batch.append(datagram)
+            if len(self.batch) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush_locked()
+
+    """
+    Sends the datagrams of the batch, counting the ones the socket cannot take. Must be called with lock held.
+    """
+    def _flush_locked(self):
+        batch = self.batch
+        self.batch = []
+        self.last_flush = time.monotonic()
+        send = self.socket.send
+        for datagram in batch:
+            try:
+                self.bytes_sent += send(datagram)
+                self.datagrams_sent += 1
+            except (BlockingIOError, ConnectionRefusedError):
+                # Socket buffer full, or no one listening on a local port (ICMP port unreachable)
+                self.dropped_datagrams += 1
+
+    """
+    Background thread that sends datagrams queued for more than flush_interval even when no new packets arrive.
+    """
+    def _flush_loop(self):
+        while not self.flush_stop.wait(self.flush_interval):
+            with self.lock:
+                if self.batch and time.monotonic() - self.last_flush >= self.flush_interval:
+                    self._flush_locked()
+
+    """
+    Builds the datagram template for a device metadata: the TI Radio Packet Info up to the FCS.
+    Returns a tuple with the metadata and the template.
+    """
+    def _build_datagram_template(self, metadata):
+        template = self.builder._build_ti_prefix(metadata)[RECORD_PAYLOAD_OFFSET - PACKET_HEADER_STRUCT.size:] + bytearray(2)
+        if len(self.datagram_templates) >= 64:
+            self.datagram_templates.clear()
+        entry = (metadata, template)
+        self.datagram_templates[id(metadata)] = entry
+        return entry
@@ -28,4 +28,11 @@ class WiresharkPipe:
     """
     @abstractmethod
     def write(self, data):
-        pass
\ No newline at end of file
+        pass
+
+    """
+    Writes the file header (for example the pcap global header) to the pipe.
+    Pipes that accept new readers send it again to each reader before the live data.
+    """
+    def write_header(self, data):
+        self.write(data)
\ No newline at end of file
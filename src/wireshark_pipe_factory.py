@@ -15,12 +15,17 @@ class WiresharkPipeFactory:
     """
     Factory class to create a WiresharkPipe object.
     Returns a WiresharkPipe object according to the platform.
+    If non_blocking is True, on Linux the pipe never blocks the capture (see NonBlockingLinuxWiresharkPipe).
+    It has no effect on Windows.
     """
     @staticmethod
-    def create_wireshark_pipe():
+    def create_wireshark_pipe(non_blocking=False):
         if platform.system() == 'Windows':
             from wireshark_pipe_win import WindowsWiresharkPipe
             return WindowsWiresharkPipe()
         if platform.system() == 'Linux':
+            if non_blocking:
+                from wireshark_pipe_linux import NonBlockingLinuxWiresharkPipe
+                return NonBlockingLinuxWiresharkPipe()
             from wireshark_pipe_linux import LinuxWiresharkPipe
             return LinuxWiresharkPipe()
\ No newline at end of file
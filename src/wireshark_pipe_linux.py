@@ -10,7 +10,11 @@
 # ////////////////////////////////////////////////////////////////////////////////////////////////////
 
 import os
+import select
+import threading
+from collections import deque
 from wireshark_pipe import WiresharkPipe
+from ring_buffer import OverflowPolicy
 import errno
 
 class LinuxWiresharkPipe(WiresharkPipe):
@@ -40,4 +44,234 @@ class LinuxWiresharkPipe(WiresharkPipe):
     def write(self, data):
         if self.pipe:
             self.pipe.write(data)
-            self.pipe.flush()
\ No newline at end of file
+            self.pipe.flush()
+
+"""
+This class is a Linux FIFO that never blocks the capture.
+The FIFO is opened with O_NONBLOCK, so connect returns immediately even if Wireshark is not attached yet.
+Written data goes to a bounded buffer of buffer_size bytes that is sent to the FIFO as fast as the reader takes it.
+When the buffer is full, the overflow_policy decides whether the oldest or the newest writes are dropped,
+or whether the writer waits (BLOCK, which can stall the capture like the blocking pipe).
+Each write is kept or dropped as a whole, so the pipe must be written whole records.
+
+While no reader is attached the writes are discarded, so the capture to other outputs goes on.
+A background thread attaches to new readers every reconnect_interval seconds. When a reader attaches (or re-attaches
+after closing Wireshark) the header written with write_header is sent first, and then the live data.
+"""
+class NonBlockingLinuxWiresharkPipe(LinuxWiresharkPipe):
+    def __init__(self, buffer_size=4 * 1024 * 1024, overflow_policy=OverflowPolicy.DROP_OLDEST, reconnect_interval=0.5):
+        super().__init__()
+        self.buffer_size = buffer_size
+        self.overflow_policy = overflow_policy
+        self.reconnect_interval = reconnect_interval
+
+        # Header sent to every new reader
+        self.header = bytearray()
+        # Writes waiting to be sent, as [data, keep] entries. Entries with keep set (headers) are never dropped
+        self.pending = deque()
+        self.pending_bytes = 0
+        # Bytes of the first pending entry already sent
+        self.sent_offset = 0
+
+        self.fd = None
+        self.lock = threading.Lock()
+        self.writable = threading.Condition(self.lock)
+        self.thread = None
+        self.closed = threading.Event()
+
+        # Counters
+        self.connections = 0
+        self.bytes_sent = 0
+        self.dropped_writes = 0
+        self.dropped_bytes = 0
+        self.discarded_writes = 0
+
+    """
+    Tries to attach to a reader and starts the thread that sends the buffered data and attaches to new readers.
+    Does not wait for the reader.
+    Returns True if a reader is attached, False otherwise.
+    """
+    def connect(self):
+        with self.lock:
+            self._attach()
+            connected = self.fd is not None
+        if self.thread is None:
+            self.closed.clear()
+            self.thread = threading.Thread(target=self._send_loop, name='wireshark-pipe', daemon=True)
+            self.thread.start()
+        return connected
+
+    """
+    Stops the sender thread, gives the reader what is still buffered and removes the FIFO.
+    """
+    def close_pipe(self):
+        self.closed.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        with self.lock:
+            # Gives the reader what is still buffered without waiting for it
+            self._send()
+            self._detach()
+        if self.pipe_path:
+            os.remove(self.pipe_path)
+
+    """
+    Buffers data and sends what the FIFO takes. Discarded while no reader is attached.
+    """
+    def write(self, data):
+        with self.lock:
+            if self.fd is None:
+                self.discarded_writes += 1
+                return
+            self._append(bytes(data), False)
+            self._send()
+
+    """
+    Keeps the global header to send it again to each new reader, and sends it to the current one.
+    """
+    def write_header(self, data):
+        with self.lock:
+            self.header += data
+            if self.fd is not None:
+                self._append(bytes(data), True)
+                self._send()
+
+    """
+    Returns a dictionary with the counters of the pipe.
+    """
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'pipe_connections': self.connections,
+                'pipe_bytes_sent': self.bytes_sent,
+                'pipe_buffered_bytes': self.pending_bytes,
+                'pipe_dropped_writes': self.dropped_writes,
+                'pipe_dropped_bytes': self.dropped_bytes,
+                'pipe_discarded_writes': self.discarded_writes,
+            }
+
+    """
+    Adds a write to the buffer, applying the overflow policy if it does not fit.
+    """
+    def _append(self, data, keep):
+        if not keep and self.pending_bytes + len(data) > self.buffer_size:
+            if self.overflow_policy is OverflowPolicy.DROP_NEWEST:
+                self._count_dropped(data)
+                return
+            if self.overflow_policy is OverflowPolicy.DROP_OLDEST:
+                self._drop_oldest(len(data))
+            else:
+                while self.fd is not None and self.pending_bytes + len(data) > self.buffer_size:
+                    self._send()
+                    if self.pending_bytes + len(data) > self.buffer_size:
+                        self.writable.wait(self.reconnect_interval)
+                if self.fd is None:
+                    self.discarded_writes += 1
+                    return
+        self.pending.append([data, keep])
+        self.pending_bytes += len(data)
+
+    """
+    Drops the oldest writes until size bytes fit in the buffer.
+    Headers and the write being sent are kept, since dropping them would corrupt the stream.
+    """
+    def _drop_oldest(self, size):
+        kept = deque()
+        # The first entry may be partially sent
+        if self.pending and self.sent_offset:
+            kept.append(self.pending.popleft())
+        while self.pending and self.pending_bytes + size > self.buffer_size:
+            entry = self.pending.popleft()
+            if entry[1]:
+                kept.append(entry)
+                continue
+            self.pending_bytes -= len(entry[0])
+            self._count_dropped(entry[0])
+        kept.extend(self.pending)
+        self.pending = kept
+
+    """
+    Counts a buffered write dropped by the overflow policy.
+    """
+    def _count_dropped(self, data):
+        self.dropped_writes += 1
+        self.dropped_bytes += len(data)
+
+    """
+    Sends as much buffered data as the FIFO takes without blocking.
+    Detaches from the reader if it closed the FIFO.
+    """
+    def _send(self):
+        pending = self.pending
+        while pending and self.fd is not None:
+            data = pending[0][0]
+            try:
+                sent = os.write(self.fd, memoryview(data)[self.sent_offset:])
+            except BlockingIOError:
+                return
+            except OSError:
+                # Broken pipe, the reader went away
+                self._detach()
+                return
+            self.bytes_sent += sent
+            self.sent_offset += sent
+            if self.sent_offset == len(data):
+                pending.popleft()
+                self.pending_bytes -= len(data)
+                self.sent_offset = 0
+        self.writable.notify_all()
+
+    """
+    Opens the FIFO if a reader is waiting on it and queues the header for the new reader.
+    """
+    def _attach(self):
+        if self.fd is not None:
+            return
+        try:
+            self.fd = os.open(self.pipe_path, os.O_WRONLY | os.O_NONBLOCK)
+        except OSError as oe:
+            # ENXIO means no reader has the FIFO open
+            if oe.errno != errno.ENXIO:
+                raise
+            return
+        self.connections += 1
+        if self.header:
+            self._append(bytes(self.header), True)
+
+    """
+    Closes the FIFO and discards the data that was not sent to the reader.
+    """
+    def _detach(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        self.pending.clear()
+        self.pending_bytes = 0
+        self.sent_offset = 0
+        self.writable.notify_all()
+
+    """
+    Background thread that sends the buffered data when the FIFO becomes writable and attaches to new readers.
+    The FIFO is also watched while nothing is buffered, so a reader that leaves an idle capture is detached at once
+    and the next reader gets the header, instead of the rest of the stream of the previous one.
+    """
+    def _send_loop(self):
+        while not self.closed.is_set():
+            with self.lock:
+                self._attach()
+                self._send()
+                fd = self.fd
+                pending = bool(self.pending)
+            if fd is None:
+                self.closed.wait(self.reconnect_interval)
+                continue
+            # POLLERR (no reader left) and POLLHUP are reported even when no event is requested
+            poller = select.poll()
+            poller.register(fd, select.POLLOUT if pending else 0)
+            events = poller.poll(self.reconnect_interval * 1000)
+            if any(event & (select.POLLERR | select.POLLHUP) for _, event in events):
+                with self.lock:
+                    # Unless the FIFO was closed and reopened meanwhile
+                    if self.fd == fd:
+                        self._detach()
\ No newline at end of file
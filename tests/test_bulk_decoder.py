@@ -0,0 +1,82 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+import random
+import unittest
+
+try:
+    import bulk_decoder
+except ImportError:
+    bulk_decoder = None
+
+from frame_parser import FrameParser
+from sniffer_simulator import SnifferSimulator, build_frame
+
+"""
+Tests of bulk_decoder against FrameParser on the same streams. Skipped without NumPy.
+"""
+@unittest.skipIf(bulk_decoder is None, 'bulk_decoder requires NumPy')
+class BulkDecoderTest(unittest.TestCase):
+    def setUp(self):
+        simulator = SnifferSimulator(seed=11, pattern_probability=0.3)
+        parts = []
+        for index in range(2000):
+            parts.append(simulator._build_data_frame())
+            if index % 100 == 0:
+                parts.append(build_frame(0x80, b'\x00\x52\x13\x21\x01\x0a\x01'))
+        self.clean = b''.join(parts)
+
+        damage = random.Random(2)
+        stream = bytearray(self.clean)
+        for _ in range(100):
+            position = damage.randrange(len(stream))
+            kind = damage.randrange(3)
+            if kind == 0:
+                del stream[position]
+            elif kind == 1:
+                stream[position] ^= 0x11
+            else:
+                stream[position:position] = b'\x40\x53\xc0\x09'
+        self.corrupted = bytes(stream)
+
+    """
+    Asserts that decode_frames finds the same frames as FrameParser, with the same fields.
+    """
+    def assert_same_frames(self, stream, chunk_size):
+        parser = FrameParser()
+        expected = parser.feed(stream)
+        frames = bulk_decoder.decode_frames(stream, 7, chunk_size=chunk_size)
+        self.assertEqual(len(frames), len(expected))
+        for frame, decoded in zip(expected, frames):
+            self.assertEqual(frame.packet_info, decoded['packet_info'])
+            self.assertEqual(len(frame.data), decoded['length'])
+            self.assertEqual(frame.timestamp or 0, decoded['timestamp'])
+            self.assertEqual(frame.rssi or 0, decoded['rssi'])
+            self.assertEqual(frame.status, decoded['status'])
+            self.assertEqual(frame.fcs, decoded['fcs'])
+            self.assertEqual(decoded['interface'], 7)
+
+    """
+    Clean streams decode to the same frames, in one chunk or in chunks smaller than the stream.
+    """
+    def test_clean_stream(self):
+        self.assert_same_frames(self.clean, 1 << 24)
+        self.assert_same_frames(self.clean, 4096)
+
+    """
+    Corrupted streams are resynchronized like FrameParser does.
+    """
+    def test_corrupted_stream(self):
+        self.assert_same_frames(self.corrupted, 1 << 24)
+        self.assert_same_frames(self.corrupted, 4096)
+
+if __name__ == '__main__':
+    unittest.main()
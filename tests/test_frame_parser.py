@@ -0,0 +1,146 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+import random
+import unittest
+
+from frame_parser import FrameParser
+from sniffer_frame import DeviceMetadata, DATA_PACKET_INFO
+from sniffer_simulator import SnifferSimulator, build_frame
+
+METADATA = DeviceMetadata(3, 0x12, [0x92, 0x09, 0x00, 0x00], [0x14, 0x00])
+
+"""
+Returns the frames of a stream fed to a new parser in chunks of random sizes, and the parser.
+"""
+def parse(stream, seed = 0, max_chunk = 300):
+    parser = FrameParser()
+    parser.metadata = METADATA
+    chunk_sizes = random.Random(seed)
+    frames = []
+    position = 0
+    while position < len(stream):
+        size = chunk_sizes.randint(1, max_chunk)
+        frames += parser.feed(stream[position:position + size])
+        position += size
+    return frames, parser
+
+"""
+Returns the Command Data of the serial frames of a list built by SnifferSimulator.
+"""
+def command_data(serial_frames):
+    return [serial_frame[5:-3] for serial_frame in serial_frames]
+
+"""
+Tests of FrameParser: framing, validation of the Packet Length, FCS and EOF, and resynchronization.
+"""
+class FrameParserTest(unittest.TestCase):
+    def setUp(self):
+        simulator = SnifferSimulator(seed=1, pattern_probability=0.3)
+        self.serial_frames = [simulator._build_data_frame() for _ in range(500)]
+        self.stream = b''.join(self.serial_frames)
+
+    """
+    Every frame is returned once, whatever the chunk sizes, even with SOF and EOF patterns in the payloads.
+    """
+    def test_chunk_sizes(self):
+        expected = command_data(self.serial_frames)
+        for seed, max_chunk in ((0, 1), (1, 7), (2, 4096), (3, len(self.stream))):
+            frames, parser = parse(self.stream, seed, max_chunk)
+            self.assertEqual([frame.data for frame in frames], expected)
+            self.assertEqual(parser.invalid_frames, 0)
+            self.assertEqual(parser.discarded_bytes, 0)
+
+    """
+    Stream packets get their fields and the metadata of the parser.
+    """
+    def test_frame_fields(self):
+        data = (123456789).to_bytes(6, byteorder='little') + bytes([0xC4]) + b'\x01\x02\x03' + b'\x80'
+        frames, _ = parse(build_frame(DATA_PACKET_INFO, data))
+        self.assertEqual(len(frames), 1)
+        frame = frames[0]
+        self.assertEqual(frame.timestamp, 123456789)
+        self.assertEqual(frame.rssi, -60)
+        self.assertEqual(frame.status, 0x80)
+        self.assertEqual(bytes(frame.payload), b'\x01\x02\x03')
+        self.assertIs(frame.metadata, METADATA)
+
+    """
+    A frame with a wrong FCS is dropped and counted, and the frames after it are kept.
+    """
+    def test_fcs_error(self):
+        damaged = bytearray(self.serial_frames[10])
+        damaged[-3] ^= 0xFF
+        frames, parser = parse(b''.join(self.serial_frames[:10]) + damaged + b''.join(self.serial_frames[11:]))
+        self.assertEqual([frame.data for frame in frames], command_data(self.serial_frames[:10] + self.serial_frames[11:]))
+        self.assertEqual(parser.checksum_errors, 1)
+
+    """
+    A frame without EOF is dropped and counted, and the frames after it are kept.
+    """
+    def test_eof_error(self):
+        damaged = bytearray(self.serial_frames[10])
+        damaged[-1] ^= 0xFF
+        frames, parser = parse(b''.join(self.serial_frames[:10]) + damaged + b''.join(self.serial_frames[11:]))
+        self.assertEqual([frame.data for frame in frames], command_data(self.serial_frames[:10] + self.serial_frames[11:]))
+        self.assertEqual(parser.eof_errors, 1)
+
+    """
+    A Packet Length longer than max_packet_length is rejected without waiting for its bytes.
+    """
+    def test_length_error(self):
+        response = build_frame(0x80, b'\x00')
+        parser = FrameParser()
+        frames = parser.feed(b'\x40\x53\x80\xff\xff' + response)
+        self.assertEqual([frame.data for frame in frames], [b'\x00'])
+        self.assertEqual(parser.length_errors, 1)
+
+    """
+    After a lost, changed or inserted byte, the parser resynchronizes on the next SOF and keeps every undamaged frame.
+    """
+    def test_resync(self):
+        damage = random.Random(2)
+        stream = bytearray()
+        kept = []
+        for index, serial_frame in enumerate(self.serial_frames):
+            serial_frame = bytearray(serial_frame)
+            if index % 20 == 5:
+                position = damage.randrange(len(serial_frame))
+                kind = index % 3
+                if kind == 0:
+                    del serial_frame[position]
+                elif kind == 1:
+                    serial_frame[position] ^= 0x5A
+                else:
+                    serial_frame[position:position] = b'\x40\x53\xff\x07'
+            else:
+                kept.append(bytes(serial_frame[5:-3]))
+            stream += serial_frame
+
+        frames, parser = parse(bytes(stream), seed=4)
+        data = [frame.data for frame in frames]
+        remaining = iter(data)
+        self.assertTrue(all(frame_data in remaining for frame_data in kept))
+        self.assertGreater(parser.invalid_frames, 0)
+
+    """
+    A false SOF announcing a long frame holds the frames after it until the link goes idle.
+    """
+    def test_idle(self):
+        response = build_frame(0x80, b'\x00')
+        parser = FrameParser()
+        self.assertEqual(parser.feed(b'\x40\x53\x80\x00\x07' + response), [])
+        frames = parser.idle()
+        self.assertEqual([frame.data for frame in frames], [b'\x00'])
+        self.assertEqual(parser.truncated_frames, 1)
+
+if __name__ == '__main__':
+    unittest.main()
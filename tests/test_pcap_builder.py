@@ -0,0 +1,172 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+import os
+import struct
+import tempfile
+import unittest
+
+from pcap_builder import PcapBuilder, GLOBAL_HEADER_STRUCT, PACKET_HEADER_STRUCT, IPV4_LENGTH_OFFSET, INTERFACE_OFFSET, RSSI_OFFSET, FCS_OFFSET, PAYLOAD_OFFSET
+from pcapng_builder import PcapngBuilder, SECTION_HEADER_BLOCK, INTERFACE_DESCRIPTION_BLOCK, ENHANCED_PACKET_BLOCK, INTERFACE_STATISTICS_BLOCK, ISB_IFRECV
+from sniffer_frame import SnifferFrame, DeviceMetadata, DATA_PACKET_INFO
+
+FIRST_DEVICE = DeviceMetadata(3, 0x12, [0x92, 0x09, 0x00, 0x00], [0x14, 0x00])
+SECOND_DEVICE = DeviceMetadata(5, 0x12, [0x9C, 0x09, 0x00, 0x00], [0x19, 0x00])
+
+"""
+Returns a stream packet with the given timestamp (us), RSSI and 802.15.4 frame.
+"""
+def make_frame(timestamp, rssi, mac_frame, metadata = FIRST_DEVICE):
+    data = timestamp.to_bytes(6, byteorder='little') + bytes([rssi & 0xFF]) + mac_frame + b'\x80'
+    return SnifferFrame(DATA_PACKET_INFO, data, 0x5A, metadata)
+
+FRAMES = [
+    make_frame(1_000_000, -40, b'\x41\x88\x01\x34\x12\xff\xff\x01\x00\xaa\xbb'),
+    make_frame(1_250_000, -70, b'\x41\x88\x02\x34\x12\x02\x00\x01\x00'),
+    make_frame(3_999_999, -90, b'\x02\x00\x03', SECOND_DEVICE),
+    make_frame(4_000_000, -20, bytes(range(100))),
+]
+
+"""
+Splits a pcap file into its global header and records.
+"""
+def read_pcap(data):
+    records = []
+    offset = GLOBAL_HEADER_STRUCT.size
+    while offset < len(data):
+        length = PACKET_HEADER_STRUCT.size + PACKET_HEADER_STRUCT.unpack_from(data, offset)[2]
+        records.append(data[offset:offset + length])
+        offset += length
+    return GLOBAL_HEADER_STRUCT.unpack_from(data, 0), records
+
+"""
+Splits a pcapng file into (block type, body) tuples, checking both length fields of each block.
+"""
+def read_pcapng(test, data):
+    blocks = []
+    offset = 0
+    while offset < len(data):
+        block_type, length = struct.unpack_from('<II', data, offset)
+        test.assertEqual(length % 4, 0)
+        test.assertEqual(struct.unpack_from('<I', data, offset + length - 4)[0], length)
+        blocks.append((block_type, data[offset + 8:offset + length - 4]))
+        offset += length
+    test.assertEqual(offset, len(data))
+    return blocks
+
+"""
+Tests of the byte layout of the pcap and pcapng files.
+"""
+class PcapLayoutTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    """
+    Writes FRAMES with a builder and returns the bytes of the file.
+    If legacy is True, packets are written with write_packet_header and write_packet.
+    """
+    def write(self, builder, name, legacy = False):
+        path = os.path.join(self.directory.name, name)
+        builder.open_pcap(path)
+        # Same time base for every file, whenever it is opened
+        builder.initial_time = builder.global_header['thiszone'] + 1_700_000_000
+        builder.write_global_header()
+        for frame in FRAMES:
+            if legacy:
+                builder.write_packet_header(frame)
+                builder.write_packet(frame)
+            else:
+                builder.write_frame(frame)
+        builder.close_pcap()
+        with open(path, 'rb') as pcap_file:
+            return pcap_file.read()
+
+    """
+    The global header and each record have the fields of the packet, as Wireshark expects them.
+    """
+    def test_pcap_layout(self):
+        builder = PcapBuilder()
+        global_header, records = read_pcap(self.write(builder, 'capture.pcap'))
+        self.assertEqual(global_header, (0xA1B2C3D4, 2, 4, builder.global_header['thiszone'], 0, 262144, 228))
+        self.assertEqual(len(records), len(FRAMES))
+
+        first_seconds = None
+        for record, frame in zip(records, FRAMES):
+            seconds, microseconds, included_length, original_length = PACKET_HEADER_STRUCT.unpack_from(record, 0)
+            if first_seconds is None:
+                first_seconds = seconds
+                self.assertEqual(seconds, 1_700_000_000 + builder.global_header['thiszone'])
+            self.assertEqual(seconds - first_seconds, frame.timestamp // 1_000_000 - FRAMES[0].timestamp // 1_000_000)
+            self.assertEqual(microseconds, frame.timestamp % 1_000_000)
+            self.assertEqual(included_length, len(record) - PACKET_HEADER_STRUCT.size)
+            self.assertEqual(original_length, included_length)
+            self.assertEqual(struct.unpack_from('>H', record, IPV4_LENGTH_OFFSET)[0], included_length)
+            self.assertEqual(struct.unpack_from('<H', record, INTERFACE_OFFSET)[0], frame.metadata.interface)
+            self.assertEqual(record[RSSI_OFFSET], frame.rssi & 0xFF)
+            self.assertEqual(record[FCS_OFFSET], frame.fcs)
+            self.assertEqual(record[PAYLOAD_OFFSET:], bytes(frame.payload))
+
+    """
+    write_frame, its buffered mode, build_record and the legacy write_packet_header / write_packet write the same bytes.
+    """
+    def test_pcap_writers_match(self):
+        expected = self.write(PcapBuilder(), 'frame.pcap')
+        self.assertEqual(self.write(PcapBuilder(buffered=True), 'buffered.pcap'), expected)
+        self.assertEqual(self.write(PcapBuilder(), 'legacy.pcap', legacy=True), expected)
+
+        builder = PcapBuilder()
+        builder.initial_time = builder.global_header['thiszone'] + 1_700_000_000
+        records = b''.join(builder.build_record(frame) for frame in FRAMES)
+        self.assertEqual(records, expected[GLOBAL_HEADER_STRUCT.size:])
+
+    """
+    The pcapng file has a Section Header Block, one Interface Description Block per device before its first packet,
+    an Enhanced Packet Block per packet and the Interface Statistics Blocks written on close.
+    """
+    def test_pcapng_layout(self):
+        blocks = read_pcapng(self, self.write(PcapngBuilder(stats_interval=0), 'capture.pcapng'))
+        self.assertEqual(blocks[0][0], SECTION_HEADER_BLOCK)
+        self.assertEqual(struct.unpack_from('<IHH', blocks[0][1], 0), (0x1A2B3C4D, 1, 0))
+
+        types = [block_type for block_type, _ in blocks]
+        self.assertEqual(types, [SECTION_HEADER_BLOCK, INTERFACE_DESCRIPTION_BLOCK, ENHANCED_PACKET_BLOCK, ENHANCED_PACKET_BLOCK,
+                                 INTERFACE_DESCRIPTION_BLOCK, ENHANCED_PACKET_BLOCK, ENHANCED_PACKET_BLOCK,
+                                 INTERFACE_STATISTICS_BLOCK, INTERFACE_STATISTICS_BLOCK])
+
+        packets = [body for block_type, body in blocks if block_type == ENHANCED_PACKET_BLOCK]
+        timestamps = []
+        for body, frame in zip(packets, FRAMES):
+            interface_id, high, low, captured_length, original_length = struct.unpack_from('<IIIII', body, 0)
+            self.assertEqual(interface_id, 0 if frame.metadata is FIRST_DEVICE else 1)
+            self.assertEqual(captured_length, original_length)
+            packet_data = body[20:20 + captured_length]
+            self.assertTrue(packet_data.endswith(bytes(frame.payload)))
+            self.assertEqual(packet_data[RSSI_OFFSET - PACKET_HEADER_STRUCT.size], frame.rssi & 0xFF)
+            timestamps.append((high << 32) | low)
+        self.assertEqual([timestamp - timestamps[0] for timestamp in timestamps], [frame.timestamp - FRAMES[0].timestamp for frame in FRAMES])
+
+        received = []
+        for block_type, body in blocks:
+            if block_type == INTERFACE_STATISTICS_BLOCK:
+                offset = 12
+                while True:
+                    code, length = struct.unpack_from('<HH', body, offset)
+                    if code == ISB_IFRECV:
+                        received.append(struct.unpack_from('<Q', body, offset + 4)[0])
+                        break
+                    offset += 4 + length + (-length & 3)
+        self.assertEqual(received, [3, 1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+import os
+import tempfile
+import unittest
+
+from pcap_builder import PcapBuilder, GLOBAL_HEADER_STRUCT
+from pcap_index import PcapIndex, build_index, index_path
+from tests.test_pcap_builder import FRAMES, read_pcap
+
+START = 1_700_000_000
+
+"""
+Tests of the sidecar index written by PcapBuilder and of the queries of PcapIndex.
+"""
+class PcapIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'capture.pcap')
+        builder = PcapBuilder(index=True)
+        builder.open_pcap(self.path)
+        builder.initial_time = builder.global_header['thiszone'] + START
+        builder.write_global_header()
+        for frame in FRAMES:
+            builder.write_frame(frame)
+        builder.close_pcap()
+        with open(self.path, 'rb') as pcap_file:
+            self.records = read_pcap(pcap_file.read())[1]
+        self.index = PcapIndex(self.path)
+
+    def tearDown(self):
+        self.index.close()
+        self.directory.cleanup()
+
+    """
+    Returns the positions in FRAMES of the records of a list of index entries.
+    """
+    def positions(self, entries):
+        offsets = [entry.offset for entry in self.index]
+        return [offsets.index(entry.offset) for entry in entries]
+
+    """
+    Each entry has the offset, length, UTC timestamp, interface and addresses of its record.
+    """
+    def test_entries(self):
+        self.assertEqual(len(self.index), len(FRAMES))
+        offset = GLOBAL_HEADER_STRUCT.size
+        for entry, record, frame in zip(self.index, self.records, FRAMES):
+            self.assertEqual(entry.offset, offset)
+            self.assertEqual(entry.length, len(record))
+            self.assertEqual(entry.timestamp, START * 1_000_000 + frame.timestamp - FRAMES[0].timestamp // 1_000_000 * 1_000_000)
+            self.assertEqual(entry.interface, frame.metadata.interface)
+            offset += len(record)
+        self.assertEqual((self.index[0].pan_id, self.index[0].source, self.index[0].destination), (0x1234, 0x0001, 0xFFFF))
+        self.assertEqual((self.index[2].source_length, self.index[2].destination_length), (0, 0))
+
+    """
+    Queries by time range, address, PAN ID and interface.
+    """
+    def test_query(self):
+        self.assertEqual(self.positions(self.index.query()), [0, 1, 2, 3])
+        self.assertEqual(self.positions(self.index.query(start=START + 0.1, end=START + 3)), [1, 2, 3])
+        self.assertEqual(self.positions(self.index.query(address=0x0001)), [0, 1])
+        self.assertEqual(self.positions(self.index.query(address=b'\x00\x02')), [1])
+        self.assertEqual(self.positions(self.index.query(destination='ff:ff')), [0])
+        self.assertEqual(self.positions(self.index.query(source=bytes(7) + b'\x01')), [])
+        self.assertEqual(self.positions(self.index.query(pan_id=0x1234, start=START + 0.1)), [1])
+        self.assertEqual(self.positions(self.index.query(interface=5)), [2])
+
+    """
+    extract writes the global header and the records of the entries to a new pcap.
+    """
+    def test_extract(self):
+        output_path = os.path.join(self.directory.name, 'extract.pcap')
+        self.assertEqual(self.index.extract(self.index.query(pan_id=0x1234), output_path), 2)
+        with open(self.path, 'rb') as pcap_file, open(output_path, 'rb') as output_file:
+            expected = pcap_file.read()[:GLOBAL_HEADER_STRUCT.size] + self.records[0] + self.records[1]
+            self.assertEqual(output_file.read(), expected)
+
+    """
+    build_index on the finished capture writes the same index as the one written while capturing.
+    """
+    def test_build_index(self):
+        output_path = os.path.join(self.directory.name, 'rebuilt.idx')
+        self.assertEqual(build_index(self.path, output_path), len(FRAMES))
+        with open(index_path(self.path), 'rb') as index_file, open(output_path, 'rb') as output_file:
+            self.assertEqual(output_file.read(), index_file.read())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+import threading
+import time
+import unittest
+
+from ring_buffer import RingBuffer, OverflowPolicy
+
+"""
+Tests of the overflow policies and closing of RingBuffer.
+"""
+class RingBufferTest(unittest.TestCase):
+    """
+    Items come out in the order they were pushed, across the end of the slots.
+    """
+    def test_fifo(self):
+        ring = RingBuffer(4)
+        items = []
+        for first in range(0, 12, 3):
+            self.assertEqual(ring.put_many(range(first, first + 3)), 3)
+            items += ring.get_many(10)
+        self.assertEqual(items, list(range(12)))
+        self.assertEqual(ring.stats()['pushed'], 12)
+        self.assertEqual(ring.stats()['popped'], 12)
+
+    """
+    DROP_OLDEST keeps the newest items.
+    """
+    def test_drop_oldest(self):
+        ring = RingBuffer(4, OverflowPolicy.DROP_OLDEST)
+        self.assertEqual(ring.put_many(range(10)), 10)
+        self.assertEqual(ring.get_many(10), [6, 7, 8, 9])
+        self.assertEqual(ring.stats()['dropped_oldest'], 6)
+
+    """
+    DROP_NEWEST keeps the oldest items and reports the dropped ones.
+    """
+    def test_drop_newest(self):
+        ring = RingBuffer(4, OverflowPolicy.DROP_NEWEST)
+        self.assertEqual(ring.put_many(range(10)), 4)
+        self.assertFalse(ring.put(10))
+        self.assertEqual(ring.get_many(10), [0, 1, 2, 3])
+        self.assertEqual(ring.stats()['dropped_newest'], 7)
+
+    """
+    BLOCK makes the producer wait for the consumer, so no item is lost.
+    """
+    def test_block(self):
+        ring = RingBuffer(4, OverflowPolicy.BLOCK)
+        producer = threading.Thread(target=ring.put_many, args=(range(100),))
+        producer.start()
+        items = []
+        while len(items) < 100:
+            items += ring.get_many(3, timeout=5)
+        producer.join()
+        self.assertEqual(items, list(range(100)))
+        self.assertEqual(ring.stats()['dropped_closed'], 0)
+
+    """
+    Closing the buffer wakes a blocked producer and counts the items it could not push.
+    """
+    def test_close_blocked_producer(self):
+        ring = RingBuffer(4, OverflowPolicy.BLOCK)
+        stored = []
+        producer = threading.Thread(target=lambda: stored.append(ring.put_many(range(10))))
+        producer.start()
+        while len(ring) < 4:
+            time.sleep(0.001)
+        ring.close()
+        producer.join()
+        self.assertEqual(stored, [4])
+        self.assertEqual(ring.stats()['dropped_closed'], 6)
+        self.assertEqual(ring.get_many(10), [0, 1, 2, 3])
+        self.assertEqual(ring.get_many(10), [])
+
+    """
+    get_many returns an empty list on timeout, and when the buffer is closed and empty.
+    """
+    def test_get_timeout(self):
+        ring = RingBuffer(4)
+        self.assertEqual(ring.get_many(10, timeout=0.01), [])
+        threading.Timer(0.01, ring.close).start()
+        self.assertEqual(ring.get_many(10), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+# // Company:  Aceno Digital Tecnologia em Sistemas Ltda.
+# // Homepage: http://www.aceno.com
+# // Project:  Interface TI Packet Sniffer
+# // Version:  1.0
+# // Date:     2024
+# //
+# // Copyright (C) 2002-2024 Aceno Tecnologia.
+# // Todos os direitos reservados.
+# ////////////////////////////////////////////////////////////////////////////////////////////////////
+
+import os
+import tempfile
+import time
+import unittest
+
+from frame_filter import FrameFilter
+from frame_parser import FrameParser
+from raw_recording import RawRecorder
+from ring_buffer import OverflowPolicy
+from sniffer_frame import DeviceMetadata, DATA_PACKET_INFO
+from sniffer_simulator import SnifferSimulator, build_frame
+from ti_sniffer_controller import TISnifferController, State
+
+METADATA = DeviceMetadata(4, 0x12, [0x92, 0x09, 0x00, 0x00], [0x14, 0x00])
+
+"""
+Serial port replaced by an in-memory byte stream, read in chunks of at most chunk_size bytes.
+Reads return no bytes once the stream is over, as a serial port with nothing to read.
+"""
+class MemorySerial:
+    def __init__(self, data, chunk_size = 4096):
+        self.data = data
+        self.chunk_size = chunk_size
+        self.position = 0
+        self.timeout = 0
+        self.is_open = True
+
+    """
+    Number of bytes of the next chunk.
+    """
+    @property
+    def in_waiting(self):
+        return min(self.chunk_size, len(self.data) - self.position)
+
+    """
+    Returns up to size bytes of the stream.
+    """
+    def read(self, size = 1):
+        chunk = self.data[self.position:self.position + size]
+        self.position += len(chunk)
+        return chunk
+
+    """
+    Discards commands written to the port.
+    """
+    def write(self, data):
+        return len(data)
+
+    """
+    Closes the port.
+    """
+    def close(self):
+        self.is_open = False
+
+"""
+Tests of the controller streaming and replay paths, fed by simulator streams instead of a device.
+"""
+class ControllerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        simulator = SnifferSimulator(seed=5, pattern_probability=0.2)
+        parts = []
+        for index in range(3000):
+            parts.append(simulator._build_data_frame())
+            if index % 500 == 0:
+                parts.append(build_frame(0x80, b'\x00'))
+        self.stream = b''.join(parts)
+
+        parser = FrameParser()
+        self.expected = [frame.data for frame in parser.feed(self.stream) if frame.packet_info == DATA_PACKET_INFO]
+        self.controller = TISnifferController('/dev/ttyACM4')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    """
+    Streams the in-memory stream for read_time seconds with the threaded reader and returns the packets received.
+    """
+    def stream_threaded(self, read_time, **options):
+        packets = []
+        self.controller.ser = MemorySerial(self.stream)
+        self.controller.state = State.STATE_STARTED
+        self.assertTrue(self.controller.stream(packets.append, read_time, threaded=True, **options))
+        return packets
+
+    """
+    Returns the path of a recording of the stream, written in chunks of chunk_size bytes.
+    """
+    def record(self, chunk_size = 1000):
+        path = os.path.join(self.directory.name, 'capture.rec')
+        recorder = RawRecorder(path)
+        recorder.write_metadata(METADATA)
+        for position in range(0, len(self.stream), chunk_size):
+            recorder.write(self.stream[position:position + chunk_size])
+        recorder.close()
+        return path
+
+    """
+    The threaded streaming delivers every stream packet in order, and keeps command responses for _recieve_packet.
+    """
+    def test_stream_threaded(self):
+        packets = self.stream_threaded(0.3)
+        self.assertEqual([packet.data for packet in packets], self.expected)
+        self.assertEqual(len(self.controller.pending_frames), 6)
+
+    """
+    With BLOCK, a reader pushing more packets than the ring buffer holds waits for a slow consumer instead of dropping.
+    """
+    def test_stream_threaded_block(self):
+        packets = self.stream_threaded(0.5, ring_size=8, overflow_policy=OverflowPolicy.BLOCK)
+        self.assertEqual([packet.data for packet in packets], self.expected)
+        self.assertEqual(self.controller.ring.stats()['dropped_closed'], 0)
+
+    """
+    With DROP_NEWEST and a slow consumer, packets are dropped and counted, and the ones delivered keep their order.
+    """
+    def test_stream_threaded_drop(self):
+        packets = []
+        def slow_callback(packet):
+            packets.append(packet.data)
+            time.sleep(0.0005)
+        self.controller.ser = MemorySerial(self.stream)
+        self.controller.state = State.STATE_STARTED
+        self.controller.stream(slow_callback, 0.3, threaded=True, ring_size=16, overflow_policy=OverflowPolicy.DROP_NEWEST)
+
+        dropped = self.controller.ring.stats()['dropped_newest']
+        self.assertGreater(dropped, 0)
+        self.assertEqual(len(packets) + dropped, len(self.expected))
+        remaining = iter(self.expected)
+        self.assertTrue(all(data in remaining for data in packets))
+
+    """
+    A recording replayed through the controller gives the same packets with the recorded metadata,
+    threaded or not, and the controller is restored afterwards.
+    """
+    def test_replay(self):
+        path = self.record()
+        for threaded in (False, True):
+            packets = []
+            self.assertTrue(self.controller.replay(path, packets.append, threaded=threaded))
+            self.assertEqual([packet.data for packet in packets], self.expected)
+            self.assertTrue(all(packet.metadata == METADATA for packet in packets))
+            self.assertEqual(self.controller.state, State.STATE_WAITING_FOR_COMMAND)
+            self.assertIsNone(self.controller.ser)
+
+    """
+    The frame filter of the controller drops the packets it rejects while framing.
+    """
+    def test_replay_filter(self):
+        pan_id = 0x1A62
+        self.controller.set_filter(FrameFilter(pan_ids={pan_id}))
+        packets = []
+        self.controller.replay(self.record(), packets.append)
+        expected = [data for data in self.expected if data[10] | (data[11] << 8) == pan_id]
+        self.assertTrue(expected)
+        self.assertEqual([packet.data for packet in packets], expected)
+
+if __name__ == '__main__':
+    unittest.main()